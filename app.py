@@ -1,6 +1,7 @@
 import json
 import os
 import logging
+import re
 import uuid
 
 from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, send_file, \
@@ -8,8 +9,11 @@ from flask import Flask, render_template, request, redirect, url_for, flash, sen
 from werkzeug.utils import secure_filename
 from config import Config
 from utils.report_utils import generate_jmeter_report
-from utils.correlation_utils import analyze_jmeter_correlations, generate_correlated_jmx_with_claude, \
-    generate_correlated_jmx_with_openai
+from utils.jtl_utils import start_live_session, poll_live_session, LIVE_SESSIONS, load_jtl_columns, open_run, \
+    run_info, query_statistics, query_timeline, JTL_EXTENSIONS
+from utils.correlation_utils import analyze_jmeter_correlations, store_analysis, query_analysis
+from utils.jmx_utils import generate_correlated_jmx, generate_correlated_jmx_with_claude, \
+    generate_correlated_jmx_with_openai, generate_correlated_jmx_hedged
 from utils.postman_utils import analyze_postman_collection, convert_postman_to_jmx, ask_claude_for_jmx, ask_openai_for_jmx
 from utils.har_utils import (
     extract_base_urls,
@@ -29,12 +33,14 @@ USAGE_KEYS = [
     'correlations_analysis',
     'correlations_jmx_claude',
     'correlations_jmx_openai',
+    'correlations_jmx_rule_based',
     'postman_analysis',
     'postman_convert_basic',
     'postman_convert_ai_claude',
     'postman_convert_ai_openai',
     'har_convert_recording_xml',
-    'har_convert_test_plan_jmx'
+    'har_convert_test_plan_jmx',
+    'live_report'
 ]
 
 def _load_usage_stats():
@@ -62,6 +68,15 @@ def increment_usage(key):
     stats[key] = stats.get(key, 0) + 1
     _save_usage_stats(stats)
 
+def _path_within(path, root):
+    """Whether `path` resolves to `root` or a file below it (symlinks followed)"""
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False
+
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -97,7 +112,11 @@ def create_app(config_class=Config):
                     'scope': request.form.get('scope'),
                     'findings_text': request.form.get('findings_text'),
                     'use_gpt': request.form.get('use_gpt') == 'on',
+                    'rule_based_summary': request.form.get('rule_based_summary') == 'on',
                     'use_kibana_analysis': request.form.get('use_kibana_analysis') == 'on',
+                    'prerender_statistics': request.form.get('prerender_statistics') == 'on',
+                    'chart_max_points': request.form.get('chart_max_points'),
+                    'steady_state': request.form.get('steady_state') == 'on',
                     'APM_service_name': request.form.get('APM_service_name'),
                     'chaos_experiments_count': request.form.get('chaos_experiments_count')
                 }
@@ -126,6 +145,13 @@ def create_app(config_class=Config):
                 upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 report_folder.save(upload_path)
 
+                # Optional raw results for steady-state (ramp-up excluded) headline numbers
+                jtl_file = request.files.get('jtl_file')
+                if jtl_file and jtl_file.filename:
+                    jtl_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(jtl_file.filename))
+                    jtl_file.save(jtl_path)
+                    form_data['jtl_path'] = jtl_path
+
                 result_path = generate_jmeter_report(upload_path, form_data)
                 increment_usage('report_generator')
 
@@ -142,6 +168,116 @@ def create_app(config_class=Config):
 
         return render_template('report_generator.html')
 
+    @app.route('/api/runs', methods=['POST'])
+    def store_run():
+        jtl_file = request.files.get('jtl_file')
+        if not jtl_file or not jtl_file.filename:
+            return jsonify({'error': 'No JTL file provided (field "jtl_file")'}), 400
+        filename = secure_filename(jtl_file.filename)
+        if not filename.lower().endswith(JTL_EXTENSIONS):
+            return jsonify({'error': 'Only .jtl or .csv result files are supported'}), 400
+        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        jtl_file.save(upload_path)
+        try:
+            with load_jtl_columns(upload_path) as store:
+                return jsonify(run_info(store)), 201
+        except Exception as e:
+            logger.error(f"Error storing run: {str(e)}")
+            return jsonify({'error': f'Error storing run: {str(e)}'}), 500
+
+    def _query_args():
+        args = request.args
+        return {
+            'start': args.get('start', type=int),
+            'end': args.get('end', type=int),
+            'from_s': args.get('from_s', type=float),
+            'to_s': args.get('to_s', type=float),
+            'label_regex': args.get('label_regex'),
+            'labels': args.getlist('label')
+        }
+
+    @app.route('/api/runs/<run_id>')
+    def run_details(run_id):
+        store = open_run(run_id)
+        if store is None:
+            return jsonify({'error': 'Run not found'}), 404
+        with store:
+            return jsonify(run_info(store))
+
+    @app.route('/api/runs/<run_id>/statistics')
+    def run_statistics(run_id):
+        store = open_run(run_id)
+        if store is None:
+            return jsonify({'error': 'Run not found'}), 404
+        try:
+            with store:
+                return jsonify(query_statistics(store, api_threshold=request.args.get('api_threshold'),
+                                                err_rate_threshold=request.args.get('err_rate_threshold'),
+                                                **_query_args()))
+        except re.error as e:
+            return jsonify({'error': f'Invalid label_regex: {e}'}), 400
+
+    @app.route('/api/runs/<run_id>/timeline')
+    def run_timeline(run_id):
+        store = open_run(run_id)
+        if store is None:
+            return jsonify({'error': 'Run not found'}), 404
+        try:
+            with store:
+                return jsonify(query_timeline(store, request.args.get('bucket_seconds', type=int) or 10,
+                                              **_query_args()))
+        except re.error as e:
+            return jsonify({'error': f'Invalid label_regex: {e}'}), 400
+
+    @app.route('/live-report', methods=['GET', 'POST'])
+    def live_report():
+        if request.method == 'POST':
+            try:
+                jtl_path = (request.form.get('jtl_path') or '').strip()
+                if not jtl_path:
+                    flash('Please provide the path of the JTL file being written', 'error')
+                    return redirect(request.url)
+                if not os.path.isabs(jtl_path):
+                    jtl_path = os.path.join(app.config['UPLOAD_FOLDER'], jtl_path)
+                roots = [app.config['UPLOAD_FOLDER'], app.config.get('LIVE_REPORT_JTL_DIR')]
+                if not any(root and _path_within(jtl_path, root) for root in roots):
+                    flash('The JTL file must be inside the upload folder or LIVE_REPORT_JTL_DIR', 'error')
+                    return redirect(request.url)
+                session_id = start_live_session(
+                    jtl_path,
+                    request.form.get('api_threshold'),
+                    request.form.get('err_rate_threshold'),
+                    request.form.get('bucket_seconds', type=int) or 10
+                )
+                increment_usage('live_report')
+                return redirect(url_for('live_report_session', session_id=session_id))
+            except Exception as e:
+                logger.error(f"Error starting live report: {str(e)}")
+                flash(f'Error starting live report: {str(e)}', 'error')
+                return redirect(request.url)
+
+        return render_template('live_report.html', session_id=None)
+
+    @app.route('/live-report/<session_id>')
+    def live_report_session(session_id):
+        live = LIVE_SESSIONS.get(session_id)
+        if live is None:
+            flash('Live report session not found', 'error')
+            return redirect(url_for('live_report'))
+        return render_template('live_report.html', session_id=session_id,
+                               file_name=os.path.basename(live['tailer'].path),
+                               refresh_seconds=max(1, request.args.get('refresh', type=int) or 5))
+
+    @app.route('/api/live-report/<session_id>')
+    def live_report_data(session_id):
+        try:
+            snapshot = poll_live_session(session_id)
+        except OSError as e:
+            return jsonify({'error': str(e)}), 500
+        if snapshot is None:
+            return jsonify({'error': 'Live report session not found'}), 404
+        return jsonify(snapshot)
+
     @app.route('/correlations', methods=['GET', 'POST'])
     def correlations():
         if request.method == 'POST':
@@ -165,8 +301,23 @@ def create_app(config_class=Config):
                 url_filter = request.form.get('url_filter', '')
                 results = analyze_jmeter_correlations(filepath, url_filter)
                 increment_usage('correlations_analysis')
+                use_rule_based = request.form.get('use_rule_based') == 'on'
 
-                if request.form.get('use_claude') == 'on' and results:
+                if request.form.get('use_claude') == 'on' and request.form.get('hedge_providers') == 'on' and results:
+                    try:
+                        jmx_path, winner = generate_correlated_jmx_hedged(results, filepath)
+                        increment_usage(f'correlations_jmx_{winner}')
+                        return send_file(
+                            jmx_path,
+                            as_attachment=True,
+                            download_name=os.path.basename(jmx_path),
+                            mimetype='application/xml'
+                        )
+                    except Exception as e:
+                        app.logger.error(f"Error generating JMX with Claude and OpenAI: {str(e)}")
+                        flash('Error generating JMX file with Claude AI and OpenAI. The rule-based JMX was generated instead.', 'error')
+                        use_rule_based = True
+                elif request.form.get('use_claude') == 'on' and results:
                     try:
                         jmx_path = generate_correlated_jmx_with_claude(results, filepath)
                         increment_usage('correlations_jmx_claude')
@@ -178,7 +329,8 @@ def create_app(config_class=Config):
                         )
                     except Exception as e:
                         app.logger.error(f"Error generating JMX with Claude: {str(e)}")
-                        flash('Error generating JMX file. Please try again.', 'error')
+                        flash('Error generating JMX file with Claude AI. The rule-based JMX was generated instead.', 'error')
+                        use_rule_based = True
 
                 if request.form.get('use_openai') == 'on' and results:
                     try:
@@ -192,11 +344,24 @@ def create_app(config_class=Config):
                         )
                     except Exception as e:
                         app.logger.error(f"Error generating JMX with OpenAI: {str(e)}")
-                        flash('Error generating JMX file. Please try again.', 'error')
+                        flash('Error generating JMX file with OpenAI. The rule-based JMX was generated instead.', 'error')
+                        use_rule_based = True
+
+                if use_rule_based and results:
+                    jmx_path = generate_correlated_jmx(results, filepath)
+                    increment_usage('correlations_jmx_rule_based')
+                    return send_file(
+                        jmx_path,
+                        as_attachment=True,
+                        download_name=os.path.basename(jmx_path),
+                        mimetype='application/xml'
+                    )
 
-                return render_template('correlations.html', 
-                                    results=results, 
-                                    show_results=True)
+                analysis_id = store_analysis(results, file.filename)
+                return render_template('correlations.html',
+                                       analysis_id=analysis_id,
+                                       total_results=len(results),
+                                       show_results=True)
 
             except Exception as e:
                 app.logger.error(f"Error processing file: {str(e)}")
@@ -205,6 +370,20 @@ def create_app(config_class=Config):
 
         return render_template('correlations.html', show_results=False)
 
+    @app.route('/api/correlations/<analysis_id>')
+    def correlation_results(analysis_id):
+        page = query_analysis(
+            analysis_id,
+            offset=request.args.get('offset', type=int),
+            limit=request.args.get('limit', type=int),
+            correlated_only=request.args.get('correlated') in ('1', 'true', 'on'),
+            label=request.args.get('label'),
+            host=request.args.get('host')
+        )
+        if page is None:
+            return jsonify({'error': 'Correlation analysis not found'}), 404
+        return jsonify(page)
+
     @app.route('/postman-tools', methods=['GET', 'POST'])
     def postman_tools():
         if request.method == 'POST':
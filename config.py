@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Anthropic API client configuration
@@ -12,10 +13,62 @@ OPENAI_MODEL = "o3-2025-04-16"
 
 load_dotenv()
 
+# Kibana APM base URL (point at a local stand-in such as `python -m utils.kibana_stub` for offline runs)
+KIBANA_BASE_URL = (os.environ.get('KIBANA_BASE_URL') or 'https://kibana-pp.thiqah.sa:5601').rstrip('/')
+
+# Max points kept per dashboard chart series (graph.js is downsampled with LTTB); 0 disables
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS') or 1000)
+
+# Report stage memoization (see utils/stage_cache.py); REPORT_CACHE_ENABLED=0 turns it off
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'jmeter_report_cache')
+REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off')
+REPORT_CACHE_MAX_AGE_HOURS = float(os.environ.get('REPORT_CACHE_MAX_AGE_HOURS') or 72)
+
+# Seconds report generation waits for the LLM statistics analysis before using the rule-based
+# summary; an answer arriving later is cached, so regenerating the report includes it
+LLM_SUMMARY_TIMEOUT = float(os.environ.get('LLM_SUMMARY_TIMEOUT') or 10)
+
+# Parsed JTL samples stored as typed columns, keyed by the source file's sha256 (see utils/jtl_utils.py)
+JTL_CACHE_DIR = os.environ.get('JTL_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'jtl_column_cache')
+# Live report sessions: dropped once not polled for this many minutes; at most this many kept
+LIVE_SESSION_IDLE_MINUTES = float(os.environ.get('LIVE_SESSION_IDLE_MINUTES') or 30)
+LIVE_MAX_SESSIONS = int(os.environ.get('LIVE_MAX_SESSIONS') or 20)
+
+
+# Correlation analysis runs on a process pool for recordings with at least this many requests
+CORRELATION_WORKERS = int(os.environ.get('CORRELATION_WORKERS') or os.cpu_count() or 1)
+CORRELATION_PARALLEL_MIN_REQUESTS = int(os.environ.get('CORRELATION_PARALLEL_MIN_REQUESTS') or 1000)
+# Start method of the correlation workers: 'forkserver' / 'spawn' run a pool started once per
+# process whose workers rebuild the response index per analysis; 'fork' (opt-in) hands them the
+# index without a rebuild but forks the multithreaded server (see analyze_requests_in_pool)
+CORRELATION_START_METHOD = os.environ.get('CORRELATION_START_METHOD') or 'forkserver'
+# Parameter values scoring below this (0-1) are treated as constants and not searched for; 0 searches all
+CORRELATION_MIN_SCORE = float(os.environ.get('CORRELATION_MIN_SCORE') or 0.3)
+# Parsed recordings, their response indexes and correlation results kept in memory (approximate bytes, LRU)
+CORRELATION_CACHE_MAX_BYTES = int(os.environ.get('CORRELATION_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+# Analyses whose results stay available to the paginated correlations API (oldest dropped first)
+CORRELATION_ANALYSES_MAX = int(os.environ.get('CORRELATION_ANALYSES_MAX') or 20)
+# LLM provider limits used by the token budget planner (see utils/llm_utils.py); OpenAI reasoning
+# models spend part of max_completion_tokens on reasoning, so that much is added to every budget
+CLAUDE_CONTEXT_TOKENS = int(os.environ.get('CLAUDE_CONTEXT_TOKENS') or 200000)
+CLAUDE_MAX_OUTPUT_TOKENS = int(os.environ.get('CLAUDE_MAX_OUTPUT_TOKENS') or 64000)
+OPENAI_CONTEXT_TOKENS = int(os.environ.get('OPENAI_CONTEXT_TOKENS') or 200000)
+OPENAI_MAX_OUTPUT_TOKENS = int(os.environ.get('OPENAI_MAX_OUTPUT_TOKENS') or 100000)
+OPENAI_REASONING_TOKENS = int(os.environ.get('OPENAI_REASONING_TOKENS') or 8000)
+# AI JMX generation: samplers per prompt chunk and chunks generated concurrently
+CORRELATION_LLM_CHUNK_SAMPLES = int(os.environ.get('CORRELATION_LLM_CHUNK_SAMPLES') or 20)
+CORRELATION_LLM_WORKERS = int(os.environ.get('CORRELATION_LLM_WORKERS') or 4)
+# Hedged AI JMX generation: seconds before a chunk is also sent to the second provider (0: both at once)
+CORRELATION_LLM_HEDGE_DELAY = float(os.environ.get('CORRELATION_LLM_HEDGE_DELAY') or 20)
+# Rounds of fragment repairs asked from the model when a generated JMX fails validation
+JMX_REPAIR_ATTEMPTS = int(os.environ.get('JMX_REPAIR_ATTEMPTS') or 2)
+
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     UPLOAD_FOLDER = 'uploads'
+    # Directory the live report may also tail JTL files from (it always may from UPLOAD_FOLDER)
+    LIVE_REPORT_JTL_DIR = os.environ.get('LIVE_REPORT_JTL_DIR') or None
     MAX_CONTENT_LENGTH = 150 * 1024 * 1024  # 150MB
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     ALLOWED_EXTENSIONS = {'json', 'xml', 'html', 'jtl'}
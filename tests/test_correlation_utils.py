@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+import utils.correlation_utils as correlation_utils
+from app import create_app
+from config import CORRELATION_MIN_SCORE
+from utils.correlation_utils import ResponseCorpus, ResponseIndex, extract_dynamic_patterns, find_dynamic_patterns, \
+    iter_sanitized_chunks, iter_xml_events, remove_invalid_xml_references, score_dynamic_value
+
+
+def write_recording(path, requests=30, seed='a'):
+    """Recording where every request sends the token the previous response returned"""
+    samples = []
+    for i in range(requests):
+        samples.append(
+            f'<httpSample t="5" lb="req{i}" rc="200">'
+            f'<responseHeader class="java.lang.String">HTTP/1.1 200 OK</responseHeader>'
+            f'<requestHeader class="java.lang.String">Host: shop.test</requestHeader>'
+            f'<responseData class="java.lang.String">{{"token":"{seed}{i:04d}f49ac00f58794b3c93a6d856"}}</responseData>'
+            f'<method class="java.lang.String">GET</method>'
+            f'<java.net.URL>https://shop.test/api/items?token={seed}{i - 1:04d}f49ac00f58794b3c93a6d856</java.net.URL>'
+            f'</httpSample>')
+    path.write_text('<?xml version="1.0" encoding="UTF-8"?>\n<testResults version="1.2">'
+                    + ''.join(samples) + '</testResults>')
+    return str(path)
+
+
+@pytest.fixture
+def app_context():
+    with create_app().app_context():
+        yield
+
+
+@pytest.fixture
+def recording_cache(monkeypatch):
+    monkeypatch.setattr(correlation_utils, 'CORRELATION_WORKERS', 1)
+    monkeypatch.setattr(correlation_utils, '_recording_cache', correlation_utils.collections.OrderedDict())
+    return correlation_utils._recording_cache
+
+
+def test_recording_size_counts_index_and_results(app_context, recording_cache, tmp_path):
+    path = write_recording(tmp_path / 'rec.xml')
+    recording = correlation_utils.load_recording(path)
+    parsed_size = recording.size
+    assert correlation_utils.analyze_jmeter_correlations(path)
+    assert recording.size >= parsed_size + recording.response_index.size
+
+
+def test_cache_evicts_analysed_recordings_over_budget(app_context, recording_cache, monkeypatch, tmp_path):
+    first = write_recording(tmp_path / 'first.xml', seed='a')
+    second = write_recording(tmp_path / 'second.xml', seed='b')
+    recording = correlation_utils.load_recording(first)
+    parsed_size = recording.size
+    correlation_utils.analyze_jmeter_correlations(first)
+    # room for two parsed recordings or one analysed one (sizes vary a little), but not for two analysed ones
+    assert recording.size > 2 * parsed_size
+    budget = recording.size * 11 // 10
+    monkeypatch.setattr(correlation_utils, 'CORRELATION_CACHE_MAX_BYTES', budget)
+
+    correlation_utils.analyze_jmeter_correlations(second)
+    assert list(recording_cache) == [correlation_utils.file_digest(second)]
+    assert sum(entry.size for entry in recording_cache.values()) <= budget
+
+
+def test_pooled_analysis_matches_serial_and_reuses_the_pool(app_context, recording_cache, monkeypatch, tmp_path):
+    paths = [write_recording(tmp_path / 'first.xml', seed='a'), write_recording(tmp_path / 'second.xml', seed='b')]
+    serial = [correlation_utils.analyze_jmeter_correlations(path) for path in paths]
+
+    monkeypatch.setattr(correlation_utils, '_recording_cache', correlation_utils.collections.OrderedDict())
+    monkeypatch.setattr(correlation_utils, 'CORRELATION_WORKERS', 2)
+    monkeypatch.setattr(correlation_utils, 'CORRELATION_PARALLEL_MIN_REQUESTS', 1)
+    monkeypatch.setattr(correlation_utils, 'CORRELATION_START_METHOD', 'spawn')
+    monkeypatch.setattr(correlation_utils, '_pools', {})
+    pooled = [correlation_utils.analyze_jmeter_correlations(paths[0])]
+    pool = correlation_utils._pools['spawn']
+    pooled.append(correlation_utils.analyze_jmeter_correlations(paths[1]))
+    assert correlation_utils._pools == {'spawn': pool}
+    pool.shutdown()
+    assert pooled == serial
+
+
+def random_texts(rng, count, length):
+    return [''.join(rng.choice('ab1=&"\n') for _ in range(rng.randint(0, length))) for _ in range(count)]
+
+
+def test_dynamic_patterns_match_the_regex_scan():
+    rng = random.Random(5)
+    for text in random_texts(rng, 300, 200):
+        for value in ('a', 'ab', 'a1=', '"b', '==', 'b\n', '1&a', 'aba'):
+            assert find_dynamic_patterns(text, value) == extract_dynamic_patterns(text, value)[:3]
+            assert find_dynamic_patterns(text, value, limit=100) == extract_dynamic_patterns(text, value)
+    assert find_dynamic_patterns('', 'a') == [] and find_dynamic_patterns('abc', '') == []
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def test_response_index_finds_every_response_containing_a_value(mapped):
+    rng = random.Random(11)
+    texts = [f'{{"id":"{rng.randrange(50)}","token":"t{rng.randrange(8)}x-{rng.randrange(8)}"}}\n'
+             + ''.join(rng.choice('ab1=&"') for _ in range(40)) for _ in range(60)]
+    corpus = ResponseCorpus.create(texts) if mapped else None
+    try:
+        index = ResponseIndex(texts, corpus=corpus)
+        values = ['"id":"7"', 't3x-5', 'x-', 'a=', '1&', 'missing', '"token":"t1', 'ab1=&"b']
+        for value in values + [text[5:30] for text in texts[::7]]:
+            expected = [i for i, text in enumerate(texts) if value in text]
+            assert index.responses_containing(value) == expected
+            assert index.sources_before(value, 30) == [i for i in expected if i < 30]
+            for i in expected[:3]:
+                assert index.patterns(i, value) == extract_dynamic_patterns(texts[i], value)[:3]
+    finally:
+        if corpus is not None:
+            corpus.close(unlink=True)
+
+
+DIRTY_XML = ('<?xml version="1.0" encoding="UTF-8"?>\n<testResults>'
+             '<httpSample lb="caf\u00e9 &#233;">'
+             '<responseData>ok&#x1F;&#65;&#xD800;&#x1F600; \U0001F600 &amp; &#0; &#12;&#x9;</responseData>'
+             '</httpSample>'
+             '<httpSample lb="b&#x1;"><responseData>&#1234567;&#x10FFFF;end</responseData></httpSample>'
+             '</testResults>').encode('utf-8')
+
+
+def test_sanitized_chunks_equal_a_whole_document_pass(tmp_path):
+    path = tmp_path / 'rec.xml'
+    raw = DIRTY_XML[:60] + b'\xff\xfe' + DIRTY_XML[60:] + b'&#;&#xZ;&#x4'
+    path.write_bytes(raw)
+    expected = remove_invalid_xml_references(raw.decode('utf-8', errors='ignore')).encode('utf-8')
+    for chunk_size in range(1, 40):
+        assert b''.join(iter_sanitized_chunks(str(path), chunk_size)) == expected
+
+
+def test_xml_events_survive_chunks_split_inside_tags_and_references(tmp_path, monkeypatch):
+    path = tmp_path / 'rec.xml'
+    path.write_bytes(DIRTY_XML)
+    whole = [(event, node.tag, node.get('lb'), node.text) for event, node in iter_xml_events(str(path), ('end',))]
+    monkeypatch.setattr(correlation_utils, 'XML_READ_CHUNK', 3)
+    split = [(event, node.tag, node.get('lb'), node.text) for event, node in iter_xml_events(str(path), ('end',))]
+    assert split == whole
+    assert [lb for _, tag, lb, _ in split if tag == 'httpSample'] == ['caf\u00e9 \u00e9', 'b']
+    assert whole[0][3].startswith('okA')
+
+
+@pytest.mark.parametrize('value', ['550e8400-e29b-41d4-a716-446655440000', '{550E8400-E29B-41D4-A716-446655440000}',
+                                   'eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiIxIn0.sig', '9f86d081884c7d659a2feaa0c55ad015',
+                                   'CfDJ8Nq3xYz7Kq1Lm9Pq2Rs4Tu6Vw8%3D%3D'])
+def test_known_token_shapes_score_one_even_when_repeated(value):
+    assert score_dynamic_value(value) == 1.0
+    assert score_dynamic_value(value, repeat_ratio=1.0) == 1.0
+
+
+@pytest.mark.parametrize('value', ['1712345678901', '12345', 'a8F3kQ9z', 'Add to cart'])
+def test_dynamic_values_score_at_least_the_threshold(value):
+    assert score_dynamic_value(value) >= CORRELATION_MIN_SCORE
+
+
+@pytest.mark.parametrize('value', ['1', '10', 'en', 'true', 'NULL', 'off', '100', '2024', 'abc', 'json', 'login',
+                                   '/cart'])
+def test_constant_values_score_below_the_threshold(value):
+    assert score_dynamic_value(value) < CORRELATION_MIN_SCORE
+
+
+def test_repeated_values_are_discounted_by_up_to_half():
+    assert score_dynamic_value('12345') == 0.5
+    assert score_dynamic_value('12345', repeat_ratio=0.5) == 0.375
+    assert score_dynamic_value('12345', repeat_ratio=1.0) == 0.25 < CORRELATION_MIN_SCORE
@@ -0,0 +1,245 @@
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from lxml import etree as ET
+
+import utils.correlation_utils as correlation_utils
+from app import create_app
+from utils.jmx_utils import MAX_LEFT_BOUNDARY, MAX_RIGHT_BOUNDARY, MIN_LEFT_BOUNDARY, BoundaryFinder, \
+    CompletionCancelled, apply_variation, defined_variables, hedged_completion, plan_extractor, request_shape, \
+    request_variation, validate_jmx
+
+RECORDING = os.path.join(os.path.dirname(__file__), os.pardir, 'uploads', 'recording_Nopcommerce.xml')
+
+
+def record(url, body=''):
+    return SimpleNamespace(url=url, method='GET', request_body=body)
+
+
+def copied_sampler(representative, occurrence, path, query=None):
+    """HTTPSampler.path and query arguments of a representative sampler copied for `occurrence`"""
+    sampler = ET.Element('HTTPSamplerProxy')
+    ET.SubElement(sampler, 'stringProp', name='HTTPSampler.path').text = path
+    args = ET.SubElement(ET.SubElement(sampler, 'elementProp', name='HTTPsampler.Arguments'), 'collectionProp')
+    for name, value in query or []:
+        arg = ET.SubElement(args, 'elementProp', name=name)
+        ET.SubElement(arg, 'stringProp', name='Argument.name').text = name
+        ET.SubElement(arg, 'stringProp', name='Argument.value').text = value
+    apply_variation(sampler, request_variation(request_shape(record(representative)),
+                                               request_shape(record(occurrence)), set()))
+    return (sampler.findtext("stringProp[@name='HTTPSampler.path']"),
+            [arg.text for arg in sampler.iter('stringProp') if arg.get('name') == 'Argument.value'])
+
+
+def test_segment_replaced_only_at_its_position():
+    path, _ = copied_sampler('https://shop.test/api/1/items/1', 'https://shop.test/api/1/items/2', '/api/1/items/1')
+    assert path == '/api/1/items/2'
+
+
+def test_overlapping_segment_values_replaced_in_one_pass():
+    path, _ = copied_sampler('https://shop.test/page/1/2', 'https://shop.test/page/2/3', '/page/1/2')
+    assert path == '/page/2/3'
+
+
+def test_segments_of_a_full_url_path():
+    path, _ = copied_sampler('https://shop.test/page/1/2?q=1', 'https://shop.test/page/2/3?q=1',
+                             'https://shop.test/page/1/2?q=1')
+    assert path == 'https://shop.test/page/2/3?q=1'
+
+
+def test_path_written_differently_is_left_alone():
+    path, _ = copied_sampler('https://shop.test/api/1/items/1', 'https://shop.test/api/1/items/2', '/api/items')
+    assert path == '/api/items'
+
+
+def test_overlapping_parameter_values_replaced_in_one_pass():
+    path, values = copied_sampler('https://shop.test/list?page=1&size=2', 'https://shop.test/list?page=2&size=3',
+                                  '/list?page=1&size=2', [('page', '1'), ('size', '2')])
+    assert path == '/list?page=2&size=3'
+    assert values == ['2', '3']
+
+
+def test_config_elements_and_foreach_define_variables():
+    plan = ET.fromstring(
+        '<hashTree>'
+        '<CounterConfig testname="counter"><stringProp name="CounterConfig.name">n</stringProp></CounterConfig>'
+        '<hashTree/>'
+        '<RandomVariableConfig testname="random"><stringProp name="variableName">r</stringProp></RandomVariableConfig>'
+        '<hashTree/>'
+        '<ForeachController testname="each"><stringProp name="ForeachController.returnVal">item</stringProp>'
+        '</ForeachController>'
+        '<hashTree>'
+        '<HTTPSamplerProxy testname="get">'
+        '<stringProp name="HTTPSampler.path">/items/${item}?n=${n}&amp;r=${r}&amp;i=${__jm__each__idx}</stringProp>'
+        '<stringProp name="HTTPSampler.method">GET</stringProp>'
+        '</HTTPSamplerProxy>'
+        '<hashTree/>'
+        '</hashTree>'
+        '</hashTree>')
+    assert {'n', 'r', 'item'} <= defined_variables(plan)
+    assert validate_jmx(plan) == []
+
+
+def shortest_left(text, q):
+    """Shortest left boundary length for position q found by trying every length"""
+    for length in range(min(q, MIN_LEFT_BOUNDARY), min(q, MAX_LEFT_BOUNDARY) + 1):
+        if length and text[q - length:q] not in text[:q - 1]:
+            return length
+    return None
+
+
+def shortest_right(text, q, end):
+    """Shortest right boundary length for the value at [q, end) found by trying every length"""
+    if end == len(text):
+        return 0
+    for length in range(1, min(len(text) - end, MAX_RIGHT_BOUNDARY) + 1):
+        if text.find(text[end:end + length], q + 1) == end:
+            return length
+    return None
+
+
+def extracted(regex, match_number, text):
+    """What a regular expression extractor with this regex and match number takes from `text`"""
+    matches = list(re.finditer(regex, text))
+    return matches[match_number - 1].group(1) if len(matches) >= match_number else None
+
+
+def test_boundaries_are_the_shortest_unique_ones():
+    rng = random.Random(7)
+    for _ in range(200):
+        text = ''.join(rng.choice('ab="<>') for _ in range(rng.randint(1, 120)))
+        finder = BoundaryFinder(text)
+        for q in range(len(text)):
+            end = rng.randint(q + 1, len(text))
+            assert finder._left_length(q) == shortest_left(text, q)
+            assert finder._right_length(q, end) == shortest_right(text, q, end)
+
+
+def test_regex_extracts_the_value_with_the_shortest_boundaries():
+    text = '<input name="id" value="3" /><input name="token" value="f49ac00f58" /><a href="/cart">Cart</a>'
+    regex, match_number = BoundaryFinder(text).regex('f49ac00f58')
+    assert (regex, match_number) == ('n"\\ value="(.+?)"', 1)
+    assert extracted(regex, match_number, text) == 'f49ac00f58'
+
+
+def test_repeated_left_context_falls_back_to_match_number():
+    row = '<tr><td class="product-name">' + ' ' * MAX_LEFT_BOUNDARY + '<span data-id="'
+    text = f'{row}101"></span></td></tr>{row}202"></span></td></tr>'
+    regex, match_number = BoundaryFinder(text).regex('202')
+    assert match_number == 2
+    assert extracted(regex, match_number, text) == '202'
+
+
+def test_value_at_end_of_text_is_bounded_by_end_anchor():
+    text = 'HTTP/1.1 302 Found\r\nLocation: /login?returnUrl=%2Fcart'
+    regex, match_number = BoundaryFinder(text).regex('%2Fcart')
+    assert regex.endswith('(.+?)$')
+    assert extracted(regex, match_number, text) == '%2Fcart'
+
+
+def test_absent_or_multiline_values_get_no_regex():
+    finder = BoundaryFinder('a=1\nb=2\n')
+    assert finder.regex('3') is None
+    assert finder.regex('1\nb') is None
+
+
+def test_extractors_match_recorded_responses():
+    with create_app().app_context():
+        results = correlation_utils.analyze_jmeter_correlations(RECORDING)
+        requests = correlation_utils.load_recording(RECORDING).requests
+    finders = {}
+    checked = 0
+    for result in results:
+        for param in result['params']:
+            if not param['correlated'] or param['nearest_source'].get('json_path'):
+                continue
+            value = {'original': param['value'], 'decoded': param.get('decoded_value'),
+                     'encoded': param.get('encoded_value')}.get(param['correlation_type'])
+            source = requests[param['nearest_source']['index']]
+            spec = plan_extractor(source, value, finders) if value else None
+            if spec is None:
+                continue
+            _, regex, use_headers, match_number = spec
+            text = source.response_header if use_headers == 'true' else source.response_body
+            assert extracted(regex, match_number, text) == value
+            checked += 1
+    assert checked
+
+
+def validate(response):
+    if not response.startswith('<'):
+        raise ValueError(f"not JMX: {response}")
+    return response
+
+
+class FakeProvider:
+    """Completion answering `response` (or raising it) once `release` is set, recording calls and cancellation"""
+
+    def __init__(self, name, response, released=True):
+        self.name = name
+        self.response = response
+        self.release = threading.Event()
+        if released:
+            self.release.set()
+        self.calls = 0
+        self.cancelled = threading.Event()
+
+    def __call__(self, prompt, cancelled):
+        self.calls += 1
+        while not self.release.wait(0.01):
+            if cancelled.is_set():
+                self.cancelled.set()
+                raise CompletionCancelled(self.name)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+def hedge(*providers, delay=0):
+    outcomes = []
+    return hedged_completion([(provider.name, provider) for provider in providers], delay, outcomes), outcomes
+
+
+def test_hedge_fastest_valid_response_wins_and_cancels_the_rest():
+    slow, fast = FakeProvider('claude', '<slow/>', released=False), FakeProvider('openai', '<fast/>')
+    complete, outcomes = hedge(slow, fast)
+    assert complete('prompt', validate) == '<fast/>'
+    assert [provider for provider, _ in outcomes] == ['openai']
+    assert slow.cancelled.wait(5)
+
+
+def test_hedge_waits_for_the_delay_before_asking_the_next_provider():
+    preferred, backup = FakeProvider('claude', '<plan/>'), FakeProvider('openai', '<backup/>')
+    complete, outcomes = hedge(preferred, backup, delay=10)
+    assert complete('prompt', validate) == '<plan/>'
+    assert (preferred.calls, backup.calls) == (1, 0)
+
+    stalled, backup = FakeProvider('claude', '<late/>', released=False), FakeProvider('openai', '<backup/>')
+    complete, outcomes = hedge(stalled, backup, delay=0.05)
+    assert complete('prompt', validate) == '<backup/>'
+    assert outcomes[0][0] == 'openai' and outcomes[0][1] >= 0.05
+    assert stalled.cancelled.wait(5)
+
+
+@pytest.mark.parametrize('failure', [RuntimeError('overloaded'), 'Sorry, I cannot help with that'])
+def test_hedge_falls_back_at_once_when_a_provider_fails(failure):
+    failing, backup = FakeProvider('claude', failure), FakeProvider('openai', '<backup/>')
+    complete, outcomes = hedge(failing, backup, delay=30)
+    started = time.monotonic()
+    assert complete('prompt', validate) == '<backup/>'
+    assert time.monotonic() - started < 5
+    assert [provider for provider, _ in outcomes] == ['openai']
+
+
+def test_hedge_raises_the_last_error_when_every_provider_fails():
+    first, last = FakeProvider('claude', RuntimeError('overloaded')), FakeProvider('openai', 'plain text')
+    complete, outcomes = hedge(first, last, delay=30)
+    with pytest.raises(ValueError, match='not JMX'):
+        complete('prompt', validate)
+    assert outcomes == []
@@ -0,0 +1,134 @@
+import math
+import random
+
+import pytest
+
+import utils.jtl_utils as jtl_utils
+from utils.jtl_utils import SKETCH_ACCURACY, JtlTailer, PercentileSketch
+
+HEADER = 'timeStamp,elapsed,label,responseCode,success,bytes,sentBytes\n'
+
+
+def rows(*samples):
+    return ''.join(f'{ts},{elapsed},{label},200,{str(success).lower()},100,10\n'
+                   for ts, elapsed, label, success in samples)
+
+
+@pytest.fixture
+def jtl(tmp_path):
+    path = tmp_path / 'results.jtl'
+    path.write_text(HEADER)
+    return path
+
+
+def append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = random.Random(3)
+    values = [int(rng.lognormvariate(5, 1.5)) for _ in range(20000)] + [0] * 50
+    sketch = PercentileSketch()
+    for value in values:
+        sketch.add(value)
+    for q in (0.001, 0.5, 0.9, 0.95, 0.99, 1.0):
+        exact = nearest_rank(values, q)
+        assert abs(sketch.quantile(q) - exact) <= SKETCH_ACCURACY * exact
+    assert PercentileSketch().quantile(0.5) is None
+
+
+def test_merged_sketches_match_one_sketch():
+    whole, first, second = PercentileSketch(), PercentileSketch(), PercentileSketch()
+    for value in range(0, 5000, 7):
+        whole.add(value)
+        (first if value % 2 else second).add(value)
+    first.merge(second)
+    assert first.count == whole.count
+    assert [first.quantile(q) for q in (0.1, 0.5, 0.99)] == [whole.quantile(q) for q in (0.1, 0.5, 0.99)]
+
+
+def test_tailer_waits_for_complete_lines(jtl):
+    tailer = JtlTailer(str(jtl))
+    append(jtl, rows((1000, 10, 'a', True)) + '2000,20,"b')
+    assert tailer.poll() == 1
+    append(jtl, ' line\nstill b",200,false,100,10\n3000,')
+    assert tailer.poll() == 1
+    append(jtl, '30,a,200,true,100,10\n')
+    assert tailer.poll() == 1
+    snapshot = tailer.snapshot()
+    assert [(row['label'], row['samples'], row['errors']) for row in snapshot['labels']] == \
+        [('a', 2, 0), ('b line\nstill b', 1, 1)]
+    assert snapshot['overall']['samples'] == 3 and snapshot['bad_lines'] == 0
+
+
+def test_tailer_rereads_a_rewritten_file(jtl):
+    tailer = JtlTailer(str(jtl))
+    append(jtl, rows(*[(1000 + i, 10, 'a', True) for i in range(20)]))
+    assert tailer.poll() == 20
+    jtl.write_text(HEADER + rows((5000, 40, 'b', True)))
+    assert tailer.poll() == 1
+    assert [row['label'] for row in tailer.snapshot()['labels']] == ['b']
+
+
+def test_tailer_without_header_uses_default_columns(tmp_path):
+    path = tmp_path / 'results.jtl'
+    path.write_text('1000,120,home,200,OK,Thread 1-1,text,true,,512,64,1,1,https://shop.test/,100,0,5\n'
+                    'not,a,sample\n')
+    tailer = JtlTailer(str(path))
+    assert tailer.poll() == 1
+    snapshot = tailer.snapshot(api_threshold=100, err_rate_threshold=5)
+    assert snapshot['bad_lines'] == 1
+    assert (snapshot['overall']['samples'], snapshot['overall']['verdict']) == (1, 'Not Compliant')
+
+
+def test_buckets_stay_ordered_and_bounded(jtl):
+    tailer = JtlTailer(str(jtl), bucket_seconds=1, max_buckets=3)
+    append(jtl, rows((1000, 10, 'a', True), (3000, 10, 'a', True), (2500, 30, 'a', False)))
+    tailer.poll()
+    assert [bucket['time'] for bucket in tailer.snapshot()['timeline']] == [1000, 2000, 3000]
+
+    append(jtl, rows((4000, 10, 'a', True), (500, 10, 'a', True), (2100, 10, 'a', True)))
+    tailer.poll()
+    timeline = tailer.snapshot()['timeline']
+    assert [bucket['time'] for bucket in timeline] == [2000, 3000, 4000]
+    assert timeline[0]['samples'] == 2 and timeline[0]['errors'] == 1
+    # samples older than the kept buckets still count in the statistics
+    assert tailer.snapshot()['overall']['samples'] == 6
+    assert len(tailer.buckets) == 3
+    assert [bucket['time'] for bucket in tailer.snapshot(max_buckets=2)['timeline']] == [3000, 4000]
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(jtl_utils, 'LIVE_SESSIONS', jtl_utils.collections.OrderedDict())
+    return jtl_utils.LIVE_SESSIONS
+
+
+def test_idle_sessions_expire(jtl, sessions, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(jtl_utils.time, 'time', lambda: now[0])
+    monkeypatch.setattr(jtl_utils, 'LIVE_SESSION_IDLE_MINUTES', 1)
+    idle = jtl_utils.start_live_session(str(jtl), '1000', '3')
+    polled = jtl_utils.start_live_session(str(jtl), '1000', '3')
+    now[0] += 45
+    assert jtl_utils.poll_live_session(polled) is not None
+    now[0] += 45
+    assert jtl_utils.poll_live_session(idle) is None
+    jtl_utils.start_live_session(str(jtl), '1000', '3')
+    assert idle not in sessions and polled in sessions
+
+
+def test_least_recently_polled_session_is_dropped_at_the_limit(jtl, sessions, monkeypatch):
+    monkeypatch.setattr(jtl_utils, 'LIVE_MAX_SESSIONS', 2)
+    first = jtl_utils.start_live_session(str(jtl), '1000', '3')
+    second = jtl_utils.start_live_session(str(jtl), '1000', '3')
+    jtl_utils.poll_live_session(first)
+    third = jtl_utils.start_live_session(str(jtl), '1000', '3')
+    assert list(sessions) == [first, third]
+    assert jtl_utils.poll_live_session(second) is None
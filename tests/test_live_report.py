@@ -0,0 +1,48 @@
+import pytest
+
+import app as app_module
+from config import Config
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    class TestConfig(Config):
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        LIVE_REPORT_JTL_DIR = str(tmp_path / 'results')
+
+    (tmp_path / 'results').mkdir()
+    started = []
+    monkeypatch.setattr(app_module, 'start_live_session', lambda path, *args: started.append(path) or 'run')
+    monkeypatch.setattr(app_module, 'increment_usage', lambda key: None)
+    client = app_module.create_app(TestConfig).test_client()
+    client.started = started
+    return client
+
+
+@pytest.mark.parametrize('jtl_path', ['/etc/passwd', '../secret.jtl', 'results/../../secret.jtl'])
+def test_paths_outside_allowed_dirs_are_rejected(client, jtl_path):
+    response = client.post('/live-report', data={'jtl_path': jtl_path})
+    assert response.status_code == 302 and response.location.endswith('/live-report')
+    assert client.started == []
+
+
+def test_paths_inside_allowed_dirs_are_tailed(client, tmp_path):
+    client.post('/live-report', data={'jtl_path': 'run.jtl'})
+    client.post('/live-report', data={'jtl_path': str(tmp_path / 'results' / 'run.jtl')})
+    assert client.started == [str(tmp_path / 'uploads' / 'run.jtl'), str(tmp_path / 'results' / 'run.jtl')]
+
+
+def test_symlink_out_of_upload_folder_is_rejected(client, tmp_path):
+    (tmp_path / 'uploads' / 'link.jtl').symlink_to('/etc/passwd')
+    client.post('/live-report', data={'jtl_path': 'link.jtl'})
+    assert client.started == []
+
+
+@pytest.mark.parametrize('refresh, expected', [('0', 5), ('-3', 1), ('10', 10)])
+def test_refresh_interval_is_at_least_a_second(client, refresh, expected):
+    app_module.LIVE_SESSIONS['run'] = {'tailer': type('Tailer', (), {'path': 'run.jtl'})()}
+    try:
+        page = client.get(f'/live-report/run?refresh={refresh}').get_data(as_text=True)
+    finally:
+        del app_module.LIVE_SESSIONS['run']
+    assert f'var refreshMs = {expected} * 1000;' in page
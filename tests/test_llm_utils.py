@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from utils.llm_utils import MIN_FIELD_CHARS, PROVIDER_LIMITS, TRUNCATION_MARKER, check_complete, fit_prompt, fits, \
+    input_limit, output_budget, plan_budget
+
+
+@pytest.mark.parametrize('provider', ['claude', 'openai'])
+def test_chunk_at_input_limit_gets_output_for_measured_ratio(provider):
+    prompt_tokens = input_limit('jmx_chunk', provider)
+    reasoning = 8000 if provider == 'openai' else 0
+    assert output_budget('jmx_chunk', provider, prompt_tokens) - reasoning >= prompt_tokens * 4.3
+    # a 20 sample chunk of ~5.3k prompt tokens is sent whole
+    assert prompt_tokens >= 5300
+
+
+def test_whole_plan_keeps_provider_output_caps():
+    assert output_budget('jmx', 'claude', 1000) == 64000
+    assert output_budget('jmx', 'openai', 1000) == 100000
+
+
+@pytest.mark.parametrize('stop_reason', ['max_tokens', 'length'])
+def test_response_cut_off_at_max_tokens_is_rejected(stop_reason):
+    with pytest.raises(ValueError, match='hit max tokens'):
+        check_complete(plan_budget('jmx_chunk', 'claude', 'prompt'), stop_reason)
+
+
+@pytest.mark.parametrize('stop_reason', ['end_turn', 'stop', None])
+def test_finished_response_is_accepted(stop_reason):
+    check_complete(plan_budget('jmx_chunk', 'openai', 'prompt'), stop_reason)
+
+
+def many_long_fields(count=200, length=1000):
+    return {'items': [{'name': f'item{i}', 'body': 'abcd ' * (length // 5)} for i in range(count)]}
+
+
+def counting(build, builds):
+    def counted(data):
+        builds.append(1)
+        return build(data)
+    return counted
+
+
+def test_truncation_stops_when_fields_cannot_shrink(monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS, 'claude', (3000, 64000, 0))
+    builds = []
+    prompt, budget = fit_prompt('metrics_extraction', 'claude', counting(json.dumps, builds), many_long_fields())
+    assert not fits(budget)
+    assert max(len(item['body']) for item in json.loads(prompt)['items']) <= MIN_FIELD_CHARS + len(TRUNCATION_MARKER)
+    assert len(builds) < 20
+
+
+def test_many_long_fields_are_cut_to_a_common_length(monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS, 'claude', (30000, 64000, 0))
+    builds = []
+    prompt, budget = fit_prompt('metrics_extraction', 'claude', counting(json.dumps, builds), many_long_fields())
+    assert fits(budget) and budget.degraded == 'truncate'
+    assert len({len(item['body']) for item in json.loads(prompt)['items']}) == 1
+    assert len(builds) < 10
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+import zipfile
+
+import pytest
+
+import utils.report_utils as report_utils
+import utils.stage_cache as stage_cache
+
+FORM_DATA = {
+    'project_name': 'Demo',
+    'api_threshold': '1000',
+    'err_rate_threshold': '3',
+    'findings': '',
+    'use_gpt': True,
+}
+
+STATISTICS = {
+    label: {'transaction': label, 'sampleCount': 10, 'errorCount': 0, 'errorPct': 0.0, 'meanResTime': 100.0,
+            'medianResTime': 90.0, 'pct1ResTime': 120.0, 'pct2ResTime': 130.0, 'pct3ResTime': 150.0,
+            'minResTime': 50.0, 'maxResTime': 200.0, 'throughput': 2.0}
+    for label in ('Total', 'Login')
+}
+
+
+@pytest.fixture
+def report_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_ENABLED', True)
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_DIR', str(tmp_path / 'cache'))
+    root = tmp_path / 'report'
+    (root / 'content' / 'js').mkdir(parents=True)
+    (root / 'index.html').write_text(
+        '<html><head><title>Apache JMeter Dashboard</title></head><body>'
+        '<script src="sbadmin2-1.0.7/bower_components/jquery/dist/jquery.min.js"></script></body></html>')
+    (root / 'content' / 'js' / 'dashboard.js').write_text('// Creates APDEX table\n// Create statistics table\n')
+    (root / 'statistics.json').write_text(json.dumps(STATISTICS))
+    return root
+
+
+def run_stage(root):
+    """One report run of the HTML / JS stage, as generate_jmeter_report runs it"""
+    paths = ['index.html', 'content/js/dashboard.js', 'statistics.json']
+    originals = {rel: (root / rel).read_bytes() for rel in paths}
+    stage_cache.run_file_stage(
+        'edit_html_and_js', str(root), paths, FORM_DATA,
+        lambda: report_utils.edit_html_and_js(str(root / 'index.html'), str(root / 'content/js/dashboard.js'),
+                                              str(root / 'statistics.json'), FORM_DATA),
+        cache_if=lambda degraded: not degraded)
+    html = (root / 'index.html').read_text()
+    for rel, content in originals.items():
+        (root / rel).write_bytes(content)
+    return html
+
+
+def test_late_llm_answer_is_used_by_the_next_run(report_dir, monkeypatch):
+    calls = []
+    answered = threading.Event()
+
+    def ask_gpt(statistics_content, form_data):
+        calls.append(time.monotonic())
+        time.sleep(0.5)
+        return 'AI analysis'
+
+    monkeypatch.setattr(report_utils, 'ask_gpt', ask_gpt)
+    monkeypatch.setattr(report_utils, 'analyze_errors', lambda js_path: 'errors analysis')
+    monkeypatch.setattr(report_utils, 'LLM_SUMMARY_TIMEOUT', 0.1)
+    store_value = report_utils.store_value
+    monkeypatch.setattr(report_utils, 'store_value', lambda *args: (store_value(*args), answered.set()))
+
+    started = time.monotonic()
+    first = run_stage(report_dir)
+    assert time.monotonic() - started < 0.5
+    assert 'rule-based, AI analysis unavailable' in first
+
+    # a run while the call is still going waits on it instead of calling again
+    second = run_stage(report_dir)
+    assert len(calls) == 1 and 'AI analysis unavailable' in second
+
+    assert answered.wait(5)
+    third = run_stage(report_dir)
+    assert len(calls) == 1
+    assert 'AI analysis' in third and 'AI analysis unavailable' not in third
+
+
+def test_llm_is_retried_after_failed_call(report_dir, monkeypatch):
+    calls = []
+
+    def ask_gpt(statistics_content, form_data):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('rate limited')
+        return 'AI analysis'
+
+    monkeypatch.setattr(report_utils, 'ask_gpt', ask_gpt)
+    monkeypatch.setattr(report_utils, 'analyze_errors', lambda js_path: 'errors analysis')
+
+    first = run_stage(report_dir)
+    assert 'rule-based, AI analysis unavailable' in first
+
+    second = run_stage(report_dir)
+    assert len(calls) == 2
+    assert 'AI analysis' in second and 'AI analysis unavailable' not in second
+
+    # a complete run is cached: the third run replays it without calling the LLM
+    third = run_stage(report_dir)
+    assert len(calls) == 2
+    assert third == second
+
+
+def test_degraded_output_is_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_ENABLED', True)
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_DIR', str(tmp_path / 'cache'))
+    (tmp_path / 'out.txt').write_text('input')
+    runs = []
+
+    def edit():
+        runs.append(1)
+        (tmp_path / 'out.txt').write_text('edited')
+        return len(runs) == 1
+
+    for _ in range(3):
+        (tmp_path / 'out.txt').write_text('input')
+        stage_cache.run_file_stage('edit', str(tmp_path), ['out.txt'], None, edit,
+                                   cache_if=lambda degraded: not degraded)
+        assert (tmp_path / 'out.txt').read_text() == 'edited'
+    assert len(runs) == 2
+    assert len(os.listdir(tmp_path / 'cache' / 'edit')) == 1
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_ENABLED', True)
+    monkeypatch.setattr(stage_cache, 'REPORT_CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+def age(path, hours):
+    old = time.time() - hours * 3600
+    os.utime(path, (old, old))
+
+
+def test_reused_entry_is_not_pruned(cache_dir, tmp_path):
+    (tmp_path / 'out.txt').write_text('input')
+    stage_cache.run_file_stage('edit', str(tmp_path), ['out.txt'], None,
+                               lambda: (tmp_path / 'out.txt').write_text('edited'))
+    (entry,) = (cache_dir / 'edit').iterdir()
+    age(entry, 10)
+
+    (tmp_path / 'out.txt').write_text('input')
+    stage_cache.run_file_stage('edit', str(tmp_path), ['out.txt'], None, lambda: pytest.fail('not replayed'))
+    stage_cache.prune_cache(max_age_hours=5)
+    assert entry.is_dir()
+
+
+def test_extraction_in_use_is_not_pruned(cache_dir, tmp_path):
+    with zipfile.ZipFile(tmp_path / 'report.zip', 'w') as archive:
+        archive.writestr('index.html', '<html></html>')
+    with stage_cache.extract_zip_cached(str(tmp_path / 'report.zip'), str(tmp_path / 'dest')) as (folder, cached):
+        assert cached
+        age(folder, 10)
+        stage_cache.prune_cache(max_age_hours=5)
+        assert os.listdir(folder) == ['index.html']
+
+    age(folder, 10)
+    stage_cache.prune_cache(max_age_hours=5)
+    assert os.listdir(cache_dir / stage_cache.EXTRACT_STAGE) == []
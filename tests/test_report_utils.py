@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from utils.report_utils import downsample_graph_data, lttb_downsample, prerender_statistics_table
+
+TITLES = ["Label", "#Samples", "FAIL", "Error %", "Average", "90th pct"]
+
+
+def statistics_js(items, series_filter='', show_controllers_only=False):
+    info = {"supportsControllersDiscrimination": True, "overall": {"data": ["Total", 1, 0, 0.0, 1.0, 1.0]},
+            "titles": TITLES, "items": items}
+    return (f'var showControllersOnly = {json.dumps(show_controllers_only)};\n'
+            f'var seriesFilter = {json.dumps(series_filter)};\n'
+            'var filtersOnlySampleSeries = true;\n'
+            '$(document).ready(function() {\n'
+            f'    createTable($("#statisticsTable"), {json.dumps(info)}, function(index, item){{\n'
+            '        return item;\n'
+            '    }, [[0, 0]], 0, summaryTableHeader);\n'
+            '});\n')
+
+
+def item(label, controller=False):
+    return {"data": [label, 10, 0, 0.0, 100.0, 900.0], "isController": controller}
+
+
+@pytest.fixture
+def render(tmp_path):
+    def render(items, page_size=2, **settings):
+        (tmp_path / 'index.html').write_text('<table id="statisticsTable" class="table"></table>')
+        (tmp_path / 'dashboard.js').write_text(statistics_js(items, **settings))
+        (tmp_path / 'dashboard.css').write_text('')
+        prerender_statistics_table(str(tmp_path / 'index.html'), str(tmp_path / 'dashboard.js'),
+                                   str(tmp_path / 'dashboard.css'), '1000', '3', page_size)
+        return (tmp_path / 'index.html').read_text(), (tmp_path / 'dashboard.js').read_text()
+    return render
+
+
+def labels(html):
+    body = html.split('<tbody class="statistics-rows">', 1)[1]
+    return [row.split('<td>', 1)[1].split('</td>', 1)[0] for row in body.split('<tr')[1:]]
+
+
+def test_rows_are_one_sortable_body_in_default_order(render):
+    html, js = render([item('checkout'), item('Browse'), item('login'), item('add to cart'), item('Admin')])
+    assert html.count('<tbody') == 2  # the overall row and every item row
+    assert labels(html) == ['add to cart', 'Admin', 'Browse', 'checkout', 'login']
+    assert html.count('statistics-hidden') == 3
+    assert 'createTable(' not in js and 'sortList: [[0, 0]]' in js and 'var pageSize = 2' in js
+
+
+def test_series_filter_of_dashboard_is_applied(render):
+    html, _ = render([item('login'), item('logout'), item('search')], series_filter='^log')
+    assert labels(html) == ['login', 'logout']
+
+
+def test_controllers_only_setting_is_applied(render):
+    html, _ = render([item('TC01 Login', controller=True), item('/api/login')], show_controllers_only=True)
+    assert labels(html) == ['TC01 Login']
+
+
+def test_lttb_keeps_endpoints_and_one_point_per_bucket():
+    points = [[x, (x * 37) % 11] for x in range(1000)]
+    sampled = lttb_downsample(points, 50)
+    assert len(sampled) == 50
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    xs = [x for x, _ in sampled]
+    assert xs == sorted(set(xs))
+    every = (len(points) - 2) / 48
+    for i, x in enumerate(xs[1:-1]):
+        assert int(i * every) + 1 <= x < int((i + 1) * every) + 1
+
+
+def test_lttb_keeps_spikes():
+    points = [[x, 1] for x in range(500)]
+    points[123][1] = 100
+    points[321][1] = -50
+    sampled = lttb_downsample(points, 20)
+    assert [123, 100] in sampled and [321, -50] in sampled
+
+
+def test_lttb_leaves_short_series_alone():
+    points = [[0, 1], [1, 5], [2, 3], [3, 2]]
+    assert lttb_downsample(points, 4) == points
+    assert lttb_downsample(points, 10) == points
+    assert lttb_downsample(points, 2) == points
+
+
+def test_graph_series_downsampled_except_distributions(tmp_path):
+    series = [[x, x % 7] for x in reversed(range(300))]
+    graph_js = tmp_path / 'graph.js'
+    graph_js.write_text(
+        f'var responseTimesOverTimeInfos = {{ data: {json.dumps({"result": {"series": [{"data": series}]}})}, '
+        'getOptions: function() { return {}; } };\n'
+        f'var responseTimeDistributionInfos = {{ data: {json.dumps({"result": {"series": [{"data": series}]}})} }};\n')
+    downsample_graph_data(str(graph_js), max_points=30)
+    over_time, distribution = graph_js.read_text().split('\n')[:2]
+    over_time_data = json.JSONDecoder().raw_decode(over_time, over_time.index('data: ') + 6)[0]
+    distribution_data = json.JSONDecoder().raw_decode(distribution, distribution.index('data: ') + 6)[0]
+    sampled = over_time_data['result']['series'][0]['data']
+    assert len(sampled) == 30 and sampled[0] == [0, 0] and sampled[-1] == [299, 299 % 7]
+    assert 'getOptions: function()' in over_time
+    assert distribution_data['result']['series'][0]['data'] == series
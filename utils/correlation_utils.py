@@ -1,16 +1,27 @@
 import re
+import sys
 import json
+import math
+import bisect
+import codecs
 import logging
+import mmap
+import pickle
+import tempfile
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from lxml import etree as ET
-import anthropic
 import os
 import uuid
 import urllib.parse  # Add for URL encoding/decoding
 from flask import current_app
-from openai import OpenAI
 
-from config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, OPENAI_API_KEY, OPENAI_MODEL
-import openai
+from config import CORRELATION_WORKERS, CORRELATION_START_METHOD, CORRELATION_PARALLEL_MIN_REQUESTS, \
+    CORRELATION_CACHE_MAX_BYTES, CORRELATION_MIN_SCORE, CORRELATION_ANALYSES_MAX
+from utils.stage_cache import file_digest
 
 
 def is_valid_xml_char(codepoint):
@@ -36,13 +47,250 @@ def remove_invalid_xml_references(text):
     return re.sub(r'&#(x?[0-9A-Fa-f]+);', replace_entity, text)
 
 
-def clean_and_parse_xml(filepath):
+# Trailing text that could still become a character reference once the next chunk arrives
+_PARTIAL_REFERENCE_RE = re.compile(r'&(#(x?[0-9A-Fa-f]*)?)?$')
+XML_READ_CHUNK = 1024 * 1024
+
+
+def iter_sanitized_chunks(filepath, chunk_size=None):
+    """Yield the cleaned XML of `filepath` as utf-8 bytes, one bounded chunk at a time.
+
+    Decodes incrementally (utf-8, invalid bytes dropped) and applies
+    remove_invalid_xml_references per chunk, holding back a trailing partial `&#...` so
+    references split across chunks are cleaned exactly as in a whole-document pass.
+    """
+    chunk_size = chunk_size or XML_READ_CHUNK
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    carry = ''
     with open(filepath, 'rb') as f:
-        raw = f.read()
+        while True:
+            raw = f.read(chunk_size)
+            eof = not raw
+            text = carry + decoder.decode(raw, final=eof)
+            carry = ''
+            if not eof:
+                partial = _PARTIAL_REFERENCE_RE.search(text, max(0, text.rfind('&')))
+                if partial:
+                    text, carry = text[:partial.start()], text[partial.start():]
+            if text:
+                yield remove_invalid_xml_references(text).encode('utf-8')
+            if eof:
+                return
+
+
+def iter_xml_events(filepath, events=('start', 'end')):
+    """Feed sanitized chunks into an incremental lxml parser and yield its (event, element) pairs"""
+    parser = ET.XMLPullParser(events=events, huge_tree=True)
+    for chunk in iter_sanitized_chunks(filepath):
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def is_sample_tag(tag):
+    """Whether an element tag is a JMeter sample (httpSample, sample, *Sample, HTTPSampler...)"""
+    if not isinstance(tag, str):
+        return False
+    tag_name = tag.split('}')[-1] if '}' in tag else tag
+    return (
+        tag_name.endswith('Sample') or
+        tag_name == 'sample' or
+        tag_name == 'httpSample' or
+        'httpsample' in tag_name.lower() or
+        'HTTPSampler' in tag_name
+    )
+
+
+def approx_size(value):
+    """Approximate bytes held by `value` and the containers / slotted objects it references"""
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__slots__'):
+            stack.extend(getattr(item, name) for name in item.__slots__ if hasattr(item, name))
+        elif hasattr(item, '__dict__'):
+            stack.extend(vars(item).values())
+    return size
+
+
+class HeaderMap:
+    """Multimap of an HTTP header block: recorded (name, value) pairs in order.
+
+    Names keep their recorded case; lookups ignore case. Lines without a `name:` prefix (the
+    status or request line) are skipped.
+    """
+    __slots__ = ('items',)
+
+    def __init__(self, text=''):
+        self.items = []
+        for line in text.splitlines():
+            name, sep, value = line.partition(':')
+            name = name.strip()
+            if sep and name and ' ' not in name:
+                self.items.append((name, value.strip()))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def get_all(self, name):
+        name = name.lower()
+        return [value for key, value in self.items if key.lower() == name]
+
+    def get(self, name, default=None):
+        values = self.get_all(name)
+        return values[0] if values else default
+
+    def find(self, value):
+        """Name of the first header whose value contains `value`, or None"""
+        for name, header_value in self.items:
+            if value in header_value:
+                return name
+        return None
+
+
+class SampleRecord:
+    """Compact request/response fields of one recorded sample (no XML node is retained).
+
+    The response header and body share one buffer, `header + '\\n' + body`, which is exactly
+    the text correlations are searched in; header and body are views computed on demand.
+    Labels and methods are interned since recordings repeat them heavily. The request header
+    block is parsed into a HeaderMap on first use.
+    """
+    __slots__ = ('label', 'method', 'url', 'url_is_direct', 'path', 'request_header', 'request_body',
+                 'response', 'header_end', '_request_headers')
+
+    def __init__(self, label, method, url, url_is_direct, path, request_header, request_body,
+                 response_header, response_body):
+        self.label = sys.intern(label)
+        self.method = sys.intern(method)
+        self.url = url
+        self.url_is_direct = url_is_direct
+        self.path = path
+        self.request_header = request_header
+        self.request_body = request_body
+        self.response = response_header + '\n' + response_body
+        self.header_end = len(response_header)
+        self._request_headers = None
+
+    @property
+    def request_headers(self):
+        if self._request_headers is None:
+            self._request_headers = HeaderMap(self.request_header)
+        return self._request_headers
+
+    @property
+    def response_header(self):
+        return self.response[:self.header_end]
+
+    @property
+    def response_body(self):
+        return self.response[self.header_end + 1:]
+
+    @property
+    def full_response(self):
+        return self.response
+
+
+def read_sample_record(node):
+    """Extract a SampleRecord from a sample element; `url` is None when no URL can be found."""
+    # More robust URL extraction with multiple fallbacks
+    url = None
+    url_is_direct = False
+    # Try all possible locations for URL
+    for url_path in ['java.net.URL', 'URL', 'url', './/java.net.URL', './/URL', './/url']:
+        try:
+            url_elem = node.find(url_path)
+            if url_elem is not None and url_elem.text:
+                url = url_elem.text
+                url_is_direct = url_path == 'java.net.URL'
+                break
+
+            # Try as a direct text element
+            url_text = node.findtext(url_path)
+            if url_text:
+                url = url_text
+                break
+        except:
+            continue
+
+    # Also check for samplerData which may contain the URL for OPTIONS requests
+    if not url:
+        sampler_data = node.findtext('samplerData') or ''
+        if sampler_data:
+            url_match = re.search(r'(https?://[^\s]+)', sampler_data)
+            if url_match:
+                url = url_match.group(1)
+
+    label = node.get('lb') or 'No_Label'
+    method = node.findtext('method') or node.get('mc', '')
+
+    # Better handling of response data
+    response_header = node.findtext('responseHeader') or ''
+    response_body = node.findtext('responseData') or ''
+
+    # Handle non-text response data
+    if not response_body or 'Non-TEXT response data' in response_body:
+        response_body = f"[Binary data: {label}]"
+        if url:
+            current_app.logger.debug(f"Binary response detected for {label}, URL: {url}")
+
+    return SampleRecord(
+        label=label,
+        method=method,
+        url=url or None,
+        url_is_direct=url_is_direct,
+        path=node.findtext('path') or '',
+        request_header=node.findtext('requestHeader') or '',
+        request_body=node.findtext('queryString') or '',
+        response_header=response_header,
+        response_body=response_body
+    )
+
+
+def iter_sample_elements(xml_path, predicate=None):
+    """Stream sample elements as (document_order, element) once each element is complete.
+
+    Elements are yielded at their end event, so a parent sample comes after its sub-samples;
+    `document_order` is the pre-order position to restore the tree-walk order. A sample's
+    subtree stays available while it is yielded (parents still see their sub-samples); every
+    top-level element is cleared, with its preceding siblings, right after it completes, so
+    memory is bounded by the largest top-level sample.
+    """
+    order = 0
+    positions = {}
+    depth = 0
+    for event, elem in iter_xml_events(xml_path):
+        if event == 'start':
+            depth += 1
+            if (predicate or is_sample_tag)(elem.tag):
+                positions[elem] = order
+                order += 1
+            continue
 
-    decoded = raw.decode('utf-8', errors='ignore')
-    cleaned = remove_invalid_xml_references(decoded)
-    return ET.fromstring(cleaned.encode('utf-8'))
+        depth -= 1
+        position = positions.pop(elem, None)
+        if position is not None:
+            yield position, elem
+        if depth == 1:
+            elem.clear()
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
 
 
 def extract_dynamic_patterns(text, value):
@@ -64,6 +312,285 @@ def extract_dynamic_patterns(text, value):
         return []
 
 
+def find_dynamic_patterns(text, value, limit=3):
+    """Same result as extract_dynamic_patterns(text, value)[:limit], without a regex scan.
+
+    The lazy `(.{0,20}?)` prefix of that pattern always starts at the latest of: the end of the
+    previous match, 20 characters before the value, or just after the last newline; the lazy
+    suffix is always empty.
+    """
+    if not text or not value:
+        return []
+    patterns = []
+    pos = 0
+    while len(patterns) < limit:
+        q = text.find(value, pos)
+        if q == -1:
+            break
+        start = max(pos, q - 20, text.rfind('\n', pos, q) + 1)
+        patterns.append(f"{text[start:q]}(.+?)")
+        pos = q + len(value)
+    return patterns
+
+
+JSON_PATH_KEY_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def json_path_step(path, key):
+    """Append an object member (str key) or array element (int index) to a JSONPath"""
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if JSON_PATH_KEY_RE.match(key):
+        return f"{path}.{key}"
+    escaped = key.replace('\\', '\\\\').replace("'", "\\'")
+    return f"{path}['{escaped}']"
+
+
+def json_value_paths(text):
+    """Map each scalar of a JSON document to the JSONPath of its first occurrence.
+
+    Scalars are keyed by their JSON text form (strings as-is, `true`, `12.5`...), which is how
+    they appear in the response; non-JSON text gives an empty map.
+    """
+    text = text.strip()
+    if not text or text[0] not in '{[':
+        return {}
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+
+    paths = {}
+
+    def walk(node, path):
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, child in items:
+            if isinstance(child, (dict, list)):
+                walk(child, json_path_step(path, key))
+            elif child is not None:
+                if not isinstance(child, str):
+                    child = 'true' if child is True else 'false' if child is False else repr(child)
+                if child not in paths:
+                    paths[child] = json_path_step(path, key)
+
+    if isinstance(data, (dict, list)):
+        walk(data, '$')
+    return paths
+
+
+# Runs of characters that make up typical dynamic values (ids, tokens, URL-encoded data)
+VALUE_TOKEN_RE = re.compile(r'[\w\-.~%+/=]+')
+# Tokens longer than this are not trigram-indexed and are scanned directly instead
+MAX_TRIGRAM_TOKEN = 512
+
+
+class ResponseIndex:
+    """Inverted index over response texts for correlation source lookup.
+
+    Every response is tokenized once into VALUE_TOKEN_RE runs; each distinct token maps to a
+    bitset of the responses containing it, and tokens are trigram-indexed. A value can only
+    occur in a response if each of its own token runs is a substring of one of that response's
+    tokens, which narrows the candidates before the exact `value in text` check. Lookups are
+    memoized per value, so each request costs a bisect over the value's sorted source list.
+
+    With a ResponseCorpus the exact checks and pattern extraction read the mapped corpus
+    instead of `texts`, which are then only needed while the index is built.
+
+    `body_offsets` (where each response body starts in its text) enables json_path() and
+    source_header(): a JSON body is parsed once, on first use, into a value -> JSONPath map,
+    and a header block into a HeaderMap, which are then probed.
+
+    `size` approximates the bytes held by the index and its lookup caches (not the texts).
+    """
+
+    def __init__(self, texts, corpus=None, body_offsets=None):
+        self.texts = texts if corpus is None else corpus
+        self.corpus = corpus
+        self.body_offsets = body_offsets
+        self._json_paths = {}
+        self._headers = {}
+        self.vocabulary = []
+        self.postings = []
+        token_ids = {}
+        count = 0
+        for i, text in enumerate(texts):
+            count += 1
+            bit = 1 << i
+            for token in set(VALUE_TOKEN_RE.findall(text)):
+                token_id = token_ids.get(token)
+                if token_id is None:
+                    token_id = token_ids[token] = len(self.vocabulary)
+                    self.vocabulary.append(token)
+                    self.postings.append(0)
+                self.postings[token_id] |= bit
+
+        self.trigrams = {}
+        self.long_tokens = []
+        for token_id, token in enumerate(self.vocabulary):
+            if len(token) > MAX_TRIGRAM_TOKEN:
+                self.long_tokens.append(token_id)
+                continue
+            for gram in {token[j:j + 3] for j in range(len(token) - 2)}:
+                self.trigrams.setdefault(gram, []).append(token_id)
+
+        self.all_responses = (1 << count) - 1
+        self._run_cache = {}
+        self._value_cache = {}
+        self._pattern_cache = {}
+        self.size = approx_size((self.vocabulary, self.postings, self.trigrams, self.long_tokens))
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        self.size += approx_size((key, value))
+        return value
+
+    def _responses_with_run(self, run):
+        """Bitset of responses having a token that contains `run`."""
+        cached = self._run_cache.get(run)
+        if cached is not None:
+            return cached
+        vocabulary = self.vocabulary
+        if len(run) < 3:
+            token_ids = [tid for tid, token in enumerate(vocabulary) if run in token]
+        else:
+            postings = sorted((self.trigrams.get(run[j:j + 3], ()) for j in range(len(run) - 2)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(posting)
+            token_ids = [tid for tid in candidates if run in vocabulary[tid]]
+            token_ids.extend(tid for tid in self.long_tokens if run in vocabulary[tid])
+        bits = 0
+        for tid in token_ids:
+            bits |= self.postings[tid]
+        return self._remember(self._run_cache, run, bits)
+
+    def responses_containing(self, value):
+        """Sorted indices of all responses whose text contains `value`."""
+        cached = self._value_cache.get(value)
+        if cached is not None:
+            return cached
+        candidates = self.all_responses
+        for run in set(VALUE_TOKEN_RE.findall(value)):
+            candidates &= self._responses_with_run(run)
+            if not candidates:
+                break
+        if self.corpus is not None:
+            contains = self.corpus.matcher(value)
+        else:
+            texts = self.texts
+            contains = lambda i: value in texts[i]
+        found = []
+        while candidates:
+            low = candidates & -candidates
+            i = low.bit_length() - 1
+            if contains(i):
+                found.append(i)
+            candidates ^= low
+        return self._remember(self._value_cache, value, found)
+
+    def sources_before(self, value, idx):
+        """Indices of responses before request `idx` containing `value` (ascending)."""
+        found = self.responses_containing(value)
+        return found[:bisect.bisect_left(found, idx)]
+
+    def json_path(self, resp_idx, value):
+        """JSONPath of `value` as a scalar of response `resp_idx`'s JSON body, or None"""
+        if self.body_offsets is None:
+            return None
+        paths = self._json_paths.get(resp_idx)
+        if paths is None:
+            text = self.texts[resp_idx]
+            paths = self._remember(self._json_paths, resp_idx, json_value_paths(text[self.body_offsets[resp_idx]:]))
+        return paths.get(value)
+
+    def source_header(self, resp_idx, value):
+        """Name of the response header of `resp_idx` carrying `value` (Set-Cookie, Location...), or None"""
+        if self.body_offsets is None:
+            return None
+        headers = self._headers.get(resp_idx)
+        if headers is None:
+            text = self.texts[resp_idx]
+            headers = self._remember(self._headers, resp_idx, HeaderMap(text[:self.body_offsets[resp_idx] - 1]))
+        return headers.find(value)
+
+    def patterns(self, resp_idx, value, limit=3):
+        key = (resp_idx, value)
+        cached = self._pattern_cache.get(key)
+        if cached is None:
+            cached = self._remember(self._pattern_cache, key, find_dynamic_patterns(self.texts[resp_idx], value, limit))
+        return list(cached)
+
+
+class ResponseCorpus:
+    """Response texts stored back to back as UTF-8 in a read-only memory-mapped file.
+
+    Lets worker processes share the responses instead of receiving them pickled. UTF-8 is
+    self-synchronizing, so a byte-level find within a response's span gives the same answer as
+    `value in text`; only the responses patterns are taken from are ever decoded.
+    """
+    DECODED_CACHE_SIZE = 256
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self._file = open(path, 'rb')
+        # mmap cannot map an empty file; an empty corpus has nothing to search anyway
+        size = offsets[-1]
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._decoded = {}
+
+    @classmethod
+    def create(cls, texts):
+        """Write `texts` to a new temporary corpus file; the creator removes it with close(unlink=True)."""
+        fd, path = tempfile.mkstemp(prefix='correlation_corpus_', suffix='.bin')
+        offsets = [0]
+        with os.fdopen(fd, 'wb') as f:
+            for text in texts:
+                data = text.encode('utf-8', 'surrogatepass')
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        return cls(path, offsets)
+
+    def __getstate__(self):
+        return {'path': self.path, 'offsets': self.offsets}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['offsets'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        text = self._decoded.get(i)
+        if text is None:
+            if len(self._decoded) >= self.DECODED_CACHE_SIZE:
+                self._decoded.clear()
+            text = self._decoded[i] = self.read(i)
+        return text
+
+    def read(self, i):
+        return self._map[self.offsets[i]:self.offsets[i + 1]].decode('utf-8', 'surrogatepass')
+
+    def matcher(self, value):
+        """Predicate telling whether response i contains `value`."""
+        needle = value.encode('utf-8', 'surrogatepass')
+        find = self._map.find
+        offsets = self.offsets
+        return lambda i: find(needle, offsets[i], offsets[i + 1]) != -1
+
+    def close(self, unlink=False):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+        if unlink:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
 def get_encoding_variations(value):
     """
     Generate variations of the value with different URL encoding/decoding
@@ -147,6 +674,42 @@ def flatten_json(y, parent_key='', sep='.'):
     return items
 
 
+# Values that are never worth a response search however often they occur
+CONSTANT_VALUES = {'true', 'false', 'null', 'none', 'undefined', 'yes', 'no', 'on', 'off'}
+# Shapes that are dynamic whatever their entropy: GUIDs, JWTs, long hex and base64 strings
+DYNAMIC_VALUE_SHAPES = [
+    re.compile(r'^\{?[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\}?$'),
+    re.compile(r'^eyJ[\w-]+\.[\w-]+\.[\w-]*$'),
+    re.compile(r'^[0-9a-fA-F]{16,}$'),
+    re.compile(r'^(?=.*[0-9])(?=.*[a-z])(?=.*[A-Z])[A-Za-z0-9+/_-]{16,}(?:=|%3D){0,2}$'),
+]
+CHARACTER_CLASSES = (str.isdigit, str.islower, str.isupper)
+
+
+def score_dynamic_value(value, repeat_ratio=0.0):
+    """Rate (0-1) how likely a parameter value is dynamic rather than a constant.
+
+    Known shapes score 1. Anything else scores by its total Shannon entropy (32 bits or
+    more saturates) weighted by how many character classes it mixes; long digit strings
+    (ids, timestamps) score at least 0.5. Values sent by a large share of the requests
+    (`repeat_ratio`) are discounted by up to half.
+    """
+    if len(value) < 3 or value.lower() in CONSTANT_VALUES:
+        return 0.0
+    if any(shape.match(value) for shape in DYNAMIC_VALUE_SHAPES):
+        return 1.0
+
+    length = len(value)
+    entropy = -sum(count / length * math.log2(count / length) for count in collections.Counter(value).values())
+    classes = sum(1 for is_class in CHARACTER_CLASSES if any(is_class(ch) for ch in value))
+    if not all(ch.isalnum() for ch in value):
+        classes += 1
+    score = min(1.0, entropy * length / 32) * (0.5 + 0.125 * classes)
+    if value.isdigit() and length >= 5:
+        score = max(score, 0.5)
+    return round(score * (1 - 0.5 * repeat_ratio), 3)
+
+
 def normalize_url(url):
     return url.replace('https://', '').replace('http://', '').strip().lower()
 
@@ -165,329 +728,584 @@ def url_matches_filter(request_url, filters):
     return False
 
 
-def analyze_jmeter_correlations(xml_path, url_filter=''):
-    requests = []
-    responses = []
-    all_previous_responses = []
-    skipped_samples = 0
-    total_samples = 0
-    processed_labels = set()  # Track which labels we've processed
+# Authorization schemes whose credentials are per-session tokens (Basic credentials are static)
+TOKEN_AUTH_SCHEMES = {'bearer', 'token'}
+# X- request headers set by clients or proxies rather than by the application
+IGNORED_X_HEADERS = {'x-requested-with', 'x-forwarded-for', 'x-forwarded-host', 'x-forwarded-proto',
+                     'x-forwarded-port', 'x-real-ip'}
 
-    def collect_samples(node):
-        nonlocal skipped_samples, total_samples
+
+def request_params(req):
+    """Parameters of a request (URL query and body, or a form body) as a name -> value dict"""
+    # Extract parameters from both URL and request body
+    url_query = ''
+    if req.url and '?' in req.url:
+        parts = req.url.split('?', 1)
+        if len(parts) > 1:
+            url_query = parts[1]
+            
+    params = extract_params(url_query)
+    body_params = extract_params(req.request_body)
+    params.update(body_params)
+
+    # Try to extract parameters from headers for more coverage
+    if not params and req.request_headers:
+        content_type = req.request_headers.get('Content-Type', '')
+
+        # If it's a form submission, try to parse the body differently
+        if "application/x-www-form-urlencoded" in content_type:
+            body_params = extract_params(req.request_body)
+            params.update(body_params)
+    return params
+
+
+def request_header_params(req):
+    """Token-carrying request headers as a header name -> value dict.
+
+    Bearer/token credentials of Authorization (without the scheme) and custom X- headers
+    (CSRF tokens, session or request ids) are candidates; infrastructure X- headers are not.
+    """
+    params = {}
+    for name, value in req.request_headers:
+        lower = name.lower()
+        if lower == 'authorization':
+            scheme, _, credentials = value.partition(' ')
+            if not credentials:
+                params[name] = scheme
+            elif scheme.lower() in TOKEN_AUTH_SCHEMES:
+                params[name] = credentials.strip()
+        elif lower.startswith('x-') and lower not in IGNORED_X_HEADERS:
+            params[name] = value
+    return params
+
+
+def count_param_values(requests):
+    """Number of requests sending each parameter value (query, body or header)"""
+    counts = collections.Counter()
+    for req in requests:
+        values = set(request_params(req).values()) | set(request_header_params(req).values())
+        counts.update(value for value in values if value)
+    return counts
+
+
+def correlate_request(idx, req, url_filters, response_index, labels, logger, value_counts=None):
+    """Correlation details of request `idx`, or None when it is filtered out.
+
+    `index` (and the `index` of each source) is the request's position in the recording's
+    analysed requests. Parameters sent in a request header (request_header_params) are marked
+    `in_header`. A source's `json_path` locates the value in a JSON response body and its
+    `source_header` names the response header carrying it. Parameter values scoring below
+    CORRELATION_MIN_SCORE (see score_dynamic_value) are treated as constants: they are not
+    searched for and are left out of `params`, and `pruned_params` counts them.
+
+    Args:
+        idx (int): Position of the request in document order
+        req: Request fields (url, request_headers, request_body, label, method)
+        url_filters (list): URL substrings to keep (empty keeps everything)
+        response_index (ResponseIndex): Index over the responses of all requests
+        labels (list): Labels of all requests, for naming the source samples
+        logger: Logger for debug output
+        value_counts (Counter): Requests sending each value (count_param_values), for scoring
+    """
+    # Skip invalid requests
+    if not req.url:
+        return None
         
-        # Enhanced sample node detection logic
-        is_sample = False
-        tag_name = ""
-        if node.tag is not None:
-            tag_name = node.tag.split('}')[-1] if '}' in node.tag else node.tag
-            is_sample = (
-                tag_name.endswith('Sample') or 
-                tag_name == 'sample' or 
-                tag_name == 'httpSample' or
-                'httpsample' in tag_name.lower() or
-                'HTTPSampler' in tag_name
-            )
+    # Improved URL filter logic
+    if url_filters and not url_matches_filter(req.url, url_filters):
+        logger.debug(f"Filtered out URL: {req.url}")
+        return None
+
+    params = [(name, value, False) for name, value in request_params(req).items()]
+    params.extend((name, value, True) for name, value in request_header_params(req).items())
+    if not params:
+        logger.debug(f"No parameters found for request: {req.label}, URL: {req.url}")
+        # Include parameterless requests in results anyway
+        return {
+            'index': idx,
+            'label': req.label,
+            'method': req.method,
+            'url': req.url,
+            'params': []
+        }
+
+    param_details = []
+    pruned_params = 0
+    for param_name, param_value, in_header in params:
+        if not param_value:
+            continue
+
+        repeat_ratio = value_counts[param_value] / len(labels) if value_counts else 0.0
+        score = score_dynamic_value(param_value, repeat_ratio)
+        if score < CORRELATION_MIN_SCORE:
+            logger.debug(f"Skipping constant-like value of {param_name} (score {score}): {param_value}")
+            pruned_params += 1
+            continue
+
+        # Store the original value before any decoding
+        original_param_value = param_value
         
-        if is_sample:
-            total_samples += 1
-            
-            # More robust URL extraction with multiple fallbacks
-            url = None
-            # Try all possible locations for URL
-            for url_path in ['java.net.URL', 'URL', 'url', './/java.net.URL', './/URL', './/url']:
-                try:
-                    url_elem = node.find(url_path)
-                    if url_elem is not None and url_elem.text:
-                        url = url_elem.text
-                        break
-                    
-                    # Try as a direct text element
-                    url_text = node.findtext(url_path)
-                    if url_text:
-                        url = url_text
-                        break
-                except:
-                    continue
-                
-            # Also check for samplerData which may contain the URL for OPTIONS requests
-            if not url:
-                sampler_data = node.findtext('samplerData') or ''
-                if sampler_data:
-                    url_match = re.search(r'(https?://[^\s]+)', sampler_data)
-                    if url_match:
-                        url = url_match.group(1)
+        # Prepare variations for searching
+        decoded_param_value = None
+        encoded_param_value = None
+        
+        try:
+            # Check if it's URL-encoded
+            decoded_param_value = urllib.parse.unquote(param_value)
+            if decoded_param_value == param_value:
+                decoded_param_value = None  # Not actually encoded
             
+            # Also prepare encoded version
+            encoded_param_value = urllib.parse.quote(param_value)
+            if encoded_param_value == param_value:
+                encoded_param_value = None  # Already encoded or doesn't need encoding
+        except Exception as e:
+            logger.debug(f"Error determining encoding for {param_value}: {str(e)}")
+
+        # Search previous responses with the original value first, then decoded, then encoded
+        matching_responses = []
+        for variation, variation_type in ((original_param_value, 'original'),
+                                          (decoded_param_value, 'decoded'),
+                                          (encoded_param_value, 'encoded')):
+            if not variation:
+                continue
+            sources = response_index.sources_before(variation, idx)
+            if sources:
+                matching_responses = [{
+                    'index': resp_idx,
+                    'label': labels[resp_idx],
+                    'matches': response_index.patterns(resp_idx, variation),  # Limit to first 3 matches
+                    'json_path': response_index.json_path(resp_idx, variation),
+                    'source_header': response_index.source_header(resp_idx, variation),
+                    'matched_variation': variation,
+                    'correlation_type': variation_type
+                } for resp_idx in (sources[0], sources[-1])]
+                all_matches_count = len(sources)
+                break
+
+        if matching_responses:
+            first_match = matching_responses[0]
+            last_match = matching_responses[-1]
+            correlation_type = first_match['correlation_type']
+
+            detail = {
+                'param': param_name,
+                'value': original_param_value,  # Always store original value
+                'correlated': True,
+                'correlation_type': correlation_type,
+                'encoded_value': encoded_param_value if correlation_type == 'encoded' or correlation_type == 'original' else None,
+                'decoded_value': decoded_param_value if correlation_type == 'decoded' or correlation_type == 'original' else None,
+                'first_source': {
+                    'index': first_match['index'],
+                    'label': first_match['label'],
+                    'matches': first_match['matches'],
+                    'json_path': first_match['json_path'],
+                    'source_header': first_match['source_header']
+                },
+                'nearest_source': {
+                    'index': last_match['index'],
+                    'label': last_match['label'],
+                    'matches': last_match['matches'],
+                    'json_path': last_match['json_path'],
+                    'source_header': last_match['source_header']
+                },
+                'all_matches_count': all_matches_count,
+                'score': score
+            }
+        else:
+            detail = {
+                'param': param_name,
+                'value': original_param_value,
+                'correlated': False,
+                'score': score
+            }
+        if in_header:
+            detail['in_header'] = True
+        param_details.append(detail)
+
+    return {
+        'index': idx,
+        'label': req.label,
+        'method': req.method,
+        'url': req.url,
+        'params': param_details,
+        'pruned_params': pruned_params
+    }
+
+
+# Request-side fields sent to pool workers; responses stay in the shared corpus
+RequestFields = collections.namedtuple('RequestFields', 'label method url request_headers request_body')
+
+# Correlation state of the analyses run on forked workers, by analysis token; the workers of
+# such a pool inherit the table, so concurrent analyses (one per server thread) never share state
+_fork_states = {}
+# Worker pools shared by the analyses of this process when workers are not forked, by start method
+_pools = {}
+_pools_lock = threading.Lock()
+# Correlation states a pooled worker has built, by analysis token (least recently used first)
+_worker_states = collections.OrderedDict()
+WORKER_STATES_KEPT = 2
+
+
+def _correlation_state(token, state_path):
+    """(response_index, labels, value_counts) of an analysis inside a worker process.
+
+    Forked workers (no `state_path`) take the state they inherited; pooled workers build the
+    index from the shared corpus described in `state_path` once per analysis and keep the
+    states of the WORKER_STATES_KEPT most recent analyses.
+    """
+    if state_path is None:
+        return _fork_states[token]
+    state = _worker_states.get(token)
+    if state is None:
+        with open(state_path, 'rb') as f:
+            corpus, body_offsets, labels, value_counts = pickle.load(f)
+        texts = (corpus.read(i) for i in range(len(corpus)))
+        state = _worker_states[token] = (ResponseIndex(texts, corpus, body_offsets), labels, value_counts)
+        while len(_worker_states) > WORKER_STATES_KEPT:
+            _, (evicted_index, _, _) = _worker_states.popitem(last=False)
+            evicted_index.corpus.close()
+    _worker_states.move_to_end(token)
+    return state
+
+
+def _correlate_shard(task):
+    token, state_path, shard = task
+    response_index, labels, value_counts = _correlation_state(token, state_path)
+    logger = logging.getLogger(__name__)
+    return [correlate_request(idx, req, [], response_index, labels, logger, value_counts) for idx, req in shard]
+
+
+def correlation_start_method():
+    """CORRELATION_START_METHOD when the platform has it, otherwise the first of forkserver / spawn it has"""
+    available = multiprocessing.get_all_start_methods()
+    for method in (CORRELATION_START_METHOD, 'forkserver', 'spawn'):
+        if method in available:
+            return method
+    return available[0]
+
+
+def correlation_pool(context, workers):
+    """Process pool of `context`'s start method shared by all analyses of this process, started on first use"""
+    with _pools_lock:
+        pool = _pools.get(context.get_start_method())
+        if pool is None:
+            pool = _pools[context.get_start_method()] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return pool
+
+
+def _discard_pool(pool):
+    """Drop a broken shared pool so the next analysis starts a new one"""
+    with _pools_lock:
+        for method, shared in list(_pools.items()):
+            if shared is pool:
+                del _pools[method]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def analyze_requests_in_pool(requests, indices, workers, value_counts=None):
+    """Run correlate_request for `requests[idx]` of every idx in `indices` on worker processes.
+
+    The responses are written once to a memory-mapped ResponseCorpus. By default
+    (CORRELATION_START_METHOD forkserver / spawn) the shards go to a pool started once per
+    process, whose workers build their own index from the corpus. With 'fork' a pool is forked
+    per analysis and its workers inherit the index built here, which saves the rebuilds but
+    forks the multithreaded server: only the forking thread is copied, so a lock another thread
+    holds at that moment (logging, an SDK's connection pool...) stays locked in the worker.
+    Requests are split into contiguous shards and the shard results are merged in order, so the
+    output equals the serial run.
+
+    Returns a dict of idx -> correlate_request result.
+    """
+    corpus = ResponseCorpus.create(record.full_response for record in requests)
+    token = uuid.uuid4().hex
+    state_path = None
+    try:
+        labels = [record.label for record in requests]
+        body_offsets = [record.header_end + 1 for record in requests]
+        context = multiprocessing.get_context(correlation_start_method())
+        if context.get_start_method() == 'fork':
+            _fork_states[token] = (ResponseIndex([record.full_response for record in requests], corpus, body_offsets),
+                                   labels, value_counts)
+        else:
+            fd, state_path = tempfile.mkstemp(prefix='correlation_state_', suffix='.pickle')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((corpus, body_offsets, labels, value_counts), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tasks = [(idx, RequestFields(requests[idx].label, requests[idx].method, requests[idx].url,
+                                     requests[idx].request_headers, requests[idx].request_body))
+                 for idx in indices]
+        shard_size = max(1, -(-len(tasks) // (workers * 4)))
+        shards = [(token, state_path, tasks[i:i + shard_size]) for i in range(0, len(tasks), shard_size)]
+        if state_path is None:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                shard_results = list(pool.map(_correlate_shard, shards))
+        else:
+            pool = correlation_pool(context, workers)
+            try:
+                shard_results = list(pool.map(_correlate_shard, shards))
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise
+    finally:
+        _fork_states.pop(token, None)
+        if state_path is not None:
+            os.remove(state_path)
+        corpus.close(unlink=True)
+    return dict(zip(indices, (result for results in shard_results for result in results)))
+
+
+def is_http_sample_tag(tag):
+    """Whether an element is one of the httpSample / sample elements JMX generation summarizes"""
+    return isinstance(tag, str) and (tag.endswith('httpSample') or tag.endswith('sample'))
+
+
+class ParsedRecording:
+    """Sample records of one recording plus the correlation state derived from them.
+
+    `requests` are the samples with a URL that correlation analysis runs over and
+    `http_samples` the labelled elements JMX generation summarizes; both are in document order and
+    share record objects. The response index and the per-request results are filled in on
+    first use, so analysing again with another URL filter only selects among computed results.
+    `size` approximates the bytes held by all of it (for cache eviction).
+    """
+
+    def __init__(self, requests, http_samples, total_samples):
+        self.requests = requests
+        self.http_samples = http_samples
+        self.total_samples = total_samples
+        self.labels = [record.label for record in requests]
+        self.request_results = {}
+        self._response_index = None
+        self._value_counts = None
+        self._lock = threading.Lock()
+        self._records_size = approx_size((requests, http_samples, self.labels))
+        self._results_size = 0
+
+    @property
+    def size(self):
+        size = self._records_size + self._results_size
+        if self._response_index is not None:
+            size += self._response_index.size
+        if self._value_counts is not None:
+            size += approx_size(self._value_counts)
+        return size
+
+    @property
+    def response_index(self):
+        if self._response_index is None:
+            self._response_index = ResponseIndex([record.full_response for record in self.requests],
+                                                 body_offsets=[record.header_end + 1 for record in self.requests])
+        return self._response_index
+
+    @property
+    def value_counts(self):
+        if self._value_counts is None:
+            self._value_counts = count_param_values(self.requests)
+        return self._value_counts
+
+    def correlate(self, url_filters, logger):
+        """Correlation results of the requests matching `url_filters`, in request order."""
+        selected = []
+        for idx, req in enumerate(self.requests):
+            if url_filters and not url_matches_filter(req.url, url_filters):
+                logger.debug(f"Filtered out URL: {req.url}")
+                continue
+            selected.append(idx)
+
+        with self._lock:
+            missing = [idx for idx in selected if idx not in self.request_results]
+            if CORRELATION_WORKERS > 1 and len(missing) >= CORRELATION_PARALLEL_MIN_REQUESTS:
+                logger.info(f"Correlating {len(missing)} requests on {CORRELATION_WORKERS} processes")
+                self.request_results.update(analyze_requests_in_pool(
+                    self.requests, missing, CORRELATION_WORKERS, self.value_counts))
+            else:
+                for idx in missing:
+                    self.request_results[idx] = correlate_request(
+                        idx, self.requests[idx], [], self.response_index, self.labels, logger, self.value_counts)
+            self._results_size += approx_size([self.request_results[idx] for idx in missing])
+        return [self.request_results[idx] for idx in selected if self.request_results[idx] is not None]
+
+
+def parse_recording(xml_path):
+    """Stream a recording into a ParsedRecording (load_recording is the cached entry point)"""
+    total_samples = 0
+    skipped_samples = 0
+
+    # Stream the recording; samples complete child-first, so restore document order afterwards
+    collected = []
+    try:
+        for position, node in iter_sample_elements(
+                xml_path, predicate=lambda tag: is_sample_tag(tag) or is_http_sample_tag(tag)):
+            record = read_sample_record(node)
+            analyzed = is_sample_tag(node.tag)
+            if analyzed:
+                total_samples += 1
+
             # Skip if no URL found
-            if not url:
+            if analyzed and not record.url:
+                analyzed = False
                 skipped_samples += 1
-                label = node.get('lb') or 'No_Label'
-                method = node.findtext('method') or node.get('mc', 'UNKNOWN')
-                current_app.logger.debug(f"Skipping sample without URL: Label={label}, Method={method}")
-                
+                method = record.method or node.get('mc', 'UNKNOWN') or 'UNKNOWN'
+                current_app.logger.debug(f"Skipping sample without URL: Label={record.label}, Method={method}")
+
                 # Try to extract any data available for debugging
                 for elem in node:
                     if elem.tag:
                         tag = elem.tag.split('}')[-1]
                         current_app.logger.debug(f"  Available data: {tag}={elem.text}")
-            else:
-                request_body = node.findtext('queryString') or ''
-                method = node.findtext('method') or node.get('mc', '')
-                request_header = node.findtext('requestHeader') or ''
-                label = node.get('lb') or 'No_Label'
-                
-                # Track if we've already processed a similar request to avoid duplicates
-                processed_labels.add(label)
-
-                # Better handling of response data
-                response_header = node.findtext('responseHeader') or ''
-                response_body = node.findtext('responseData') or ''
-                
-                # Handle non-text response data
-                if not response_body or 'Non-TEXT response data' in response_body:
-                    response_body = f"[Binary data: {label}]"
-                    current_app.logger.debug(f"Binary response detected for {label}, URL: {url}")
-                
-                # Build request and response objects
-                requests.append({
-                    'url': url,
-                    'method': method,
-                    'requestHeader': request_header,
-                    'requestBody': request_body,
-                    'label': label,
-                    'raw_node': node  # Store reference to original node for debugging
-                })
-                
-                responses.append({
-                    'responseHeader': response_header,
-                    'responseBody': response_body,
-                    'full_response': response_header + '\n' + response_body,
-                })
-
-        # Process all child nodes recursively
-        for child in node:
-            collect_samples(child)
 
-    try:
-        root = clean_and_parse_xml(xml_path)
-    except Exception as e:
+            collected.append((position, record, analyzed, is_http_sample_tag(node.tag) and bool(node.get('lb'))))
+    except (ET.XMLSyntaxError, OSError) as e:
         raise RuntimeError(f"Failed to parse cleaned XML: {e}")
 
-    collect_samples(root)
-    
+    collected.sort(key=lambda item: item[0])
+    requests = [record for _, record, analyzed, _ in collected if analyzed]
+    http_samples = [record for _, record, _, http_sample in collected if http_sample]
+    return ParsedRecording(requests, http_samples, total_samples)
+
+
+# Parsed recordings by content hash, least recently used first
+_recording_cache = collections.OrderedDict()
+_recording_cache_lock = threading.Lock()
+
+
+def trim_recording_cache():
+    """Evict least recently used recordings until the cached ones fit CORRELATION_CACHE_MAX_BYTES.
+
+    Sizes grow as recordings are analysed (response index, results), so this runs after every
+    analysis as well as on insertion.
+    """
+    with _recording_cache_lock:
+        cached_size = sum(entry.size for entry in _recording_cache.values())
+        while _recording_cache and cached_size > CORRELATION_CACHE_MAX_BYTES:
+            _, evicted = _recording_cache.popitem(last=False)
+            cached_size -= evicted.size
+
+
+def load_recording(xml_path):
+    """ParsedRecording of `xml_path`, reused for any upload with the same content.
+
+    Entries are evicted least recently used first once their combined size exceeds
+    CORRELATION_CACHE_MAX_BYTES (0 disables the cache); see trim_recording_cache.
+    """
+    key = file_digest(xml_path)
+    with _recording_cache_lock:
+        recording = _recording_cache.get(key)
+        if recording is not None:
+            _recording_cache.move_to_end(key)
+            current_app.logger.info(f"Reusing parsed recording {key[:12]}")
+            return recording
+
+    recording = parse_recording(xml_path)
+    if recording.size > CORRELATION_CACHE_MAX_BYTES:
+        return recording
+    with _recording_cache_lock:
+        _recording_cache[key] = recording
+        _recording_cache.move_to_end(key)
+    trim_recording_cache()
+    return recording
+
+
+def analyze_jmeter_correlations(xml_path, url_filter=''):
+    recording = load_recording(xml_path)
+    requests = recording.requests
+    processed_labels = set(recording.labels)  # Track which labels we've processed
+
     # Enhanced logging
-    current_app.logger.info(f"Collected {len(requests)}/{total_samples} requests from XML. Skipped: {skipped_samples}")
+    skipped_samples = recording.total_samples - len(requests)
+    current_app.logger.info(f"Collected {len(requests)}/{recording.total_samples} requests from XML. Skipped: {skipped_samples}")
     current_app.logger.info(f"Processed labels: {', '.join(sorted(processed_labels))}")
 
     url_filters = [u.strip() for u in url_filter.split(',')] if url_filter else []
+    results = recording.correlate(url_filters, current_app.logger)
+    trim_recording_cache()
 
-    results = []
-    for idx, req in enumerate(requests):
-        # Skip invalid requests
-        if not req['url']:
-            continue
-            
-        # Improved URL filter logic
-        if url_filters and not url_matches_filter(req['url'], url_filters):
-            current_app.logger.debug(f"Filtered out URL: {req['url']}")
-            continue
+    current_app.logger.info(f"Final number of requests with parameters: {len(results)}")
+    return results
 
-        # Extract parameters from both URL and request body
-        url_query = ''
-        if req['url'] and '?' in req['url']:
-            parts = req['url'].split('?', 1)
-            if len(parts) > 1:
-                url_query = parts[1]
-                
-        params = extract_params(url_query)
-        body_params = extract_params(req['requestBody'])
-        params.update(body_params)
-
-        # Try to extract parameters from headers for more coverage
-        if not params and req['requestHeader']:
-            content_type = ""
-            for line in req['requestHeader'].splitlines():
-                if "Content-Type:" in line:
-                    content_type = line.split(":", 1)[1].strip()
-            
-            # If it's a form submission, try to parse the body differently
-            if "application/x-www-form-urlencoded" in content_type:
-                body_params = extract_params(req['requestBody'])
-                params.update(body_params)
-
-        if not params:
-            current_app.logger.debug(f"No parameters found for request: {req['label']}, URL: {req['url']}")
-            # Include parameterless requests in results anyway
-            results.append({
-                'label': req['label'],
-                'method': req['method'],
-                'url': req['url'],
-                'params': []
-            })
-            continue
 
-        param_details = []
-        for param_name, param_value in params.items():
-            if not param_value:
-                continue
+# Correlation results by analysis id, oldest first
+CORRELATION_ANALYSES = collections.OrderedDict()
+_analyses_lock = threading.Lock()
+MAX_PAGE_SIZE = 200
 
-            # Store the original value before any decoding
-            original_param_value = param_value
-            
-            # Prepare variations for searching
-            decoded_param_value = None
-            encoded_param_value = None
-            
-            try:
-                # Check if it's URL-encoded
-                decoded_param_value = urllib.parse.unquote(param_value)
-                if decoded_param_value == param_value:
-                    decoded_param_value = None  # Not actually encoded
-                
-                # Also prepare encoded version
-                encoded_param_value = urllib.parse.quote(param_value)
-                if encoded_param_value == param_value:
-                    encoded_param_value = None  # Already encoded or doesn't need encoding
-            except Exception as e:
-                current_app.logger.debug(f"Error determining encoding for {param_value}: {str(e)}")
-
-            # First search with original value
-            original_matches = []
-            encoded_matches = []
-            decoded_matches = []
-            correlation_type = None
-
-            # Check if we can find the original value in previous responses
-            for resp_idx, resp in enumerate(responses[:idx]):
-                if not resp['full_response']:
-                    continue
-                
-                if original_param_value in resp['full_response']:
-                    matches = extract_dynamic_patterns(resp['full_response'], original_param_value)
-                    if matches:
-                        original_matches.append({
-                            'index': resp_idx,
-                            'label': requests[resp_idx]['label'],
-                            'matches': matches[:3],  # Limit to first 3 matches
-                            'matched_variation': original_param_value,
-                            'correlation_type': 'original'
-                        })
-            
-            # If original value not found, try decoded value
-            if not original_matches and decoded_param_value:
-                for resp_idx, resp in enumerate(responses[:idx]):
-                    if not resp['full_response']:
-                        continue
-                    
-                    if decoded_param_value in resp['full_response']:
-                        matches = extract_dynamic_patterns(resp['full_response'], decoded_param_value)
-                        if matches:
-                            decoded_matches.append({
-                                'index': resp_idx,
-                                'label': requests[resp_idx]['label'],
-                                'matches': matches[:3],
-                                'matched_variation': decoded_param_value,
-                                'correlation_type': 'decoded'
-                            })
-            
-            # If still no matches, try encoded value
-            if not original_matches and not decoded_matches and encoded_param_value:
-                for resp_idx, resp in enumerate(responses[:idx]):
-                    if not resp['full_response']:
-                        continue
-                    
-                    if encoded_param_value in resp['full_response']:
-                        matches = extract_dynamic_patterns(resp['full_response'], encoded_param_value)
-                        if matches:
-                            encoded_matches.append({
-                                'index': resp_idx,
-                                'label': requests[resp_idx]['label'],
-                                'matches': matches[:3],
-                                'matched_variation': encoded_param_value,
-                                'correlation_type': 'encoded'
-                            })
-            
-            # Determine which matches to use based on priority
-            matching_responses = []
-            
-            if original_matches:
-                matching_responses = original_matches
-            elif decoded_matches:
-                matching_responses = decoded_matches
-            elif encoded_matches:
-                matching_responses = encoded_matches
-
-            if matching_responses:
-                first_match = matching_responses[0]
-                last_match = matching_responses[-1]
-                correlation_type = first_match['correlation_type']
-
-                param_details.append({
-                    'param': param_name,
-                    'value': original_param_value,  # Always store original value
-                    'correlated': True,
-                    'correlation_type': correlation_type,
-                    'encoded_value': encoded_param_value if correlation_type == 'encoded' or correlation_type == 'original' else None,
-                    'decoded_value': decoded_param_value if correlation_type == 'decoded' or correlation_type == 'original' else None,
-                    'first_source': {
-                        'label': first_match['label'],
-                        'matches': first_match['matches']
-                    },
-                    'nearest_source': {
-                        'label': last_match['label'],
-                        'matches': last_match['matches']
-                    },
-                    'all_matches_count': len(matching_responses)
-                })
-            else:
-                param_details.append({
-                    'param': param_name,
-                    'value': original_param_value,
-                    'correlated': False
-                })
-
-        results.append({
-            'label': req['label'],
-            'method': req['method'],
-            'url': req['url'],
-            'params': param_details
-        })
 
-    current_app.logger.info(f"Final number of requests with parameters: {len(results)}")
-    return results
+def store_analysis(results, file_name):
+    """Keep `results` for paginated access (query_analysis) and return their analysis id.
+
+    The results are shared with the recording cache, so keeping them costs only the list.
+    Beyond CORRELATION_ANALYSES_MAX analyses the oldest is dropped.
+    """
+    analysis_id = uuid.uuid4().hex
+    correlated = sum(1 for result in results if any(param['correlated'] for param in result['params']))
+    with _analyses_lock:
+        CORRELATION_ANALYSES[analysis_id] = {
+            'file_name': file_name,
+            'results': results,
+            'correlated_requests': correlated
+        }
+        while len(CORRELATION_ANALYSES) > max(1, CORRELATION_ANALYSES_MAX):
+            CORRELATION_ANALYSES.popitem(last=False)
+    return analysis_id
+
+
+def result_matches(result, correlated_only=False, label=None, host=None):
+    """Whether a correlation result passes the page filters (label and host are case-insensitive substrings)"""
+    if correlated_only and not any(param['correlated'] for param in result['params']):
+        return False
+    if label and label.lower() not in result['label'].lower():
+        return False
+    if host and host.lower() not in (urllib.parse.urlparse(result['url']).hostname or ''):
+        return False
+    return True
+
+
+def query_analysis(analysis_id, offset=0, limit=50, correlated_only=False, label=None, host=None):
+    """One page of a stored analysis' results after filtering; None if the id is unknown.
+
+    `next_offset` is the offset of the following page, or None after the last one.
+    """
+    with _analyses_lock:
+        analysis = CORRELATION_ANALYSES.get(analysis_id)
+    if analysis is None:
+        return None
+    offset = max(0, offset or 0)
+    limit = min(max(1, limit or 50), MAX_PAGE_SIZE)
+    results = analysis['results']
+    if correlated_only or label or host:
+        results = [result for result in results if result_matches(result, correlated_only, label, host)]
+    page = results[offset:offset + limit]
+    return {
+        'analysis_id': analysis_id,
+        'file_name': analysis['file_name'],
+        'total': len(analysis['results']),
+        'correlated_requests': analysis['correlated_requests'],
+        'matched': len(results),
+        'offset': offset,
+        'results': page,
+        'next_offset': offset + len(page) if offset + len(page) < len(results) else None
+    }
 
 
 def get_filtered_samples(xml_path, correlation_results):
-    """Extract relevant HTTP samples from original JMX"""
-    root = clean_and_parse_xml(xml_path)
+    """Extract relevant HTTP samples (as SampleRecords, in document order) from the recording"""
     relevant_labels = {result['label'] for result in correlation_results}
-    filtered_samples = []
-    
-    def collect_relevant_samples(node):
-        if node.tag.endswith('httpSample') or node.tag.endswith('sample'):
-            label = node.get('lb')
-            if label in relevant_labels:
-                filtered_samples.append(ET.tostring(node, encoding='unicode', pretty_print=True))
-        for child in node:
-            collect_relevant_samples(child)
-    
-    collect_relevant_samples(root)
-    return filtered_samples
+    return [record for record in load_recording(xml_path).http_samples if record.label in relevant_labels]
 
 
-def summarize_http_sample(xml_str):
-    """Summarize HTTP sample XML to reduce tokens while keeping essential information"""
+def summarize_http_sample(record):
+    """Summarize an HTTP sample record to reduce tokens while keeping essential information"""
     try:
-        node = ET.fromstring(xml_str)
         return {
-            'label': node.get('lb', ''),
-            'url': node.findtext('java.net.URL', ''),
-            'method': node.findtext('method', ''),
-            'path': node.findtext('path', ''),
-            'query_string': node.findtext('queryString', '')[:100] + '...' if node.findtext('queryString', '') else '',
+            'label': record.label if record.label != 'No_Label' else '',
+            'url': record.url if record.url_is_direct else '',
+            'method': record.method,
+            'path': record.path,
+            'query_string': record.request_body[:100] + '...' if record.request_body else '',
             'headers': {
                 line.split(':', 1)[0]: line.split(':', 1)[1]
-                for line in (node.findtext('requestHeader', '').split('\n'))
+                for line in record.request_header.split('\n')
                 if ':' in line
             }
         }
@@ -495,165 +1313,6 @@ def summarize_http_sample(xml_str):
         return None
 
 
-def generate_correlated_jmx_with_claude(correlation_results, xml_path):
-    """Generate a JMX file with correlated requests using Claude AI."""
-    try:
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
-        # Get filtered XML samples and summarize them
-        original_samples = get_filtered_samples(xml_path, correlation_results)
-        summarized_samples = [
-            summarize_http_sample(sample) 
-            for sample in original_samples
-            if sample
-        ]
-        
-        # Prepare correlation data
-        requests_info = []
-        for result in correlation_results:
-            correlated_params = [p for p in result['params'] if p['correlated']]
-            if correlated_params:
-                requests_info.append({
-                    'label': result['label'],
-                    'url': result['url'],
-                    'method': result['method'],
-                    'correlations': [{
-                        'param': p['param'],
-                        'pattern': p['first_source']['matches'][0] if p['first_source']['matches'] else None,
-                        'source_label': p['first_source']['label']
-                    } for p in correlated_params]
-                })
-
-        prompt = (
-            "You are a senior QA automation engineer. Create a complete JMeter JMX test plan "
-            "using the summarized requests and correlation information provided below.\n\n"
-            f"=== Original HTTP Samples (Summarized) ===\n"
-            f"{json.dumps(summarized_samples, indent=2)}\n\n"
-            f"=== Correlation Requirements ===\n"
-            f"{json.dumps(requests_info, indent=2)}\n\n"
-            "Create a JMX file that:\n"
-            "1. Creates HTTP requests based on the summarized samples\n"
-            "2. Adds Regular Expression Extractors for the correlations\n"
-            "3. Use regular expressions in Correlation Requirements as a reference (feel free to enhance them)\n"
-            "4. Updates the correlated parameters to use variables\n"
-            "5. Use User Defined Variables in jmeter to have most used variables in one location\n"
-            "6. Use http request headers on whole thread group level and set common headers used in the requests\n"
-
-            "Please return only the JMeter JMX XML content."
-        )
-        print(prompt)
-
-        # Stream response from Claude
-        with client.messages.stream(
-            model=ANTHROPIC_MODEL,
-            max_tokens=100000,  # Reduced max tokens
-            temperature=0.3,
-            system="You are a senior QA automation engineer specializing in JMeter test plans.",
-            messages=[{"role": "user", "content": prompt}]
-        ) as stream:
-            full_text = ""
-            for chunk in stream:
-                if chunk.type == "content_block_delta":
-                    full_text += chunk.delta.text
-
-            jmx_content = extract_jmx_xml(full_text)
-
-            if jmx_content.strip():
-                output_path = os.path.join(
-                    current_app.config['UPLOAD_FOLDER'],
-                    f"correlated_test_plan_{uuid.uuid4().hex[:8]}.jmx"
-                )
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(jmx_content)
-                return output_path
-            else:
-                raise ValueError("Claude returned no valid JMX content")
-
-    except Exception as e:
-        current_app.logger.error(f"Error generating JMX with Claude: {str(e)}")
-        raise
-
-
-def generate_correlated_jmx_with_openai(correlation_results, xml_path):
-    """Generate a JMX file with correlated requests using OpenAI."""
-    try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        # client = OpenAI(
-        #               base_url="https://openrouter.ai/api/v1",
-        #               api_key="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",
-        #             )
-
-        # Get filtered XML samples and summarize them
-        original_samples = get_filtered_samples(xml_path, correlation_results)
-        summarized_samples = [
-            summarize_http_sample(sample) 
-            for sample in original_samples
-            if sample
-        ]
-        
-        # Prepare correlation data
-        requests_info = []
-        for result in correlation_results:
-            correlated_params = [p for p in result['params'] if p['correlated']]
-            if correlated_params:
-                requests_info.append({
-                    'label': result['label'],
-                    'url': result['url'],
-                    'method': result['method'],
-                    'correlations': [{
-                        'param': p['param'],
-                        'value': p['value'],
-                        'pattern': p['first_source']['matches'][0] if p['first_source']['matches'] else None,
-                        'source_label': p['first_source']['label']
-                    } for p in correlated_params]
-                })
-
-        prompt = (
-            "You are a senior performance test engineer specializing in JMeter test design. "
-            "Create a complete JMeter JMX test plan based on the provided HTTP samples and correlation requirements.\n\n"
-            "Requirements:\n"
-            "1. Generate a properly structured JMeter test plan with ThreadGroup and all necessary HTTP requests\n"
-            "2. Implement JSON/RegEx extractors for all identified correlations\n"
-            "3. Replace all dynamic parameters with JMeter variables using the proper syntax\n"
-            "4. Add appropriate assertions and listeners for performance testing\n"
-            "5. Ensure the output is valid JMX XML that can be directly imported into JMeter without modifications\n\n"
-            "=== HTTP Samples ===\n"
-            f"{json.dumps(summarized_samples, indent=2)}\n\n"
-            "=== Correlation Requirements ===\n"
-            f"{json.dumps(requests_info, indent=2)}\n\n"
-            "Respond with ONLY the complete, valid JMeter JMX XML content. Include all necessary XML declarations "
-            "and JMeter components."
-        )
-
-        # Get response from OpenAI
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            # model="deepseek/deepseek-r1:free",
-            messages=[
-                {"role": "system", "content": "You are a performance test engineer specializing in JMeter test plans. Return only valid JMX XML content."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=100000,
-        )
-        print(response.choices[0].message.content)
-        jmx_content = extract_jmx_xml(response.choices[0].message.content)
-
-        if jmx_content.strip():
-            output_path = os.path.join(
-                current_app.config['UPLOAD_FOLDER'],
-                f"openai_test_plan_{uuid.uuid4().hex[:8]}.jmx"
-            )
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(jmx_content)
-            return output_path
-        else:
-            raise ValueError("OpenAI returned no valid JMX content")
-
-    except Exception as e:
-        current_app.logger.error(f"Error generating JMX with OpenAI: {str(e)}")
-        raise
-
-
 def extract_jmx_xml(text):
     """Extract JMX XML content from Claude's response"""
     # Look for XML content between tags or code blocks
@@ -1,64 +1,60 @@
 import json
 from lxml import etree as ET
-from .correlation_utils import clean_and_parse_xml
+from .correlation_utils import iter_sample_elements
 
 def debug_jmeter_xml(xml_path):
     """Generate a detailed debug report of all HTTP samples in the XML file"""
     all_samples = []
-    total_count = 0
     
+    def is_debug_sample(tag):
+        # Check if this is a sample node
+        if not isinstance(tag, str):
+            return False
+        tag_name = tag.split('}')[-1] if '}' in tag else tag
+        return tag_name.endswith('Sample') or tag_name == 'sample'
+
+    def describe_sample(node):
+        sample_info = {
+            "tag": node.tag,
+            "label": node.get('lb', 'No_Label'),
+            "method": node.findtext('method', 'UNKNOWN'),
+            "available_elements": []
+        }
+
+        # Collect all available elements
+        for elem in node:
+            if elem.tag and elem.text:
+                tag = elem.tag.split('}')[-1]
+                text_preview = (elem.text[:50] + '...') if elem.text and len(elem.text) > 50 else elem.text
+                sample_info["available_elements"].append({
+                    "tag": tag,
+                    "text_preview": text_preview
+                })
+
+        # Try to get URL from various locations
+        url = None
+        for url_path in ['java.net.URL', 'URL', 'url']:
+            url_text = node.findtext(url_path)
+            if url_text:
+                url = url_text
+                break
+
+        sample_info["url"] = url
+        return sample_info
+
+    # Samples are streamed through the shared sanitizer; positions restore document order
     try:
-        root = clean_and_parse_xml(xml_path)
+        for position, node in iter_sample_elements(xml_path, predicate=is_debug_sample):
+            all_samples.append((position, describe_sample(node)))
     except Exception as e:
         return {"error": f"Failed to parse XML: {str(e)}"}
-    
-    def collect_all_samples(node):
-        nonlocal total_count
-        
-        # Check if this is a sample node
-        is_sample = False
-        if node.tag is not None:
-            tag_name = node.tag.split('}')[-1] if '}' in node.tag else node.tag
-            is_sample = tag_name.endswith('Sample') or tag_name == 'sample'
-        
-        if is_sample:
-            total_count += 1
-            sample_info = {
-                "index": total_count,
-                "tag": node.tag,
-                "label": node.get('lb', 'No_Label'),
-                "method": node.findtext('method', 'UNKNOWN'),
-                "available_elements": []
-            }
-            
-            # Collect all available elements
-            for elem in node:
-                if elem.tag and elem.text:
-                    tag = elem.tag.split('}')[-1]
-                    text_preview = (elem.text[:50] + '...') if elem.text and len(elem.text) > 50 else elem.text
-                    sample_info["available_elements"].append({
-                        "tag": tag,
-                        "text_preview": text_preview
-                    })
-            
-            # Try to get URL from various locations
-            url = None
-            for url_path in ['java.net.URL', 'URL', 'url']:
-                url_text = node.findtext(url_path)
-                if url_text:
-                    url = url_text
-                    break
-            
-            sample_info["url"] = url
-            all_samples.append(sample_info)
-        
-        # Process child nodes
-        for child in node:
-            collect_all_samples(child)
-    
-    collect_all_samples(root)
-    
+
+    all_samples.sort(key=lambda item: item[0])
+    samples = []
+    for index, (_, sample_info) in enumerate(all_samples, start=1):
+        samples.append({"index": index, **sample_info})
+
     return {
-        "total_samples": total_count,
-        "samples": all_samples
+        "total_samples": len(samples),
+        "samples": samples
     }
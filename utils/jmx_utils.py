@@ -0,0 +1,1164 @@
+"""Rule-based correlated JMX generation from a recording and its correlation analysis.
+
+Every analysed request becomes an HTTP sampler. For each correlated parameter the value is
+extracted from its nearest source response (a JSON extractor when the analysis found the
+value as a scalar of a JSON body, see ResponseIndex.json_path, otherwise a regular expression
+extractor with the shortest boundaries that single out the value, see BoundaryFinder) and the
+consuming sampler sends `${var}` instead of the recorded value, in its query, body or request
+headers. The plan is built only from its inputs, so the same recording and results always
+produce the same bytes.
+
+AI-assisted generation (Claude / OpenAI) uses the same plan but lets the model write the
+samplers: repeated requests are compacted to one representative per group, the
+representatives are split into ordered chunks that are generated concurrently, and the
+returned fragments are stitched in plan order into a deterministic skeleton, copying each
+representative for the other members of its group. In hedged mode every chunk is raced across
+both providers and the first response that is a valid fragment for it is kept.
+
+Model output is checked structurally (validate_jmx: hashTree pairing, required properties,
+`${var}` references) and only the broken fragments are sent back to the model for repair, a
+bounded number of times (repair_jmx).
+"""
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import anthropic
+import openai
+from flask import current_app
+from lxml import etree as ET
+
+from config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, OPENAI_API_KEY, OPENAI_MODEL, CORRELATION_LLM_CHUNK_SAMPLES, \
+    CORRELATION_LLM_WORKERS, CORRELATION_LLM_HEDGE_DELAY, JMX_REPAIR_ATTEMPTS
+from utils.correlation_utils import load_recording, summarize_http_sample
+from utils.llm_utils import check_complete, estimate_tokens, input_limit, plan_budget, record_usage
+
+# Request headers JMeter manages itself (cookie manager, body length, target host)
+SKIPPED_REQUEST_HEADERS = {'content-length', 'cookie', 'host'}
+# Extractor boundary lengths considered on each side of a value; a left boundary is kept at
+# least a few characters long (where the text allows) so a single stray character cannot anchor it
+MIN_LEFT_BOUNDARY = 3
+MAX_LEFT_BOUNDARY = 64
+MAX_RIGHT_BOUNDARY = 32
+FORM_PAIR_RE = re.compile(r'([\w\.-]+)=([^&]*)')
+# JMeter variable references (the inner ${var} of ${__urlencode(${var})} included)
+VARIABLE_REFERENCE_RE = re.compile(r'\$\{(\w+)\}')
+# Suffixes of the variables a regular expression extractor derives from its reference name
+VARIABLE_SUFFIX_RE = re.compile(r'_(?:g\d+|matchNr|\d+)$')
+# Variables set from JSR223 / BeanShell scripts
+SCRIPT_VARIABLE_RE = re.compile(r'vars\.put(?:Object)?\(\s*["\'](\w+)')
+# Properties a test element cannot work without (present and not blank)
+REQUIRED_PROPS = {
+    'HTTPSamplerProxy': ('HTTPSampler.path', 'HTTPSampler.method'),
+    'RegexExtractor': ('RegexExtractor.refname', 'RegexExtractor.regex', 'RegexExtractor.template'),
+    'JSONPostProcessor': ('JSONPostProcessor.referenceNames', 'JSONPostProcessor.jsonPathExprs'),
+    'BoundaryExtractor': ('BoundaryExtractor.refname', 'BoundaryExtractor.lboundary'),
+    'XPathExtractor': ('XPathExtractor.refname', 'XPathExtractor.xpathQuery'),
+    'XPath2Extractor': ('XPathExtractor2.refname', 'XPathExtractor2.xpathQuery'),
+    'HtmlExtractor': ('HtmlExtractor.refname', 'HtmlExtractor.expr'),
+}
+# Properties naming the variables an element defines (';' / ',' separated lists)
+VARIABLE_NAME_PROPS = {
+    'RegexExtractor': 'RegexExtractor.refname',
+    'JSONPostProcessor': 'JSONPostProcessor.referenceNames',
+    'BoundaryExtractor': 'BoundaryExtractor.refname',
+    'XPathExtractor': 'XPathExtractor.refname',
+    'XPath2Extractor': 'XPathExtractor2.refname',
+    'HtmlExtractor': 'HtmlExtractor.refname',
+    'JMESPathExtractor': 'JMESExtractor.referenceName',
+    'CSVDataSet': 'variableNames',
+    'CounterConfig': 'CounterConfig.name',
+    'RandomVariableConfig': 'variableName',
+    'ForeachController': 'ForeachController.returnVal',
+}
+# Path segments collapsed into {id} when grouping repeated requests: numbers, GUIDs, hex ids, long tokens
+ID_SEGMENT_RE = re.compile(r'^(?:\d+|[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}'
+                           r'|(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}|(?=[\w-]*\d)[\w-]{16,})$')
+# Example values listed per varying parameter of a request group
+MAX_VARYING_EXAMPLES = 5
+
+
+def add_hash_tree(parent):
+    """Add JMeter hashTree element"""
+    return ET.SubElement(parent, "hashTree")
+
+
+def add_string_prop(parent, name, text):
+    prop = ET.SubElement(parent, "stringProp", name=name)
+    prop.text = text
+    return prop
+
+
+def variable_name(param_name, taken):
+    """JMeter-safe variable name for `param_name` not already in `taken`"""
+    base = re.sub(r'[^A-Za-z0-9_]', '_', param_name).strip('_') or 'var'
+    name = base
+    suffix = 2
+    while name in taken:
+        name = f"{base}_{suffix}"
+        suffix += 1
+    return name
+
+
+def escape_boundary(text):
+    """re.escape, with line breaks written as \\r / \\n so the regex stays on one line"""
+    return re.escape(text).replace('\\\r', '\\r').replace('\\\n', '\\n')
+
+
+class BoundaryFinder:
+    """Shortest regex boundaries that pin down a value occurrence in one response text.
+
+    For an occurrence [q, end) the left boundary L = text[q - l:q] is the shortest one (of at
+    least MIN_LEFT_BOUNDARY characters) that does not end anywhere before q, so the
+    extractor's first `L(.+?)R` match starts right before the value; the right boundary R = text[end:end + r] is the shortest one whose
+    first occurrence after q + 1 is at `end`, so the lazy group stops exactly at the end of
+    the value. Both properties are monotonic in the boundary length (an earlier occurrence
+    of a longer boundary contains one of the shorter), so each is found by a binary search of
+    C-level substring searches. Results are memoized per value; create one finder per
+    response and reuse it for every parameter extracted from that response.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._cache = {}
+
+    def _left_length(self, q):
+        text = self.text
+        low, high = min(q, MIN_LEFT_BOUNDARY), min(q, MAX_LEFT_BOUNDARY)
+        if high == 0 or text.find(text[q - high:q], 0, q - 1) != -1:
+            return None
+        while low < high:
+            mid = (low + high) // 2
+            if text.find(text[q - mid:q], 0, q - 1) == -1:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def _right_length(self, q, end):
+        text = self.text
+        if end == len(text):
+            return 0
+        low, high = 1, min(len(text) - end, MAX_RIGHT_BOUNDARY)
+        if text.find(text[end:end + high], q + 1, end + high) != end:
+            return None
+        while low < high:
+            mid = (low + high) // 2
+            if text.find(text[end:end + mid], q + 1, end + mid) == end:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def regex(self, value, occurrences=3):
+        """(regex, match_number) extracting `value`, or None when the value is absent.
+
+        The first `occurrences` occurrences are tried and the one with the shortest
+        boundaries wins. When no left boundary within MAX_LEFT_BOUNDARY is unique, the longest
+        one is used with the match number of the occurrence.
+        """
+        if value in self._cache:
+            return self._cache[value]
+        text = self.text
+        best = None
+        q = text.find(value)
+        while q != -1 and occurrences:
+            occurrences -= 1
+            end = q + len(value)
+            left = self._left_length(q)
+            right = self._right_length(q, end)
+            if right is not None and '\n' not in value:
+                rank = (left is None, (left or MAX_LEFT_BOUNDARY) + right)
+                if best is None or rank < best[0]:
+                    best = (rank, q, left, right)
+            q = text.find(value, q + 1)
+
+        result = None
+        if best is not None:
+            _, q, left, right = best
+            end = q + len(value)
+            left_text = text[max(0, q - (left or MAX_LEFT_BOUNDARY)):q]
+            right_regex = escape_boundary(text[end:end + right]) if right else '$'
+            regex = f"{escape_boundary(left_text)}(.+?){right_regex}"
+            match_number = 1
+            for match in re.finditer(regex, text):
+                if match.start(1) == q:
+                    result = (regex, match_number) if match.group(1) == value else None
+                    break
+                match_number += 1
+        self._cache[value] = result
+        return result
+
+
+def plan_extractor(record, value, finders, json_path=None):
+    """Extractor spec for `value` in the response of `record`, or None if it cannot be located.
+
+    Returns ('json', json_path) when the analysis located the value in a JSON body, otherwise
+    ('regex', regex, use_headers, match_number). `finders` caches BoundaryFinders by
+    (record id, region).
+    """
+    if json_path:
+        return ('json', json_path)
+    q = record.response.find(value)
+    if q == -1:
+        return None
+    if q < record.header_end:
+        region, text, use_headers = 'headers', record.response_header, 'true'
+    else:
+        region, text, use_headers = 'body', record.response_body, 'false'
+
+    finder = finders.get((id(record), region))
+    if finder is None:
+        finder = finders[(id(record), region)] = BoundaryFinder(text)
+    found = finder.regex(value)
+    return ('regex', found[0], use_headers, found[1]) if found else None
+
+
+def reference_expression(var, correlation_type):
+    """How a consumer sends the extracted value (re-encoding it like the recording did)"""
+    if correlation_type == 'decoded':
+        return f"${{__urlencode(${{{var}}})}}"
+    if correlation_type == 'encoded':
+        return f"${{__urldecode(${{{var}}})}}"
+    return f"${{{var}}}"
+
+
+def plan_correlations(recording, correlation_results):
+    """Map correlation results to extractors per source request and substitutions per consumer.
+
+    Returns (extractors, substitutions): extractors maps a source index to a list of
+    (var, spec); substitutions maps a consumer index to a list of (param, value, expression).
+    The same value taken from the same source shares one variable.
+    """
+    requests = recording.requests
+    finders = {}
+    variables = {}
+    taken = set()
+    extractors = {}
+    substitutions = {}
+    for result in correlation_results:
+        for param in result['params']:
+            if not param['correlated']:
+                continue
+            correlation_type = param['correlation_type']
+            matched = {'original': param['value'],
+                       'decoded': param.get('decoded_value'),
+                       'encoded': param.get('encoded_value')}.get(correlation_type)
+            source = param['nearest_source']['index']
+            json_path = param['nearest_source'].get('json_path')
+            if not matched:
+                continue
+
+            key = (source, matched)
+            var = variables.get(key)
+            if var is None:
+                spec = plan_extractor(requests[source], matched, finders, json_path)
+                if spec is None:
+                    current_app.logger.debug(f"No extractor for {param['param']} in {requests[source].label}")
+                    continue
+                var = variables[key] = variable_name(param['param'], taken)
+                taken.add(var)
+                extractors.setdefault(source, []).append((var, spec))
+            substitutions.setdefault(result['index'], []).append(
+                (param['param'], param['value'], reference_expression(var, correlation_type)))
+    return extractors, substitutions
+
+
+def substitute_pairs(text, substitutions):
+    """Replace name=value pairs of a query string or form body with their expressions"""
+    expressions = {(name, value): expression for name, value, expression in substitutions}
+    pairs = text.split('&')
+    for i, pair in enumerate(pairs):
+        name, sep, value = pair.partition('=')
+        expression = expressions.get((name, value))
+        if sep and expression is not None:
+            pairs[i] = f"{name}={expression}"
+    return '&'.join(pairs)
+
+
+def substitute_body(body, substitutions):
+    """Replace correlated values in a request body, mirroring how extract_params read it"""
+    if FORM_PAIR_RE.search(body):
+        return substitute_pairs(body, substitutions)
+    for _, value, expression in substitutions:
+        quoted = json.dumps(value)
+        if quoted in body:
+            body = body.replace(quoted, json.dumps(expression))
+        else:
+            body = re.sub(r'(?<![\w.])' + re.escape(value) + r'(?![\w.])', lambda m: expression, body)
+    return body
+
+
+def substitute_header(name, value, substitutions):
+    """Replace correlated values sent in request header `name` (see request_header_params)"""
+    name = name.lower()
+    for param, recorded, expression in substitutions:
+        if param.lower() == name:
+            value = value.replace(recorded, expression)
+    return value
+
+
+def add_http_sampler(parent, record, label, substitutions):
+    """Append an HTTPSamplerProxy (and its hashTree) for `record`; returns the sampler's hashTree"""
+    parsed = urllib.parse.urlparse(record.url)
+    method = (record.method or 'GET').upper()
+    body = substitute_body(record.request_body, substitutions) if record.request_body else ''
+    query = substitute_pairs(parsed.query, substitutions) if parsed.query else ''
+
+    sampler = ET.SubElement(parent, "HTTPSamplerProxy",
+                            guiclass="HttpTestSampleGui",
+                            testclass="HTTPSamplerProxy",
+                            testname=label,
+                            enabled="true")
+    args = ET.SubElement(sampler, "elementProp", name="HTTPsampler.Arguments", elementType="Arguments")
+    args_coll = ET.SubElement(args, "collectionProp", name="Arguments.arguments")
+    path = parsed.path or '/'
+    if body:
+        arg = ET.SubElement(args_coll, "elementProp", name="", elementType="HTTPArgument")
+        ET.SubElement(arg, "boolProp", name="HTTPArgument.always_encode").text = "false"
+        add_string_prop(arg, "Argument.value", body)
+        add_string_prop(arg, "Argument.metadata", "=")
+        if query:
+            path = f"{path}?{query}"
+    elif query:
+        for pair in query.split('&'):
+            name, _, value = pair.partition('=')
+            arg = ET.SubElement(args_coll, "elementProp", name=name, elementType="HTTPArgument")
+            ET.SubElement(arg, "boolProp", name="HTTPArgument.always_encode").text = "false"
+            add_string_prop(arg, "Argument.name", name)
+            add_string_prop(arg, "Argument.value", value)
+            add_string_prop(arg, "Argument.metadata", "=")
+            ET.SubElement(arg, "boolProp", name="HTTPArgument.use_equals").text = "true"
+    add_string_prop(sampler, "HTTPSampler.domain", parsed.hostname or '')
+    add_string_prop(sampler, "HTTPSampler.port", str(parsed.port or ''))
+    add_string_prop(sampler, "HTTPSampler.protocol", parsed.scheme or 'https')
+    add_string_prop(sampler, "HTTPSampler.path", path)
+    add_string_prop(sampler, "HTTPSampler.method", method)
+    ET.SubElement(sampler, "boolProp", name="HTTPSampler.follow_redirects").text = "true"
+    ET.SubElement(sampler, "boolProp", name="HTTPSampler.use_keepalive").text = "true"
+    ET.SubElement(sampler, "boolProp", name="HTTPSampler.postBodyRaw").text = "true" if body else "false"
+    sampler_hash_tree = add_hash_tree(parent)
+
+    headers = [(name, substitute_header(name, value, substitutions)) for name, value in record.request_headers
+               if name.lower() not in SKIPPED_REQUEST_HEADERS]
+    if headers:
+        header_manager = ET.SubElement(sampler_hash_tree, "HeaderManager",
+                                       guiclass="HeaderPanel",
+                                       testclass="HeaderManager",
+                                       testname="HTTP Header Manager",
+                                       enabled="true")
+        headers_coll = ET.SubElement(header_manager, "collectionProp", name="HeaderManager.headers")
+        for name, value in headers:
+            header = ET.SubElement(headers_coll, "elementProp", name=name, elementType="Header")
+            add_string_prop(header, "Header.name", name)
+            add_string_prop(header, "Header.value", value)
+        add_hash_tree(sampler_hash_tree)
+    return sampler_hash_tree
+
+
+def add_extractor(sampler_hash_tree, var, spec):
+    if spec[0] == 'json':
+        extractor = ET.SubElement(sampler_hash_tree, "JSONPostProcessor",
+                                  guiclass="JSONPostProcessorGui",
+                                  testclass="JSONPostProcessor",
+                                  testname=f"Extract {var}",
+                                  enabled="true")
+        add_string_prop(extractor, "JSONPostProcessor.referenceNames", var)
+        add_string_prop(extractor, "JSONPostProcessor.jsonPathExprs", spec[1])
+        add_string_prop(extractor, "JSONPostProcessor.match_numbers", "1")
+        add_string_prop(extractor, "JSONPostProcessor.defaultValues", f"{var}_NOT_FOUND")
+    else:
+        extractor = ET.SubElement(sampler_hash_tree, "RegexExtractor",
+                                  guiclass="RegexExtractorGui",
+                                  testclass="RegexExtractor",
+                                  testname=f"Extract {var}",
+                                  enabled="true")
+        add_string_prop(extractor, "RegexExtractor.useHeaders", spec[2])
+        add_string_prop(extractor, "RegexExtractor.refname", var)
+        add_string_prop(extractor, "RegexExtractor.regex", spec[1])
+        add_string_prop(extractor, "RegexExtractor.template", "$1$")
+        add_string_prop(extractor, "RegexExtractor.default", f"{var}_NOT_FOUND")
+        add_string_prop(extractor, "RegexExtractor.match_number", str(spec[3]))
+    add_hash_tree(sampler_hash_tree)
+
+
+def build_test_plan_skeleton(test_name):
+    """TestPlan with a cookie manager and a single-user Thread Group; returns (root, thread group hashTree)"""
+    root = ET.Element("jmeterTestPlan", version="1.2", properties="5.0", jmeter="5.6.2")
+    hash_tree = add_hash_tree(root)
+    test_plan = ET.SubElement(hash_tree, "TestPlan",
+                              guiclass="TestPlanGui",
+                              testclass="TestPlan",
+                              testname=test_name,
+                              enabled="true")
+    ET.SubElement(test_plan, "boolProp", name="TestPlan.functional_mode").text = "false"
+    ET.SubElement(test_plan, "boolProp", name="TestPlan.serialize_threadgroups").text = "false"
+    ET.SubElement(test_plan, "elementProp", name="TestPlan.user_defined_variables", elementType="Arguments")
+    testplan_hash_tree = add_hash_tree(hash_tree)
+
+    cookie_manager = ET.SubElement(testplan_hash_tree, "CookieManager",
+                                   guiclass="CookiePanel",
+                                   testclass="CookieManager",
+                                   testname="HTTP Cookie Manager",
+                                   enabled="true")
+    ET.SubElement(cookie_manager, "collectionProp", name="CookieManager.cookies")
+    ET.SubElement(cookie_manager, "boolProp", name="CookieManager.clearEachIteration").text = "true"
+    add_hash_tree(testplan_hash_tree)
+
+    thread_group = ET.SubElement(testplan_hash_tree, "ThreadGroup",
+                                 guiclass="ThreadGroupGui",
+                                 testclass="ThreadGroup",
+                                 testname="Thread Group",
+                                 enabled="true")
+    add_string_prop(thread_group, "ThreadGroup.on_sample_error", "continue")
+    loop_ctrl = ET.SubElement(thread_group, "elementProp", name="ThreadGroup.main_controller",
+                              elementType="LoopController")
+    ET.SubElement(loop_ctrl, "boolProp", name="LoopController.continue_forever").text = "false"
+    add_string_prop(loop_ctrl, "LoopController.loops", "1")
+    add_string_prop(thread_group, "ThreadGroup.num_threads", "1")
+    add_string_prop(thread_group, "ThreadGroup.ramp_time", "1")
+    ET.SubElement(thread_group, "boolProp", name="ThreadGroup.scheduler").text = "false"
+    thread_hash_tree = add_hash_tree(testplan_hash_tree)
+    return root, thread_hash_tree
+
+
+def sampler_names(recording, indices):
+    """Sampler names for the requests at `indices`: their position in the plan and recorded label"""
+    return [f"{position:03d}_{recording.requests[idx].label}"[:200] for position, idx in enumerate(indices, start=1)]
+
+
+def build_correlated_jmx(recording, correlation_results, test_name="Correlated Recording"):
+    """Serialized JMX (bytes) for the analysed requests of `recording` with correlations applied.
+
+    Samplers are the requests present in `correlation_results` plus any source they extract
+    from, in recording order.
+    """
+    extractors, substitutions = plan_correlations(recording, correlation_results)
+    included = sorted({result['index'] for result in correlation_results} | set(extractors))
+
+    root, thread_hash_tree = build_test_plan_skeleton(test_name)
+
+    for idx, label in zip(included, sampler_names(recording, included)):
+        sampler_hash_tree = add_http_sampler(thread_hash_tree, recording.requests[idx], label,
+                                             substitutions.get(idx, []))
+        for var, spec in extractors.get(idx, []):
+            add_extractor(sampler_hash_tree, var, spec)
+
+    return ET.tostring(root, encoding="utf-8", pretty_print=True, xml_declaration=True)
+
+
+def generate_correlated_jmx(correlation_results, xml_path):
+    """Write the rule-based correlated JMX for a recording to the upload folder; returns its path"""
+    jmx = build_correlated_jmx(load_recording(xml_path), correlation_results)
+    output_path = os.path.join(
+        current_app.config['UPLOAD_FOLDER'],
+        f"correlated_test_plan_{hashlib.sha256(jmx).hexdigest()[:8]}.jmx"
+    )
+    with open(output_path, "wb") as f:
+        f.write(jmx)
+    return output_path
+
+
+def extractor_hint(spec):
+    """Extractor spec as prompt data"""
+    if spec[0] == 'json':
+        return {'type': 'json', 'json_path': spec[1]}
+    return {'type': 'regex', 'regex': spec[1], 'use_headers': spec[2] == 'true', 'match_number': spec[3]}
+
+
+def split_pairs(text):
+    """(name, value) pairs of a query string or form body, or None when `text` is not one"""
+    if not text:
+        return []
+    pairs = []
+    for pair in text.split('&'):
+        name, sep, value = pair.partition('=')
+        if not sep or not name or name[0] in '{["':
+            return None
+        pairs.append((name, value))
+    return pairs
+
+
+def request_shape(record):
+    """(grouping key, path segments, parameter pairs) of a request.
+
+    Requests share a key when they only differ by id-like path segments (ID_SEGMENT_RE) and
+    by the values of the same query / form parameters; any other body must be identical.
+    """
+    parsed = urllib.parse.urlparse(record.url)
+    segments = parsed.path.split('/')
+    template = '/'.join('{id}' if ID_SEGMENT_RE.match(segment) else segment for segment in segments)
+    query = split_pairs(parsed.query)
+    body = split_pairs(record.request_body)
+    key = (record.method.upper(), parsed.scheme, parsed.netloc, template,
+           tuple(name for name, _ in query) if query is not None else ('raw', parsed.query),
+           tuple(name for name, _ in body) if body is not None else ('raw', record.request_body))
+    return key, segments, (query or []) + (body or [])
+
+
+def request_variation(representative, occurrence, used_params):
+    """Replacements turning the representative's request into the occurrence's.
+
+    A list of ('segment', index, old, new) for path segments, `index` counted from the end of the
+    path (negative, so it also addresses the path of a full URL), and ('param', name, old, new)
+    for parameter values; parameters the plan substitutes with variables are left alone.
+    """
+    _, rep_segments, rep_pairs = representative
+    _, segments, pairs = occurrence
+    replacements = [('segment', position - len(rep_segments), old, new)
+                    for position, (old, new) in enumerate(zip(rep_segments, segments)) if old != new]
+    replacements.extend(('param', name, old, new) for (name, old), (_, new) in zip(rep_pairs, pairs)
+                        if old != new and name not in used_params)
+    return replacements
+
+
+def compact_samplers(recording, included, extractors, substitutions):
+    """Group repeated requests (polling, pagination...) so only one representative is prompted.
+
+    Requests without extractors group when their request_shape matches and they send the same
+    variable references; the first one represents the group. Returns (representatives, copies):
+    representative indices in plan order, and for every other member idx -> (representative idx,
+    request_variation replacements).
+    """
+    representatives = []
+    copies = {}
+    groups = {}
+    shapes = {}
+    for idx in included:
+        uses = substitutions.get(idx, [])
+        shape = shapes[idx] = request_shape(recording.requests[idx])
+        key = None if idx in extractors else (shape[0], tuple((param, expression) for param, _, expression in uses))
+        rep_idx = groups.get(key) if key is not None else None
+        if rep_idx is None:
+            representatives.append(idx)
+            if key is not None:
+                groups[key] = idx
+            continue
+        used_params = {param for param, _, _ in uses}
+        copies[idx] = (rep_idx, request_variation(shapes[rep_idx], shape, used_params))
+    return representatives, copies
+
+
+def plan_chunks(recording, correlation_results, chunk_size, max_tokens=None):
+    """Split the correlated plan into ordered chunks of at most `chunk_size` samplers to prompt for.
+
+    With `max_tokens` a chunk is also closed before its samples' estimated size would exceed it
+    (a sample larger than that on its own still gets a chunk).
+
+    Repeated requests are compacted first (compact_samplers): only group representatives are
+    prompted, listing where the group repeats (`repeated_at`, sampler positions) and the values
+    its parameters take there (`varying`). Each chunk lists its samples (summarized, with the
+    sampler name to use, the extractors to add and the recorded values to replace by variable
+    references) and `carried_variables`: the variables it references that earlier chunks
+    extract. Variable names come from plan_correlations, so chunks agree on them without
+    seeing each other.
+
+    Returns (chunks, layout): layout holds the plan-order sampler `names` and the `copies`
+    (name -> (representative name, replacements)) that expand_samplers rebuilds.
+    """
+    extractors, substitutions = plan_correlations(recording, correlation_results)
+    included = sorted({result['index'] for result in correlation_results} | set(extractors))
+    names = dict(zip(included, sampler_names(recording, included)))
+    positions = {idx: position for position, idx in enumerate(included, start=1)}
+    representatives, copies = compact_samplers(recording, included, extractors, substitutions)
+    repeats = {}
+    for idx, (rep_idx, replacements) in copies.items():
+        repeats.setdefault(rep_idx, []).append((idx, replacements))
+
+    groups = []
+    group_tokens = 0
+    size = max(1, chunk_size)
+    for idx in representatives:
+        sample = dict(summarize_http_sample(recording.requests[idx]) or {})
+        sample['name'] = names[idx]
+        if idx in repeats:
+            varying = {}
+            for other, replacements in repeats[idx]:
+                for kind, param, old, new in replacements:
+                    key = 'path' if kind == 'segment' else param
+                    values = varying.setdefault(key, {'recorded': old, 'values': []})['values']
+                    if new not in values and len(values) < MAX_VARYING_EXAMPLES:
+                        values.append(new)
+            sample['repeated_at'] = [positions[other] for other, _ in repeats[idx]]
+            sample['varying'] = varying
+        sample['extract'] = [{'variable': var, **extractor_hint(spec)} for var, spec in extractors.get(idx, [])]
+        sample['use'] = [{'param': param, 'recorded_value': value, 'send_as': expression}
+                         for param, value, expression in substitutions.get(idx, [])]
+        tokens = estimate_tokens(json.dumps(sample, indent=2)) if max_tokens else 0
+        if not groups or len(groups[-1]) >= size or (max_tokens and group_tokens + tokens > max_tokens):
+            groups.append([])
+            group_tokens = 0
+        groups[-1].append((idx, sample))
+        group_tokens += tokens
+
+    chunks = []
+    defined = set()
+    for group in groups:
+        extracted = set()
+        referenced = set()
+        for idx, _ in group:
+            extracted.update(var for var, _ in extractors.get(idx, []))
+            for _, _, expression in substitutions.get(idx, []):
+                referenced.update(VARIABLE_REFERENCE_RE.findall(expression))
+        chunks.append({
+            'number': len(chunks) + 1,
+            'samples': [sample for _, sample in group],
+            'carried_variables': sorted(referenced & defined)
+        })
+        defined |= extracted
+    layout = {
+        'names': [names[idx] for idx in included],
+        'copies': {names[idx]: (names[rep_idx], replacements) for idx, (rep_idx, replacements) in copies.items()}
+    }
+    return chunks, layout
+
+
+def chunk_prompt(chunk, chunk_count):
+    """Prompt asking for the samplers of one chunk as a single <hashTree> fragment"""
+    carried = ', '.join(chunk['carried_variables']) or 'none'
+    return (
+        "You are a senior QA automation engineer. Write part "
+        f"{chunk['number']} of {chunk_count} of a JMeter test plan from the summarized samples below.\n\n"
+        "=== Samples ===\n"
+        f"{json.dumps(chunk['samples'], indent=2)}\n\n"
+        "Return only one <hashTree> element that contains, for each sample in the given order:\n"
+        "1. An HTTPSamplerProxy whose testname is the sample's name, built from its url, method, path, "
+        "query string and headers\n"
+        "2. Followed by its <hashTree> holding an HTTP Header Manager for the headers and one extractor per "
+        "'extract' entry (JSON Extractor for json hints, Regular Expression Extractor for regex hints; feel "
+        "free to enhance the regular expressions), each followed by an empty <hashTree/>\n"
+        "3. Every 'use' entry's recorded_value replaced by its send_as expression\n"
+        "Write a sample that has 'repeated_at' once, with its own recorded values: its repetitions (with the "
+        "'varying' values) are added from it afterwards.\n\n"
+        f"Variables extracted by earlier parts (reference them, do not extract them again): {carried}\n"
+        "Do not add a TestPlan, ThreadGroup or Cookie Manager; they are provided."
+    )
+
+
+def parse_fragment(text):
+    """The <hashTree> element of a model response, or ValueError when there is none or it is malformed"""
+    start = text.find('<hashTree')
+    end = text.rfind('</hashTree>')
+    if start == -1 or end == -1:
+        raise ValueError("No <hashTree> fragment in the response")
+    fragment = ET.fromstring(text[start:end + len('</hashTree>')].encode('utf-8'))
+    if fragment.tag != 'hashTree':
+        raise ValueError(f"Expected a <hashTree> fragment, got <{fragment.tag}>")
+    return fragment
+
+
+def fragment_samplers(fragment):
+    """(HTTPSamplerProxy, hashTree or None) pairs at the top level of a fragment, in order"""
+    children = [child for child in fragment if isinstance(child.tag, str)]
+    pairs = []
+    for position, child in enumerate(children):
+        if child.tag != 'HTTPSamplerProxy':
+            continue
+        following = children[position + 1] if position + 1 < len(children) else None
+        pairs.append((child, following if following is not None and following.tag == 'hashTree' else None))
+    return pairs
+
+
+def replace_segments(path, segments):
+    """`path` (or URL) with the segments at the given end-relative indices replaced, all at once.
+
+    `segments` holds (index, old, new); the path is left alone unless every index holds its old value.
+    """
+    end = re.search(r'[?#;]', path)
+    end = end.start() if end else len(path)
+    parts = path[:end].split('/')
+    if len(parts) < 2 or any(-index > len(parts) or parts[index] != old for index, old, _ in segments):
+        return path
+    for index, _, new in segments:
+        parts[index] = new
+    return '/'.join(parts) + path[end:]
+
+
+def apply_variation(element, replacements):
+    """Rewrite the recorded values of a copied sampler subtree (see request_variation) in place.
+
+    Every replacement applies to the recorded text in one pass, so a new value equal to another
+    replacement's old value is not rewritten again.
+    """
+    segments = [(index, old, new) for kind, index, old, new in replacements if kind == 'segment']
+    params = {(name, old): new for kind, name, old, new in replacements if kind == 'param'}
+    pair_re = re.compile(r'(?<![\w.-])(' + '|'.join(re.escape(f"{name}={old}") for name, old in params) + r')(?=&|$|\s)')
+
+    def replace_pair(match):
+        name, _, old = match.group(1).partition('=')
+        return f"{name}={params[(name, old)]}"
+
+    for node in element.iter():
+        if not isinstance(node.tag, str) or not node.text:
+            continue
+        text = node.text
+        if segments and node.get('name') == 'HTTPSampler.path':
+            text = replace_segments(text, segments)
+        if params:
+            arg_name = (node.getparent().findtext("stringProp[@name='Argument.name']")
+                        if node.get('name') == 'Argument.value' else None)
+            if (arg_name, text) in params:
+                text = params[(arg_name, text)]
+            else:
+                text = pair_re.sub(replace_pair, text)
+        node.text = text
+
+
+def expand_samplers(thread_hash_tree, generated, layout):
+    """Append every sampler of the plan in order, copying group representatives for their repeats.
+
+    `generated` maps representative names to their (sampler, hashTree) from the model.
+    """
+    for name in layout['names']:
+        copy_of = layout['copies'].get(name)
+        if copy_of is None:
+            sampler, tree = generated[name]
+        else:
+            rep_sampler, rep_tree = generated[copy_of[0]]
+            sampler = copy.deepcopy(rep_sampler)
+            tree = copy.deepcopy(rep_tree) if rep_tree is not None else None
+            sampler.set('testname', name)
+            for element in (sampler, tree):
+                if element is not None:
+                    apply_variation(element, copy_of[1])
+        thread_hash_tree.append(sampler)
+        thread_hash_tree.append(tree if tree is not None else ET.Element('hashTree'))
+
+
+def owning_element(hash_tree):
+    """The test element whose children `hash_tree` holds (the element right before it), or None"""
+    previous = hash_tree.getprevious()
+    while previous is not None and not isinstance(previous.tag, str):
+        previous = previous.getprevious()
+    return previous if previous is not None and previous.tag != 'hashTree' else None
+
+
+def following_hash_tree(element):
+    """The <hashTree> right after a test element, or None"""
+    following = element.getnext()
+    while following is not None and not isinstance(following.tag, str):
+        following = following.getnext()
+    return following if following is not None and following.tag == 'hashTree' else None
+
+
+def fragment_root(element):
+    """The sampler a test element belongs to (itself for a sampler), or the element itself outside samplers"""
+    node = element
+    while node is not None:
+        if node.tag.endswith('Sampler') or node.tag.endswith('SamplerProxy'):
+            return node
+        parent = node.getparent()
+        node = owning_element(parent) if parent is not None and parent.tag == 'hashTree' else None
+    return element
+
+
+def defined_variables(tree):
+    """Names of the JMeter variables a JMX tree defines: extractors, CSV data sets, counters,
+    random variables, ForEach output variables, user defined variables, user parameters and
+    vars.put() in scripts"""
+    names = set()
+    for element in tree.iter():
+        if not isinstance(element.tag, str):
+            continue
+        if element.tag in VARIABLE_NAME_PROPS:
+            value = element.findtext(f"stringProp[@name='{VARIABLE_NAME_PROPS[element.tag]}']") or ''
+            names.update(name.strip() for name in re.split(r'[;,]', value) if name.strip())
+        elif element.tag == 'Arguments' or element.get('name') == 'TestPlan.user_defined_variables':
+            names.update(name.strip() for name in element.xpath(".//stringProp[@name='Argument.name']/text()"))
+        elif element.tag == 'UserParameters':
+            names.update(name.strip() for name in
+                         element.xpath("collectionProp[@name='UserParameters.names']/stringProp/text()"))
+        if element.text and 'vars.put' in element.text:
+            names.update(SCRIPT_VARIABLE_RE.findall(element.text))
+    names.discard('')
+    return names
+
+
+def validate_jmx(tree, defined=(), required_variables=None):
+    """Structural problems of a JMX document or <hashTree> fragment, as [(fragment, message)].
+
+    `fragment` is the test element to repair (the sampler the problem is part of, see
+    fragment_root), or None when the problem is not inside any element. Checked: every test
+    element is followed by its <hashTree> and every <hashTree> follows a test element; samplers
+    and extractors have their REQUIRED_PROPS; `${var}` references name a variable defined in
+    the tree or listed in `defined`; the samplers named in `required_variables` (name -> list)
+    extract those variables.
+    """
+    if tree.tag == 'jmeterTestPlan':
+        top = [child for child in tree if isinstance(child.tag, str)]
+        if len(top) != 1 or top[0].tag != 'hashTree':
+            return [(None, "<jmeterTestPlan> must hold exactly one <hashTree>")]
+    problems = []
+    known = defined_variables(tree) | set(defined)
+    for hash_tree in tree.iter('hashTree'):
+        children = [child for child in hash_tree if isinstance(child.tag, str)]
+        for position, child in enumerate(children):
+            following = children[position + 1] if position + 1 < len(children) else None
+            if child.tag == 'hashTree':
+                if position == 0 or children[position - 1].tag == 'hashTree':
+                    owner = owning_element(hash_tree)
+                    problems.append((fragment_root(owner) if owner is not None else None,
+                                     f"a <hashTree> in '{owner.get('testname') if owner is not None else 'the plan'}' "
+                                     f"does not follow a test element"))
+                continue
+            name = child.get('testname', '')
+            root = fragment_root(child)
+            if following is None or following.tag != 'hashTree':
+                problems.append((root, f"<{child.tag}> '{name}' is not followed by its <hashTree>"))
+            for prop in REQUIRED_PROPS.get(child.tag, ()):
+                if not (child.findtext(f"stringProp[@name='{prop}']") or '').strip():
+                    problems.append((root, f"<{child.tag}> '{name}' has no {prop}"))
+            if child.tag == 'JSONPostProcessor':
+                names = (child.findtext("stringProp[@name='JSONPostProcessor.referenceNames']") or '').split(';')
+                paths = (child.findtext("stringProp[@name='JSONPostProcessor.jsonPathExprs']") or '').split(';')
+                if len(names) != len(paths):
+                    problems.append((root, f"<JSONPostProcessor> '{name}' has {len(names)} reference names "
+                                           f"but {len(paths)} JSON path expressions"))
+            undefined = set()
+            for node in child.iter():
+                if node is child or node.tag == 'hashTree' or not node.text or '${' not in node.text:
+                    continue
+                for var in VARIABLE_REFERENCE_RE.findall(node.text):
+                    if (var not in known and VARIABLE_SUFFIX_RE.sub('', var) not in known
+                            and not var.startswith(('__', 'COOKIE_'))):
+                        undefined.add(var)
+            for var in sorted(undefined):
+                problems.append((root, f"<{child.tag}> '{name}' references ${{{var}}}, which no element defines"))
+            if required_variables and child.get('testname') in required_variables:
+                hash_tree_after = following_hash_tree(child)
+                extracted = defined_variables(hash_tree_after) if hash_tree_after is not None else set()
+                for var in required_variables[child.get('testname')]:
+                    if var not in extracted:
+                        problems.append((root, f"<{child.tag}> '{name}' does not extract ${{{var}}}"))
+    return problems
+
+
+def fragment_xml(element):
+    """A test element and its <hashTree> wrapped in a <hashTree>, as sent to the model for repair"""
+    wrapper = ET.Element('hashTree')
+    wrapper.append(copy.deepcopy(element))
+    hash_tree = following_hash_tree(element)
+    wrapper.append(copy.deepcopy(hash_tree) if hash_tree is not None else ET.Element('hashTree'))
+    return ET.tostring(wrapper, encoding='unicode', pretty_print=True)
+
+
+def repair_prompt(element, messages, variables):
+    """Prompt asking to fix only one broken fragment (see validate_jmx)"""
+    return (
+        "You are a senior QA automation engineer. This fragment of a JMeter test plan is invalid:\n"
+        + ''.join(f"- {message}\n" for message in messages)
+        + "\n=== Fragment ===\n"
+        f"{fragment_xml(element)}\n"
+        f"Variables defined by the plan: {', '.join(sorted(variables)) or 'none'}\n"
+        f"Return only the corrected fragment: one <hashTree> element holding the fixed <{element.tag}> "
+        "followed by its <hashTree> (<hashTree/> when it has no children), every test element inside "
+        "followed by its own <hashTree>. Change only what the problems above require."
+    )
+
+
+def repaired_fragment(response, tag):
+    """(element, hashTree or None) of a repair response, or ValueError unless it holds exactly one <tag>"""
+    fragment = parse_fragment(response)
+    elements = [child for child in fragment if isinstance(child.tag, str) and child.tag != 'hashTree']
+    if len(elements) != 1 or elements[0].tag != tag:
+        raise ValueError(f"Repair returned {', '.join(f'<{element.tag}>' for element in elements) or 'nothing'} "
+                         f"instead of one <{tag}>")
+    return elements[0], following_hash_tree(elements[0])
+
+
+def replace_fragment(element, replacement, hash_tree):
+    """Put `replacement` and `hash_tree` (an empty one when None) in place of `element` and its <hashTree>"""
+    parent = element.getparent()
+    position = parent.index(element)
+    following = following_hash_tree(element)
+    parent.remove(element)
+    if following is not None:
+        parent.remove(following)
+    parent.insert(position, replacement)
+    parent.insert(position + 1, hash_tree if hash_tree is not None else ET.Element('hashTree'))
+
+
+def repair_jmx(tree, complete, defined=(), required_variables=None, attempts=JMX_REPAIR_ATTEMPTS):
+    """Validate `tree` (see validate_jmx) and have `complete` (see build_chunked_jmx) rewrite its
+    broken fragments in place, for at most `attempts` rounds. Raises ValueError when problems remain.
+    """
+    for attempt in range(attempts + 1):
+        problems = validate_jmx(tree, defined, required_variables)
+        if not problems:
+            return tree
+        broken = {}
+        for fragment, message in problems:
+            broken.setdefault(fragment, []).append(message)
+        if attempt == attempts or None in broken:
+            break
+        logging.warning(f"Repairing {len(broken)} invalid JMX fragment(s), attempt {attempt + 1}/{attempts}: "
+                        f"{problems[0][1]}")
+        variables = defined_variables(tree) | set(defined)
+        for element, messages in broken.items():
+            try:
+                repaired, hash_tree = complete(repair_prompt(element, messages, variables),
+                                               lambda response: repaired_fragment(response, element.tag))
+            except (ValueError, ET.XMLSyntaxError) as e:
+                logging.warning(f"Repair of <{element.tag}> '{element.get('testname', '')}' failed: {e}")
+                continue
+            if element.get('testname') is not None:
+                repaired.set('testname', element.get('testname'))
+            replace_fragment(element, repaired, hash_tree)
+    shown = '; '.join(message for _, message in problems[:5])
+    more = f" (and {len(problems) - 5} more)" if len(problems) > 5 else ''
+    raise ValueError(f"Generated JMX is invalid after {attempts} repair attempt(s): {shown}{more}")
+
+
+def validated_jmx(text, complete):
+    """A whole JMX document written by a model, validated and repaired (see repair_jmx), as text"""
+    try:
+        root = ET.fromstring(text.encode('utf-8'))
+    except ET.XMLSyntaxError as e:
+        raise ValueError(f"Generated JMX is not well-formed (truncated?): {e}")
+    if root.tag != 'jmeterTestPlan':
+        raise ValueError(f"Generated JMX has <{root.tag}> instead of <jmeterTestPlan> as its root")
+    repair_jmx(root, complete)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding='unicode')
+
+
+def complete_concurrently(items, complete, workers):
+    """Results of `complete(item)` for every item, in item order, on at most `workers` threads.
+
+    The first failure is raised after the items not started yet are cancelled.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+        futures = [pool.submit(complete, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def chunk_sample_tokens(provider):
+    """Estimated tokens the samples of one chunk may take in a `provider` prompt"""
+    overhead = estimate_tokens(chunk_prompt({'number': 0, 'samples': [], 'carried_variables': []}, 0))
+    return max(1, input_limit('jmx_chunk', provider) - overhead)
+
+
+def chunk_samplers(chunk, chunk_count, response):
+    """[(name, sampler, hashTree or None)] of a chunk's response, or ValueError when it is no valid fragment for the chunk"""
+    try:
+        pairs = fragment_samplers(parse_fragment(response))
+    except (ValueError, ET.XMLSyntaxError) as e:
+        raise ValueError(f"Chunk {chunk['number']}/{chunk_count} returned no valid JMX fragment: {e}")
+    expected = [sample['name'] for sample in chunk['samples']]
+    if len(pairs) != len(expected):
+        raise ValueError(f"Chunk {chunk['number']}/{chunk_count} returned {len(pairs)} samplers "
+                         f"instead of {len(expected)}")
+    return [(name, sampler, tree) for name, (sampler, tree) in zip(expected, pairs)]
+
+
+def build_chunked_jmx(recording, correlation_results, complete, providers, test_name="Correlated Recording"):
+    """Serialized JMX (bytes) whose samplers are written by a model, chunk by chunk.
+
+    `complete(prompt, validate)` returns `validate(response)` for a model response to the prompt
+    (see single_completion and hedged_completion). Chunks are sized for the token budget of every
+    provider in `providers` (see llm_utils.input_limit).
+    """
+    chunks, layout = plan_chunks(recording, correlation_results, CORRELATION_LLM_CHUNK_SAMPLES,
+                                 min(chunk_sample_tokens(provider) for provider in providers))
+    logging.info(f"Generating {len(layout['names'])} samplers from {len(layout['names']) - len(layout['copies'])} "
+                 f"distinct requests in {len(chunks)} chunk(s) on up to {CORRELATION_LLM_WORKERS} threads")
+
+    def generate(chunk):
+        samplers = complete(chunk_prompt(chunk, len(chunks)),
+                            lambda response: chunk_samplers(chunk, len(chunks), response))
+        fragment = ET.Element('hashTree')
+        for name, sampler, tree in samplers:
+            sampler.set('testname', name)
+            fragment.append(sampler)
+            fragment.append(tree if tree is not None else ET.Element('hashTree'))
+        required = {sample['name']: [extract['variable'] for extract in sample['extract']]
+                    for sample in chunk['samples']}
+        return repair_jmx(fragment, complete, chunk['carried_variables'], required)
+
+    generated = {}
+    for fragment in complete_concurrently(chunks, generate, CORRELATION_LLM_WORKERS):
+        for sampler, tree in fragment_samplers(fragment):
+            generated[sampler.get('testname')] = (sampler, tree)
+
+    root, thread_hash_tree = build_test_plan_skeleton(test_name)
+    expand_samplers(thread_hash_tree, generated, layout)
+    return ET.tostring(root, encoding="utf-8", pretty_print=True, xml_declaration=True)
+
+
+class CompletionCancelled(Exception):
+    """Raised inside a completion whose hedged race was won by another provider"""
+
+
+def single_completion(completion):
+    """complete(prompt, validate) (see build_chunked_jmx) asking one provider's completion(prompt, cancelled)"""
+    return lambda prompt, validate: validate(completion(prompt, None))
+
+
+def hedged_completion(completions, delay, outcomes):
+    """complete(prompt, validate) (see build_chunked_jmx) racing providers for every prompt.
+
+    `completions` lists (provider, completion(prompt, cancelled)) in order of preference. The
+    first provider is asked at once and each next one `delay` seconds later (0: all at once), or
+    as soon as every provider asked so far has failed. The first response that passes
+    `validate` wins, the other requests are cancelled (their streams are closed) and
+    (provider, latency in seconds) is appended to `outcomes`. When every provider fails, the
+    last error is raised.
+    """
+    def complete(prompt, validate):
+        cancelled = threading.Event()
+        finished = queue.Queue()
+        started = time.monotonic()
+
+        def attempt(provider, completion):
+            try:
+                finished.put((provider, validate(completion(prompt, cancelled)), None))
+            except Exception as e:
+                finished.put((provider, None, e))
+
+        waiting = list(completions)
+        running = 0
+        start_next = True
+        while True:
+            if waiting and start_next:
+                threading.Thread(target=attempt, args=waiting.pop(0), daemon=True).start()
+                running += 1
+            try:
+                provider, value, error = finished.get(timeout=max(0, delay) if waiting else None)
+            except queue.Empty:
+                start_next = True
+                continue
+            running -= 1
+            if error is None:
+                cancelled.set()
+                latency = time.monotonic() - started
+                outcomes.append((provider, latency))
+                logging.info(f"Hedged completion won by {provider} in {latency:.1f}s")
+                return value
+            logging.warning(f"Hedged completion from {provider} failed: {error}")
+            if not running and not waiting:
+                raise error
+            start_next = not running
+    return complete
+
+
+def claude_completion(prompt, cancelled=None):
+    """Claude's response to a chunk prompt; the stream is closed once `cancelled` is set"""
+    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    budget = plan_budget('jmx_chunk', 'claude', prompt)
+    started = time.monotonic()
+    with client.messages.stream(
+        model=ANTHROPIC_MODEL,
+        max_tokens=budget.max_tokens,
+        temperature=0.3,
+        system="You are a senior QA automation engineer specializing in JMeter test plans.",
+        messages=[{"role": "user", "content": prompt}]
+    ) as stream:
+        pieces = []
+        for text in stream.text_stream:
+            if cancelled is not None and cancelled.is_set():
+                raise CompletionCancelled('claude')
+            pieces.append(text)
+        message = stream.get_final_message()
+        record_usage(budget, message, time.monotonic() - started)
+        check_complete(budget, message.stop_reason)
+        return ''.join(pieces)
+
+
+def openai_completion(prompt, cancelled=None):
+    """OpenAI's response to a chunk prompt; the stream is closed once `cancelled` is set"""
+    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    budget = plan_budget('jmx_chunk', 'openai', prompt)
+    started = time.monotonic()
+    with client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a performance test engineer specializing in JMeter test plans. Return only valid JMX XML content."},
+            {"role": "user", "content": prompt}
+        ],
+        max_completion_tokens=budget.max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+    ) as stream:
+        pieces = []
+        finish_reason = None
+        for event in stream:
+            if cancelled is not None and cancelled.is_set():
+                raise CompletionCancelled('openai')
+            if event.choices:
+                finish_reason = event.choices[0].finish_reason or finish_reason
+                if event.choices[0].delta.content:
+                    pieces.append(event.choices[0].delta.content)
+            if event.usage is not None:
+                record_usage(budget, event, time.monotonic() - started)
+        check_complete(budget, finish_reason)
+        return ''.join(pieces)
+
+
+COMPLETIONS = {'claude': claude_completion, 'openai': openai_completion}
+
+
+def write_generated_jmx(jmx, file_prefix):
+    output_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{file_prefix}_{uuid.uuid4().hex[:8]}.jmx")
+    with open(output_path, "wb") as f:
+        f.write(jmx)
+    return output_path
+
+
+def generate_correlated_jmx_with_claude(correlation_results, xml_path):
+    """Generate a JMX file with correlated requests using Claude AI."""
+    try:
+        jmx = build_chunked_jmx(load_recording(xml_path), correlation_results, single_completion(claude_completion),
+                                ['claude'])
+        return write_generated_jmx(jmx, "correlated_test_plan")
+    except Exception as e:
+        current_app.logger.error(f"Error generating JMX with Claude: {str(e)}")
+        raise
+
+
+def generate_correlated_jmx_with_openai(correlation_results, xml_path):
+    """Generate a JMX file with correlated requests using OpenAI."""
+    try:
+        jmx = build_chunked_jmx(load_recording(xml_path), correlation_results, single_completion(openai_completion),
+                                ['openai'])
+        return write_generated_jmx(jmx, "openai_test_plan")
+    except Exception as e:
+        current_app.logger.error(f"Error generating JMX with OpenAI: {str(e)}")
+        raise
+
+
+def generate_correlated_jmx_hedged(correlation_results, xml_path, providers=('claude', 'openai'),
+                                   delay=CORRELATION_LLM_HEDGE_DELAY):
+    """Generate a JMX file racing `providers` (first preferred) on every chunk, see hedged_completion.
+
+    Returns (path, provider that won most chunks).
+    """
+    outcomes = []
+    complete = hedged_completion([(provider, COMPLETIONS[provider]) for provider in providers], delay, outcomes)
+    try:
+        jmx = build_chunked_jmx(load_recording(xml_path), correlation_results, complete, providers)
+    except Exception as e:
+        current_app.logger.error(f"Error generating hedged JMX ({', '.join(providers)}): {str(e)}")
+        raise
+    wins = collections.Counter(provider for provider, _ in outcomes)
+    for provider in providers:
+        latencies = sorted(latency for winner, latency in outcomes if winner == provider)
+        if latencies:
+            current_app.logger.info(f"Hedged JMX generation: {provider} won {len(latencies)}/"
+                                    f"{len(outcomes)} chunks, latency {latencies[len(latencies) // 2]:.1f}s median, "
+                                    f"{latencies[-1]:.1f}s max")
+    winner = max(providers, key=lambda provider: wins[provider])
+    return write_generated_jmx(jmx, f"{winner}_test_plan"), winner
@@ -0,0 +1,743 @@
+"""JMeter JTL (CSV) results: live tailing and a memory-mapped columnar store.
+
+A `JtlTailer` follows a JTL that JMeter is still writing. Every poll reads only the bytes
+appended since the previous poll, so the work per refresh is proportional to the new
+samples. Per-label aggregates keep a log-bucket percentile sketch (bounded relative error)
+and time buckets instead of the raw samples.
+
+`load_jtl_columns` parses a finished JTL once into typed column files (keyed by the file's
+sha256) and memory-maps them afterwards, so statistics, time series and run comparisons
+for any cut of the same results start without re-reading the CSV.
+"""
+import array
+import bisect
+import collections
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config import JTL_CACHE_DIR, LIVE_MAX_SESSIONS, LIVE_SESSION_IDLE_MINUTES
+
+# Column order JMeter uses when the JTL is written without a header line
+DEFAULT_JTL_FIELDS = [
+    'timeStamp', 'elapsed', 'label', 'responseCode', 'responseMessage', 'threadName', 'dataType',
+    'success', 'failureMessage', 'bytes', 'sentBytes', 'grpThreads', 'allThreads', 'URL',
+    'Latency', 'IdleTime', 'Connect'
+]
+JTL_EXTENSIONS = ('.jtl', '.csv')
+TIMESTAMP_FORMATS = ('%Y/%m/%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S.%f', '%Y/%m/%d %H:%M:%S', '%Y-%m-%d %H:%M:%S')
+
+# Relative accuracy of the percentile sketch (1%)
+SKETCH_ACCURACY = 0.01
+# Time buckets a live tailer keeps for its timeline (older samples still count in the statistics)
+LIVE_MAX_BUCKETS = 360
+
+# Live sessions by id, least recently polled first (in-process; the page polls /api/live-report/<id>)
+LIVE_SESSIONS = collections.OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def parse_timestamp(value):
+    """JTL timeStamp as epoch milliseconds (default format) or a formatted date."""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return int(datetime.strptime(value, fmt).timestamp() * 1000)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised timeStamp: {value}")
+
+
+def to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def sla_verdict(p90, error_pct, api_threshold, err_rate_threshold):
+    """Same rule as the report colouring: strictly below each threshold passes."""
+    try:
+        api_threshold = float(api_threshold)
+        err_rate_threshold = float(err_rate_threshold)
+    except (TypeError, ValueError):
+        return None
+    if p90 is None:
+        return None
+    return 'Compliant' if p90 < api_threshold and error_pct < err_rate_threshold else 'Not Compliant'
+
+
+class PercentileSketch:
+    """Log-bucketed histogram: quantiles within SKETCH_ACCURACY relative error, O(1) inserts."""
+    __slots__ = ('gamma', 'log_gamma', 'buckets', 'zero_count', 'count')
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, weight=1):
+        self.count += weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + weight
+
+    def merge(self, other):
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, weight in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + weight
+
+    def quantile(self, q):
+        """Nearest-rank quantile estimate (q in 0-1), or None when empty."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = self.zero_count
+        if rank <= seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class LabelAggregate:
+    """Running statistics for one label (or the overall total)."""
+    __slots__ = ('count', 'errors', 'elapsed_sum', 'min', 'max', 'bytes', 'sent_bytes',
+                 'first_ts', 'last_end', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.elapsed_sum = 0
+        self.min = None
+        self.max = None
+        self.bytes = 0
+        self.sent_bytes = 0
+        self.first_ts = None
+        self.last_end = None
+        self.sketch = PercentileSketch()
+
+    def add(self, ts, elapsed, success, received, sent):
+        self.count += 1
+        if not success:
+            self.errors += 1
+        self.elapsed_sum += elapsed
+        self.min = elapsed if self.min is None else min(self.min, elapsed)
+        self.max = elapsed if self.max is None else max(self.max, elapsed)
+        self.bytes += received
+        self.sent_bytes += sent
+        self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+        self.last_end = ts + elapsed if self.last_end is None else max(self.last_end, ts + elapsed)
+        self.sketch.add(elapsed)
+
+    def to_dict(self, label, api_threshold=None, err_rate_threshold=None):
+        duration_ms = self.last_end - self.first_ts if self.count else 0
+        percentiles = [self.sketch.quantile(q) for q in (0.50, 0.90, 0.95, 0.99)]
+        return build_stats(label, self.count, self.errors, self.elapsed_sum, self.min, self.max, percentiles,
+                           duration_ms, self.bytes, self.sent_bytes, api_threshold, err_rate_threshold)
+
+
+def build_stats(label, count, errors, elapsed_sum, min_elapsed, max_elapsed, percentiles, duration_ms,
+                received, sent, api_threshold=None, err_rate_threshold=None):
+    """Statistics row shared by the live aggregates and the columnar store.
+
+    `percentiles` holds the median, 90th, 95th and 99th percentile response times.
+    """
+    duration_s = max(duration_ms / 1000.0, 0.001) if count else None
+    error_pct = errors * 100.0 / count if count else 0.0
+    median, p90, p95, p99 = percentiles
+    return {
+        'label': label,
+        'samples': count,
+        'errors': errors,
+        'error_pct': round(error_pct, 2),
+        'mean': round(elapsed_sum / count, 2) if count else None,
+        'min': min_elapsed,
+        'max': max_elapsed,
+        'median': _round(median),
+        'p90': _round(p90),
+        'p95': _round(p95),
+        'p99': _round(p99),
+        'throughput': round(count / duration_s, 2) if duration_s else 0.0,
+        'received_kb_per_sec': round(received / 1024.0 / duration_s, 2) if duration_s else 0.0,
+        'sent_kb_per_sec': round(sent / 1024.0 / duration_s, 2) if duration_s else 0.0,
+        'verdict': sla_verdict(p90, error_pct, api_threshold, err_rate_threshold)
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+class JtlTailer:
+    """Incrementally aggregates a JTL that may still be growing.
+
+    Only complete lines are consumed; a trailing partial line (or a quoted field spanning
+    lines) is kept until the rest of it has been written. A file that shrinks (rotated or
+    rewritten) is re-read from the start. Time buckets are kept in order as they are opened
+    and only the latest `max_buckets` are kept, so a snapshot costs the same at any test length.
+    """
+
+    def __init__(self, path, bucket_seconds=10, max_buckets=LIVE_MAX_BUCKETS):
+        self.path = path
+        self.bucket_ms = max(1, int(bucket_seconds)) * 1000
+        self.max_buckets = max(1, int(max_buckets))
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.fields = None
+        self.index = {}
+        self.pending = b''
+        self.overall = LabelAggregate()
+        self.labels = {}
+        self.buckets = {}
+        self.bucket_starts = collections.deque()
+        self.bad_lines = 0
+        self.last_poll = None
+
+    def poll(self):
+        """Consume the bytes appended since the last poll; returns the number of new samples."""
+        with self._lock:
+            size = os.path.getsize(self.path)
+            if size < self.offset:
+                logging.info(f"{self.path} shrank ({size} < {self.offset} bytes), re-reading from start")
+                self._reset()
+            chunk = b''
+            if size > self.offset:
+                with open(self.path, 'rb') as f:
+                    f.seek(self.offset)
+                    chunk = f.read(size - self.offset)
+                self.offset += len(chunk)
+            self.last_poll = time.time()
+
+            data = self.pending + chunk
+            end = data.rfind(b'\n')
+            if end == -1:
+                self.pending = data
+                return 0
+            self.pending = data[end + 1:]
+
+            added = 0
+            record = None
+            for line in data[:end].decode('utf-8', errors='replace').split('\n'):
+                line = line.rstrip('\r')
+                record = line if record is None else record + '\n' + line
+                if record.count('"') % 2:
+                    continue  # quoted field continues on the next line
+                if record and self._consume(record):
+                    added += 1
+                record = None
+            if record is not None:
+                self.pending = (record + '\n').encode('utf-8') + self.pending
+            return added
+
+    def _consume(self, line):
+        row = next(csv.reader([line]))
+        if self.fields is None:
+            if 'timeStamp' in row and 'elapsed' in row:
+                self._set_fields(row)
+                return False
+            self._set_fields(DEFAULT_JTL_FIELDS)
+        try:
+            ts = parse_timestamp(row[self.index['timeStamp']])
+            elapsed = int(row[self.index['elapsed']])
+            label = row[self.index['label']]
+            success = row[self.index['success']].strip().lower() == 'true'
+        except (IndexError, KeyError, ValueError):
+            self.bad_lines += 1
+            return False
+        received = to_int(self._get(row, 'bytes'))
+        sent = to_int(self._get(row, 'sentBytes'))
+
+        aggregate = self.labels.get(label)
+        if aggregate is None:
+            aggregate = self.labels[label] = LabelAggregate()
+        aggregate.add(ts, elapsed, success, received, sent)
+        self.overall.add(ts, elapsed, success, received, sent)
+
+        start = ts - ts % self.bucket_ms
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self._open_bucket(start)
+        if bucket is not None:
+            bucket[0] += 1
+            bucket[1] += 0 if success else 1
+            bucket[2] += elapsed
+        return True
+
+    def _open_bucket(self, start):
+        """New time bucket at `start`, or None when it is older than every kept bucket"""
+        starts = self.bucket_starts
+        if starts and start < starts[-1]:
+            # Samples are written roughly in time order; a late one lands among the recent buckets
+            if len(starts) >= self.max_buckets and start < starts[0]:
+                return None
+            starts.insert(bisect.bisect(starts, start), start)
+        else:
+            starts.append(start)
+        bucket = self.buckets[start] = [0, 0, 0]
+        while len(starts) > self.max_buckets:
+            del self.buckets[starts.popleft()]
+        return bucket
+
+    def _set_fields(self, fields):
+        self.fields = list(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+
+    def _get(self, row, name):
+        i = self.index.get(name)
+        return row[i] if i is not None and i < len(row) else None
+
+    def snapshot(self, api_threshold=None, err_rate_threshold=None, max_buckets=LIVE_MAX_BUCKETS):
+        """Current statistics, SLA verdicts and the most recent time buckets."""
+        with self._lock:
+            bucket_s = self.bucket_ms / 1000.0
+            timeline = []
+            for start in list(self.bucket_starts)[-max_buckets:]:
+                count, errors, elapsed_sum = self.buckets[start]
+                timeline.append({
+                    'time': start,
+                    'samples': count,
+                    'errors': errors,
+                    'throughput': round(count / bucket_s, 2),
+                    'mean': round(elapsed_sum / count, 2)
+                })
+            return {
+                'file': os.path.basename(self.path),
+                'offset': self.offset,
+                'bad_lines': self.bad_lines,
+                'polled_at': self.last_poll,
+                'bucket_seconds': bucket_s,
+                'thresholds': {'api_threshold': api_threshold, 'err_rate_threshold': err_rate_threshold},
+                'overall': self.overall.to_dict('Total', api_threshold, err_rate_threshold),
+                'labels': [agg.to_dict(label, api_threshold, err_rate_threshold)
+                           for label, agg in sorted(self.labels.items(), key=lambda item: item[0].lower())],
+                'timeline': timeline
+            }
+
+
+def _expire_live_sessions(now):
+    """Drop sessions idle for LIVE_SESSION_IDLE_MINUTES and the least recently polled beyond
+    LIVE_MAX_SESSIONS - 1 (room for one more); caller holds _sessions_lock"""
+    cutoff = now - LIVE_SESSION_IDLE_MINUTES * 60
+    while LIVE_SESSIONS:
+        session_id, live = next(iter(LIVE_SESSIONS.items()))
+        if live['last_access'] >= cutoff and len(LIVE_SESSIONS) < LIVE_MAX_SESSIONS:
+            break
+        del LIVE_SESSIONS[session_id]
+        logging.info(f"Live report session {session_id} for {live['tailer'].path} closed")
+
+
+def start_live_session(path, api_threshold, err_rate_threshold, bucket_seconds=10):
+    """Register a tailer for `path` and return its session id.
+
+    Sessions not polled for LIVE_SESSION_IDLE_MINUTES are dropped, and at most
+    LIVE_MAX_SESSIONS are kept (the least recently polled goes first).
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"JTL file not found: {path}")
+    if not path.lower().endswith(JTL_EXTENSIONS):
+        raise ValueError("Live mode only follows .jtl or .csv result files")
+    session_id = uuid.uuid4().hex
+    with _sessions_lock:
+        now = time.time()
+        _expire_live_sessions(now)
+        LIVE_SESSIONS[session_id] = {
+            'tailer': JtlTailer(path, bucket_seconds),
+            'api_threshold': api_threshold,
+            'err_rate_threshold': err_rate_threshold,
+            'last_access': now
+        }
+    return session_id
+
+
+def poll_live_session(session_id):
+    """Read the new samples of a live session and return its snapshot (None if unknown)."""
+    with _sessions_lock:
+        now = time.time()
+        live = LIVE_SESSIONS.get(session_id)
+        if live is not None and live['last_access'] < now - LIVE_SESSION_IDLE_MINUTES * 60:
+            live = None
+        if live is not None:
+            live['last_access'] = now
+            LIVE_SESSIONS.move_to_end(session_id)
+    if live is None:
+        return None
+    tailer = live['tailer']
+    tailer.poll()
+    return tailer.snapshot(live['api_threshold'], live['err_rate_threshold'])
+
+
+# Columnar store: one typed file per column, memory-mapped on load.
+# (name, array typecode); rows are stored sorted by timestamp.
+COLUMN_SPECS = [
+    ('timestamp', 'q'),
+    ('elapsed', 'i'),
+    ('label', 'i'),
+    ('success', 'B'),
+    ('bytes', 'q'),
+    ('sent_bytes', 'q'),
+    ('latency', 'i'),
+    ('connect', 'i'),
+]
+STORE_VERSION = 1
+
+
+class JtlColumns:
+    """Read-only, memory-mapped view of a stored JTL.
+
+    Each column is a zero-copy typed memoryview (`columns['elapsed'][i]`); `labels` maps the
+    interned label ids back to names. Use as a context manager or call close().
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(store_dir, 'labels.json'), 'r', encoding='utf-8') as f:
+            self.labels = json.load(f)
+        self.count = self.meta['count']
+        self.source_sha256 = self.meta['sha256']
+        self._maps = []
+        self.columns = {}
+        for name, typecode in COLUMN_SPECS:
+            if not self.count:
+                self.columns[name] = memoryview(array.array(typecode))
+                continue
+            with open(os.path.join(store_dir, f'{name}.col'), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mm)
+            self.columns[name] = memoryview(mm).cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        for mm in self._maps:
+            mm.close()
+        self._maps = []
+
+    def statistics(self, start=0, stop=None, label_ids=None, api_threshold=None, err_rate_threshold=None):
+        """Exact per-label and overall statistics for rows [start, stop)."""
+        return column_statistics(self, start, stop, label_ids, api_threshold, err_rate_threshold)
+
+    def timeline(self, bucket_seconds=10, start=0, stop=None, label_ids=None):
+        """Samples, errors, throughput and mean response time per time bucket."""
+        return column_timeline(self, bucket_seconds, start, stop, label_ids)
+
+
+def _source_key(path):
+    st = os.stat(path)
+    return hashlib.sha256(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+
+def _source_sha256(path):
+    """sha256 of the JTL, remembered per (path, size, mtime) so unchanged files are not re-hashed."""
+    stat_path = os.path.join(JTL_CACHE_DIR, 'by-stat', _source_key(path))
+    try:
+        with open(stat_path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    os.makedirs(os.path.dirname(stat_path), exist_ok=True)
+    with open(stat_path, 'w', encoding='utf-8') as f:
+        f.write(sha)
+    return sha
+
+
+def ingest_jtl(path, store_dir):
+    """Parse a JTL once and persist it as typed column files sorted by timestamp."""
+    columns = {name: array.array(typecode) for name, typecode in COLUMN_SPECS}
+    label_ids = {}
+    bad_lines = 0
+
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        fields = first if first and 'timeStamp' in first and 'elapsed' in first else DEFAULT_JTL_FIELDS
+        index = {name: i for i, name in enumerate(fields)}
+        rows = reader if fields is not DEFAULT_JTL_FIELDS else itertools.chain([first] if first else [], reader)
+
+        def get(row, name):
+            i = index.get(name)
+            return row[i] if i is not None and i < len(row) else None
+
+        for row in rows:
+            try:
+                ts = parse_timestamp(row[index['timeStamp']])
+                elapsed = int(row[index['elapsed']])
+                label = row[index['label']]
+                success = row[index['success']].strip().lower() == 'true'
+            except (IndexError, KeyError, ValueError):
+                bad_lines += 1
+                continue
+            label_id = label_ids.get(label)
+            if label_id is None:
+                label_id = label_ids[label] = len(label_ids)
+            columns['timestamp'].append(ts)
+            columns['elapsed'].append(elapsed)
+            columns['label'].append(label_id)
+            columns['success'].append(1 if success else 0)
+            columns['bytes'].append(to_int(get(row, 'bytes')))
+            columns['sent_bytes'].append(to_int(get(row, 'sentBytes')))
+            columns['latency'].append(to_int(get(row, 'Latency')))
+            columns['connect'].append(to_int(get(row, 'Connect')))
+
+    # JMeter writes samples at completion time, so timestamps are only roughly ordered
+    timestamps = columns['timestamp']
+    if any(timestamps[i] > timestamps[i + 1] for i in range(len(timestamps) - 1)):
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        for name, typecode in COLUMN_SPECS:
+            column = columns[name]
+            columns[name] = array.array(typecode, (column[i] for i in order))
+
+    tmp_dir = f"{store_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_dir)
+    for name, _ in COLUMN_SPECS:
+        with open(os.path.join(tmp_dir, f'{name}.col'), 'wb') as f:
+            columns[name].tofile(f)
+    with open(os.path.join(tmp_dir, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump(list(label_ids), f)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': STORE_VERSION,
+            'sha256': os.path.basename(store_dir),
+            'source': os.path.basename(path),
+            'count': len(timestamps),
+            'bad_lines': bad_lines,
+            'byteorder': sys.byteorder,
+            'columns': dict(COLUMN_SPECS)
+        }, f)
+    try:
+        os.rename(tmp_dir, store_dir)
+    except OSError:
+        # Another request stored the same file first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logging.info(f"Stored {len(timestamps)} samples of {path} as columns ({bad_lines} unparsable lines)")
+
+
+def load_jtl_columns(path):
+    """Memory-map the stored columns of `path`, parsing the JTL only the first time it is seen."""
+    sha = _source_sha256(path)
+    store_dir = os.path.join(JTL_CACHE_DIR, f'v{STORE_VERSION}', sha)
+    if not os.path.isdir(store_dir):
+        ingest_jtl(path, store_dir)
+    return JtlColumns(store_dir)
+
+
+def percentile(sorted_values, q):
+    """Percentile as in the JMeter dashboard (commons-math legacy estimation), q in 0-100."""
+    n = len(sorted_values)
+    if not n:
+        return None
+    pos = q * (n + 1) / 100.0
+    if pos < 1:
+        return float(sorted_values[0])
+    if pos >= n:
+        return float(sorted_values[-1])
+    lower = sorted_values[int(pos) - 1]
+    upper = sorted_values[int(pos)]
+    return lower + (pos - int(pos)) * (upper - lower)
+
+
+def _selected_rows(store, start, stop, label_ids):
+    stop = store.count if stop is None else min(stop, store.count)
+    start = max(0, start)
+    rows = range(start, stop)
+    if label_ids is None:
+        return rows
+    # Label mask as a lookup table, applied over a zero-copy slice of the label column
+    mask = bytearray(len(store.labels))
+    for label_id in label_ids:
+        mask[label_id] = 1
+    return list(itertools.compress(rows, map(mask.__getitem__, store.columns['label'][start:stop])))
+
+
+def column_statistics(store, start=0, stop=None, label_ids=None, api_threshold=None, err_rate_threshold=None):
+    """Exact statistics (JMeter percentile definition) over the selected rows of a store."""
+    cols = store.columns
+    ts, elapsed, labels, success = cols['timestamp'], cols['elapsed'], cols['label'], cols['success']
+    received, sent = cols['bytes'], cols['sent_bytes']
+
+    per_label = {}
+    for i in _selected_rows(store, start, stop, label_ids):
+        per_label.setdefault(labels[i], []).append(i)
+
+    def summarize(name, rows):
+        values = sorted(elapsed[i] for i in rows)
+        first = min(ts[i] for i in rows)
+        last_end = max(ts[i] + elapsed[i] for i in rows)
+        return build_stats(
+            name, len(rows), sum(1 for i in rows if not success[i]), sum(values), values[0], values[-1],
+            [percentile(values, q) for q in (50, 90, 95, 99)], last_end - first,
+            sum(received[i] for i in rows), sum(sent[i] for i in rows), api_threshold, err_rate_threshold)
+
+    all_rows = [i for rows in per_label.values() for i in rows]
+    return {
+        'overall': summarize('Total', all_rows) if all_rows else build_stats(
+            'Total', 0, 0, 0, None, None, [None] * 4, 0, 0, 0, api_threshold, err_rate_threshold),
+        'labels': sorted((summarize(store.labels[label_id], rows) for label_id, rows in per_label.items()),
+                         key=lambda row: row['label'].lower())
+    }
+
+
+def column_timeline(store, bucket_seconds=10, start=0, stop=None, label_ids=None):
+    """Per-bucket samples, errors, throughput and mean response time over the selected rows."""
+    bucket_ms = max(1, int(bucket_seconds)) * 1000
+    cols = store.columns
+    ts, elapsed, success = cols['timestamp'], cols['elapsed'], cols['success']
+    buckets = {}
+    for i in _selected_rows(store, start, stop, label_ids):
+        key = ts[i] - ts[i] % bucket_ms
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0, 0, 0]
+        bucket[0] += 1
+        bucket[1] += 0 if success[i] else 1
+        bucket[2] += elapsed[i]
+    return [
+        {
+            'time': key,
+            'samples': count,
+            'errors': errors,
+            'throughput': round(count * 1000.0 / bucket_ms, 2),
+            'mean': round(elapsed_sum / count, 2)
+        }
+        for key, (count, errors, elapsed_sum) in sorted(buckets.items())
+    ]
+
+
+def compare_statistics(baseline, current):
+    """Per-label deltas between two `column_statistics` results (current minus baseline)."""
+    base_rows = {row['label']: row for row in baseline['labels']}
+    base_rows['Total'] = baseline['overall']
+    comparison = []
+    for row in [current['overall']] + current['labels']:
+        base = base_rows.get(row['label'])
+        entry = {'label': row['label'], 'baseline': base, 'current': row}
+        if base:
+            entry['delta'] = {
+                key: round(row[key] - base[key], 2)
+                for key in ('mean', 'median', 'p90', 'p95', 'p99', 'error_pct', 'throughput')
+                if row[key] is not None and base[key] is not None
+            }
+        comparison.append(entry)
+    return comparison
+
+
+def open_run(run_id):
+    """Open a previously stored run by its id (the JTL's sha256); None if unknown."""
+    if not re.fullmatch(r'[0-9a-f]{64}', run_id or ''):
+        return None
+    store_dir = os.path.join(JTL_CACHE_DIR, f'v{STORE_VERSION}', run_id)
+    return JtlColumns(store_dir) if os.path.isdir(store_dir) else None
+
+
+def run_info(store):
+    """Summary of a stored run: id, sample count, labels and time range."""
+    ts = store.columns['timestamp']
+    return {
+        'run_id': store.source_sha256,
+        'source': store.meta.get('source'),
+        'samples': store.count,
+        'labels': store.labels,
+        'start': ts[0] if store.count else None,
+        'end': ts[store.count - 1] if store.count else None
+    }
+
+
+def resolve_window(store, start=None, end=None, from_s=None, to_s=None):
+    """Row range [lo, hi) for the time window [start, end).
+
+    `start`/`end` are epoch milliseconds; `from_s`/`to_s` are seconds relative to the first
+    sample and take precedence. Rows are sorted by timestamp, so both ends are binary searches.
+    """
+    ts = store.columns['timestamp']
+    if not store.count:
+        return 0, 0
+    if from_s is not None:
+        start = ts[0] + int(float(from_s) * 1000)
+    if to_s is not None:
+        end = ts[0] + int(float(to_s) * 1000)
+    lo = bisect.bisect_left(ts, int(start)) if start is not None else 0
+    hi = bisect.bisect_left(ts, int(end)) if end is not None else store.count
+    return lo, max(lo, hi)
+
+
+def resolve_labels(store, label_regex=None, labels=None):
+    """Label ids matching a regex (searched anywhere in the label) and/or an explicit group.
+
+    Returns None when no label filter is given (all labels).
+    """
+    if not label_regex and not labels:
+        return None
+    pattern = re.compile(label_regex) if label_regex else None
+    group = set(labels or [])
+    return [label_id for label_id, name in enumerate(store.labels)
+            if (pattern is None or pattern.search(name)) and (not group or name in group)]
+
+
+def query_statistics(store, start=None, end=None, from_s=None, to_s=None, label_regex=None, labels=None,
+                     api_threshold=None, err_rate_threshold=None):
+    """Statistics for any [start, end) window and label regex / group of a stored run."""
+    lo, hi = resolve_window(store, start, end, from_s, to_s)
+    result = column_statistics(store, lo, hi, resolve_labels(store, label_regex, labels),
+                               api_threshold, err_rate_threshold)
+    ts = store.columns['timestamp']
+    result['window'] = {
+        'start': ts[lo] if lo < hi else None,
+        'end': ts[hi - 1] if lo < hi else None,
+        'rows': hi - lo
+    }
+    return result
+
+
+def query_timeline(store, bucket_seconds=10, start=None, end=None, from_s=None, to_s=None,
+                   label_regex=None, labels=None):
+    """Time buckets for any [start, end) window and label regex / group of a stored run."""
+    lo, hi = resolve_window(store, start, end, from_s, to_s)
+    return column_timeline(store, bucket_seconds, lo, hi, resolve_labels(store, label_regex, labels))
+
+
+def steady_state_statistics(jtl_path, ramp_up_minutes, api_threshold=None, err_rate_threshold=None):
+    """Statistics of a JTL excluding the first `ramp_up_minutes` of the run."""
+    with load_jtl_columns(jtl_path) as store:
+        ramp_up_s = max(0.0, float(ramp_up_minutes or 0)) * 60
+        result = query_statistics(store, from_s=ramp_up_s, api_threshold=api_threshold,
+                                  err_rate_threshold=err_rate_threshold)
+        result['ramp_up_minutes'] = ramp_up_s / 60
+        return result
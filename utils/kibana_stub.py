@@ -0,0 +1,183 @@
+"""Local stand-in for the Kibana APM endpoints used by the report generator.
+
+Implements just enough of Kibana for `fetch_kibana_metrics_with_login`:
+  POST /internal/security/login                       -> sets a session cookie
+  GET  /internal/apm/services/<name>/metrics/charts   -> synthetic CPU / memory charts
+
+Usage (from the repository root):
+    python -m utils.kibana_stub --port 5602 --points 500 --latency-ms 150 --failure-rate 0.05
+then set KIBANA_BASE_URL=http://127.0.0.1:5602 (environment or .env) before starting the app.
+"""
+import argparse
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, jsonify, request
+
+SESSION_COOKIE = 'sid'
+
+# Chart layout mirrors the Kibana 8.x APM metrics response consumed by ask_gpt_for_CPU_Memory
+CHARTS = [
+    {
+        'title': 'CPU usage',
+        'key': 'cpu_usage_chart',
+        'series': [
+            ('System max', 'cpu_usage_system_max', 0.55),
+            ('System average', 'cpu_usage_system_avg', 0.40),
+            ('Process max', 'cpu_usage_process_max', 0.35),
+            ('Process average', 'cpu_usage_process_avg', 0.22),
+        ]
+    },
+    {
+        'title': 'System memory usage',
+        'key': 'memory_usage_chart',
+        'series': [
+            ('Max', 'memory_usage_max', 0.70),
+            ('Average', 'memory_usage_avg', 0.62),
+        ]
+    },
+]
+
+
+def _parse_iso(value, default):
+    """Parse Kibana style '2025-05-11T11:22:00.000Z' timestamps to epoch milliseconds."""
+    if not value:
+        return default
+    try:
+        dt = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+    except ValueError:
+        return default
+
+
+def build_metrics_charts(service_name, start_ms, end_ms, points, seed=0):
+    """Build a deterministic synthetic charts payload with `points` samples per series."""
+    rng = random.Random(f"{seed}:{service_name}:{start_ms}:{end_ms}")
+    points = max(1, int(points))
+    step = max(1, (end_ms - start_ms) // max(1, points - 1)) if points > 1 else 0
+    timestamps = [start_ms + i * step for i in range(points)]
+
+    charts = []
+    for chart in CHARTS:
+        series = []
+        for title, key, base in chart['series']:
+            value = base
+            data = []
+            for ts in timestamps:
+                # Bounded random walk around the base utilisation
+                value = min(0.98, max(0.02, value + rng.uniform(-0.04, 0.04) + (base - value) * 0.1))
+                data.append({'x': ts, 'y': round(value, 4)})
+            series.append({
+                'title': title,
+                'key': key,
+                'type': 'linemark',
+                'overallValue': round(sum(p['y'] for p in data) / len(data), 4),
+                'data': data
+            })
+        charts.append({
+            'title': chart['title'],
+            'key': chart['key'],
+            'yUnit': 'percent',
+            'series': series
+        })
+    return {'charts': charts}
+
+
+def create_kibana_stub(points=200, latency_ms=0, latency_jitter_ms=0, failure_rate=0.0,
+                       failure_status=503, username=None, password=None, seed=0):
+    """Create the Flask app serving the Kibana stand-in.
+
+    Args:
+        points (int): Data points per series
+        latency_ms (int): Fixed delay added to every response
+        latency_jitter_ms (int): Extra uniformly distributed random delay
+        failure_rate (float): Probability (0-1) that a request fails with `failure_status`
+        failure_status (int): HTTP status returned for injected failures
+        username / password (str): If set, only these credentials are accepted
+        seed (int): Seed for the synthetic series (same inputs -> same payload)
+    """
+    app = Flask(__name__)
+    sessions = set()
+    rng = random.Random(seed)
+
+    def simulate_conditions():
+        delay = latency_ms + (rng.uniform(0, latency_jitter_ms) if latency_jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if failure_rate and rng.random() < failure_rate:
+            return jsonify({
+                'statusCode': failure_status,
+                'error': 'Injected failure',
+                'message': 'Kibana stand-in injected failure'
+            }), failure_status
+        return None
+
+    @app.route('/internal/security/login', methods=['POST'])
+    def login():
+        failure = simulate_conditions()
+        if failure:
+            return failure
+        payload = request.get_json(silent=True) or {}
+        params = payload.get('params') or {}
+        if not params.get('username') or not params.get('password'):
+            return jsonify({'statusCode': 400, 'error': 'Bad Request', 'message': 'Missing credentials'}), 400
+        if (username and params['username'] != username) or (password and params['password'] != password):
+            return jsonify({'statusCode': 401, 'error': 'Unauthorized', 'message': 'Invalid credentials'}), 401
+
+        sid = uuid.uuid4().hex
+        sessions.add(sid)
+        response = app.response_class(status=204)
+        response.set_cookie(SESSION_COOKIE, sid, httponly=True)
+        return response
+
+    @app.route('/internal/apm/services/<service_name>/metrics/charts', methods=['GET'])
+    def metrics_charts(service_name):
+        if request.cookies.get(SESSION_COOKIE) not in sessions:
+            return jsonify({'statusCode': 401, 'error': 'Unauthorized', 'message': 'Unauthorized'}), 401
+        failure = simulate_conditions()
+        if failure:
+            return failure
+        now_ms = int(time.time() * 1000)
+        end_ms = _parse_iso(request.args.get('end'), now_ms)
+        start_ms = _parse_iso(request.args.get('start'), end_ms - 15 * 60 * 1000)
+        if end_ms < start_ms:
+            start_ms, end_ms = end_ms, start_ms
+        n_points = request.args.get('points', type=int) or points
+        return jsonify(build_metrics_charts(service_name, start_ms, end_ms, n_points, seed))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Kibana APM stand-in for offline report runs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5602)
+    parser.add_argument('--points', type=int, default=200, help='Data points per series')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Fixed delay per response')
+    parser.add_argument('--latency-jitter-ms', type=int, default=0, help='Random extra delay per response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Probability (0-1) of an injected failure')
+    parser.add_argument('--failure-status', type=int, default=503, help='HTTP status for injected failures')
+    parser.add_argument('--username', help='Only accept this username')
+    parser.add_argument('--password', help='Only accept this password')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_kibana_stub(
+        points=args.points,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        username=args.username,
+        password=args.password,
+        seed=args.seed
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
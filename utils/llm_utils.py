@@ -0,0 +1,181 @@
+"""Token budgets for LLM prompts.
+
+Prompt sizes are estimated offline: text is cut into runs of at most four word characters
+and single punctuation marks, which tracks BPE token counts of English, JSON and XML closely
+enough to size a request without a tokenizer round trip. The output budget of a call comes
+from its task type and prompt size, capped by the provider's limits. A prompt that does not
+fit the context window next to its output budget is degraded with the strategy its caller
+declares:
+  - digest: the caller's digest function summarizes the data one step at a time
+  - truncate: the string fields of the data are cut to a common length
+  - chunk: the caller splits the work into prompts of at most input_limit() tokens
+Estimated and actual usage are logged per call (record_usage); a response cut off at its output
+budget is rejected (check_complete).
+"""
+import collections
+import logging
+import math
+import re
+
+from config import CLAUDE_CONTEXT_TOKENS, CLAUDE_MAX_OUTPUT_TOKENS, OPENAI_CONTEXT_TOKENS, OPENAI_MAX_OUTPUT_TOKENS, \
+    OPENAI_REASONING_TOKENS
+
+TOKEN_PIECE_RE = re.compile(r'\w{1,4}|[^\w\s]')
+
+# provider -> (context window, maximum output tokens, extra output tokens reserved for reasoning)
+PROVIDER_LIMITS = {
+    'claude': (CLAUDE_CONTEXT_TOKENS, CLAUDE_MAX_OUTPUT_TOKENS, 0),
+    'openai': (OPENAI_CONTEXT_TOKENS, OPENAI_MAX_OUTPUT_TOKENS, OPENAI_REASONING_TOKENS),
+}
+
+# task -> (minimum output tokens, maximum output tokens, output tokens per prompt token)
+TASK_BUDGETS = {
+    'statistics_analysis': (1500, 4000, 0.3),
+    'error_analysis': (1500, 5000, 0.3),
+    'metrics_extraction': (1500, 6000, 0.2),
+    # whole JMX plans measured at 3.5-4.3 output tokens per prompt token; a plan converted in one
+    # call keeps the provider's full output (64000 Claude / 100000 OpenAI) as it is not chunked
+    'jmx': (100000, 100000, 4.5),
+    'jmx_chunk': (4000, 32000, 4.5),
+}
+
+# Stop / finish reasons of an Anthropic message / OpenAI choice cut off at max tokens
+TRUNCATED_STOP_REASONS = ('max_tokens', 'length')
+
+DEGRADATION_STRATEGIES = ('digest', 'truncate', 'chunk')
+
+# Shortest a string field is truncated to, and the marker appended to it
+MIN_FIELD_CHARS = 200
+TRUNCATION_MARKER = '...[truncated]'
+
+Budget = collections.namedtuple('Budget', 'task provider prompt_tokens max_tokens context_tokens degraded')
+
+
+def estimate_tokens(text):
+    """Approximate token count of `text`"""
+    return len(TOKEN_PIECE_RE.findall(text)) if text else 0
+
+
+def output_budget(task, provider, prompt_tokens):
+    """Output tokens to request for a `task` prompt of `prompt_tokens` tokens"""
+    minimum, maximum, ratio = TASK_BUDGETS[task]
+    _, provider_max, reasoning = PROVIDER_LIMITS[provider]
+    wanted = min(maximum, max(minimum, math.ceil(prompt_tokens * ratio)))
+    return min(provider_max, wanted + reasoning)
+
+
+def plan_budget(task, provider, prompt, degraded=None):
+    """Budget of one call: estimated prompt tokens and the output budget for them"""
+    prompt_tokens = estimate_tokens(prompt)
+    return Budget(task, provider, prompt_tokens, output_budget(task, provider, prompt_tokens),
+                  PROVIDER_LIMITS[provider][0], degraded)
+
+
+def fits(budget):
+    return budget.prompt_tokens + budget.max_tokens <= budget.context_tokens
+
+
+def input_limit(task, provider):
+    """Largest prompt (tokens) whose expected output still fits the task's output budget and the context"""
+    _, maximum, ratio = TASK_BUDGETS[task]
+    context, provider_max, reasoning = PROVIDER_LIMITS[provider]
+    output = min(provider_max, maximum + reasoning)
+    return max(1, min(context - output, math.floor((output - reasoning) / ratio)))
+
+
+def _field_lengths(data):
+    """Lengths of the strings in nested dicts / lists"""
+    if isinstance(data, str):
+        yield len(data)
+    elif isinstance(data, (dict, list)):
+        for value in data.values() if isinstance(data, dict) else data:
+            yield from _field_lengths(value)
+
+
+def field_cap(data, drop_chars):
+    """Largest per-field length that cuts about `drop_chars` characters from the strings of `data`,
+    never below MIN_FIELD_CHARS and at most 3/4 of the longest field, or None if nothing can be cut"""
+    lengths = [length for length in _field_lengths(data) if length > MIN_FIELD_CHARS + len(TRUNCATION_MARKER)]
+    if not lengths:
+        return None
+    low, high = MIN_FIELD_CHARS, max(MIN_FIELD_CHARS, max(lengths) * 3 // 4)
+    while low < high:
+        cap = (low + high + 1) // 2
+        if sum(length - cap for length in lengths if length > cap) >= drop_chars:
+            low = cap
+        else:
+            high = cap - 1
+    return low
+
+
+def truncate_fields(data, cap):
+    """Copy of `data` with every string longer than `cap` (plus the marker) cut to `cap` characters"""
+    if isinstance(data, str):
+        return data[:cap] + TRUNCATION_MARKER if len(data) > cap + len(TRUNCATION_MARKER) else data
+    if isinstance(data, dict):
+        return {key: truncate_fields(value, cap) for key, value in data.items()}
+    if isinstance(data, list):
+        return [truncate_fields(value, cap) for value in data]
+    return data
+
+
+def fit_prompt(task, provider, build, data, strategy='truncate', digest=None):
+    """Prompt built from `data` (with `build`) that fits the provider's context, and its Budget.
+
+    With the 'digest' strategy `digest(data)` is applied while the prompt is too large (it
+    returns None once it cannot reduce further); what is still too large is then truncated.
+    The 'chunk' strategy is the caller's to apply (see input_limit), so an oversized prompt is
+    only truncated as a last resort.
+    """
+    if strategy not in DEGRADATION_STRATEGIES:
+        raise ValueError(f"Unknown degradation strategy: {strategy}")
+    prompt = build(data)
+    budget = plan_budget(task, provider, prompt)
+    original_tokens = budget.prompt_tokens
+    degraded = None
+    while not fits(budget):
+        reduced = digest(data) if strategy == 'digest' and digest is not None and degraded != 'truncate' else None
+        if reduced is not None:
+            degraded = 'digest'
+        else:
+            excess_tokens = budget.prompt_tokens + budget.max_tokens - budget.context_tokens
+            cap = field_cap(data, excess_tokens * 4)
+            if cap is None:
+                break
+            reduced = truncate_fields(data, cap)
+            degraded = 'truncate'
+        data = reduced
+        prompt = build(data)
+        budget = plan_budget(task, provider, prompt, degraded)
+    if degraded:
+        logging.warning(f"LLM {task} prompt for {provider} reduced by {degraded} from ~{original_tokens} "
+                        f"to ~{budget.prompt_tokens} tokens")
+    if not fits(budget):
+        logging.warning(f"LLM {task} prompt for {provider} (~{budget.prompt_tokens} tokens) still exceeds "
+                        f"the {budget.context_tokens} token context")
+    return prompt, budget
+
+
+def response_usage(response):
+    """(input tokens, output tokens) reported by an Anthropic message or OpenAI completion"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None, None
+    if hasattr(usage, 'input_tokens'):
+        return usage.input_tokens, usage.output_tokens
+    return getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None)
+
+
+def check_complete(budget, stop_reason):
+    """Raise ValueError if a call stopped at its output budget instead of finishing its answer"""
+    if stop_reason in TRUNCATED_STOP_REASONS:
+        raise ValueError(f"LLM {budget.task} response from {budget.provider} hit max tokens "
+                         f"({budget.max_tokens}) and is incomplete")
+
+
+def record_usage(budget, response, elapsed):
+    """Log estimated against actual token usage of a finished call"""
+    input_tokens, output_tokens = response_usage(response)
+    logging.info(f"LLM {budget.task} ({budget.provider}): prompt ~{budget.prompt_tokens} estimated / "
+                 f"{input_tokens} actual tokens, output {output_tokens} of {budget.max_tokens} budgeted, "
+                 f"{elapsed:.1f}s")
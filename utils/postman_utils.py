@@ -1,6 +1,7 @@
 import json
 import os
 import re
+import time
 import uuid
 import html
 from urllib.parse import urlparse
@@ -11,6 +12,8 @@ from lxml import etree as ET
 from openai import OpenAI  # Add OpenAI import
 from flask import current_app
 from config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, OPENAI_API_KEY, OPENAI_MODEL
+from utils.jmx_utils import claude_completion, openai_completion, single_completion, validated_jmx
+from utils.llm_utils import check_complete, fit_prompt, record_usage
 
 
 def _load_json_lenient(file_path):
@@ -734,25 +737,30 @@ def ask_claude_for_jmx(postman_json, correlation_data):
     try:
         client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 
-        prompt = (
-            "You are a senior QA automation engineer. Convert the following Postman collection into a JMeter JMX test plan. "
-            "Apply dynamic value correlations using JSON Extractors wherever applicable, based on the correlation mapping below.\n\n"
-            "=== Postman Collection Summary ===\n"
-            f"{json.dumps(summarize_postman(postman_json), indent=2)}\n\n"
-            "=== Correlation Mapping ===\n"
-            f"{json.dumps(correlation_data, indent=2)}\n\n"
-            "Create a JMX file that:\n"
-            "1. Creates HTTP requests based on the summarized Postman Collection\n"
-            "2. Adds Extractors for the correlations\n"
-            "3. Updates the correlated parameters to use variables\n"
-            "4. Includes proper Thread Group configuration\n"
-            "Please return only the JMeter JMX XML content."
-        )
+        def build(data):
+            return (
+                "You are a senior QA automation engineer. Convert the following Postman collection into a JMeter JMX test plan. "
+                "Apply dynamic value correlations using JSON Extractors wherever applicable, based on the correlation mapping below.\n\n"
+                "=== Postman Collection Summary ===\n"
+                f"{json.dumps(data['collection'], indent=2)}\n\n"
+                "=== Correlation Mapping ===\n"
+                f"{json.dumps(data['correlations'], indent=2)}\n\n"
+                "Create a JMX file that:\n"
+                "1. Creates HTTP requests based on the summarized Postman Collection\n"
+                "2. Adds Extractors for the correlations\n"
+                "3. Updates the correlated parameters to use variables\n"
+                "4. Includes proper Thread Group configuration\n"
+                "Please return only the JMeter JMX XML content."
+            )
+
+        prompt, budget = fit_prompt('jmx', 'claude', build,
+                                    {'collection': summarize_postman(postman_json), 'correlations': correlation_data})
 
         # Use streaming with proper handling
+        started = time.monotonic()
         with client.messages.stream(
             model=ANTHROPIC_MODEL,
-            max_tokens=64000,
+            max_tokens=budget.max_tokens,
             temperature=0.3,
             system="You are a senior QA automation engineer specializing in JMeter test plans.",
             messages=[
@@ -766,11 +774,15 @@ def ask_claude_for_jmx(postman_json, correlation_data):
             for chunk in stream:
                 if chunk.type == "content_block_delta":
                     full_text += chunk.delta.text
+            message = stream.get_final_message()
+            record_usage(budget, message, time.monotonic() - started)
+            check_complete(budget, message.stop_reason)
 
             # print(full_text)
             jmx_content = extract_jmx_xml(full_text)
 
             if jmx_content.strip():
+                jmx_content = validated_jmx(jmx_content, single_completion(claude_completion))
                 output_path = os.path.join(
                     current_app.config['UPLOAD_FOLDER'],
                     f"generated_test_plan_claude_{uuid.uuid4().hex[:8]}.jmx"
@@ -790,39 +802,47 @@ def ask_openai_for_jmx(postman_json, correlation_data):
     try:
         client = OpenAI(api_key=OPENAI_API_KEY)
 
-        prompt = (
-            "You are a senior QA automation engineer. Convert the following Postman collection into a valid Apache JMeter JMX test plan in XML format.\n\n"
-            "=== Postman Collection Summary ===\n"
-            f"{json.dumps(summarize_postman(postman_json), indent=2)}\n\n"
-            "=== Correlation Mapping ===\n"
-            f"{json.dumps(correlation_data, indent=2)}\n\n"
-            "Follow these detailed instructions to ensure the output is a structurally valid JMX file:\n"
-            "1. Create an XML-based JMeter Test Plan compatible with JMeter 5.5+.\n"
-            "2. Each element (ThreadGroup, Sampler, PostProcessor, etc.) must be followed by an empty <hashTree/> or a <hashTree> containing nested elements.\n"
-            "   - This is **mandatory** to prevent ClassCastException on load.\n"
-            "3. Use JSON Extractors (JSONPostProcessor) or regular expression extractors with the help of provided correlation mapping.\n"
-            "4. Reference extracted values using JMeter variables (e.g., ${token}).\n"
-            "5. Always escape XML-reserved characters in JSON or text: & → &amp;, < → &lt;, > → &gt;, \" → &quot;, ' → &apos;.\n"
-            "6. Add a Thread Group with default settings (e.g., 1 thread, 1 loop).\n"
-            "7. Ensure UTF-8 encoding and include the XML declaration at the top: <?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
-            "8. Do not include extra comments return a complete and valid .jmx XML document.\n"
-            "9. Validate that the output file opens cleanly in JMeter GUI without ClassCastException, XStream conversion errors, or missing hashTree nodes.\n"
-            "10. don't miss any request body data, or parameters .\n"
-        )
+        def build(data):
+            return (
+                "You are a senior QA automation engineer. Convert the following Postman collection into a valid Apache JMeter JMX test plan in XML format.\n\n"
+                "=== Postman Collection Summary ===\n"
+                f"{json.dumps(data['collection'], indent=2)}\n\n"
+                "=== Correlation Mapping ===\n"
+                f"{json.dumps(data['correlations'], indent=2)}\n\n"
+                "Follow these detailed instructions to ensure the output is a structurally valid JMX file:\n"
+                "1. Create an XML-based JMeter Test Plan compatible with JMeter 5.5+.\n"
+                "2. Each element (ThreadGroup, Sampler, PostProcessor, etc.) must be followed by an empty <hashTree/> or a <hashTree> containing nested elements.\n"
+                "   - This is **mandatory** to prevent ClassCastException on load.\n"
+                "3. Use JSON Extractors (JSONPostProcessor) or regular expression extractors with the help of provided correlation mapping.\n"
+                "4. Reference extracted values using JMeter variables (e.g., ${token}).\n"
+                "5. Always escape XML-reserved characters in JSON or text: & → &amp;, < → &lt;, > → &gt;, \" → &quot;, ' → &apos;.\n"
+                "6. Add a Thread Group with default settings (e.g., 1 thread, 1 loop).\n"
+                "7. Ensure UTF-8 encoding and include the XML declaration at the top: <?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+                "8. Do not include extra comments return a complete and valid .jmx XML document.\n"
+                "9. Validate that the output file opens cleanly in JMeter GUI without ClassCastException, XStream conversion errors, or missing hashTree nodes.\n"
+                "10. don't miss any request body data, or parameters .\n"
+            )
+
+        prompt, budget = fit_prompt('jmx', 'openai', build,
+                                    {'collection': summarize_postman(postman_json), 'correlations': correlation_data})
 
+        started = time.monotonic()
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "You are a senior QA automation engineer specializing in JMeter test plans."},
                 {"role": "user", "content": prompt}
             ],
-            max_completion_tokens=100000,
+            max_completion_tokens=budget.max_tokens,
         )
+        record_usage(budget, response, time.monotonic() - started)
+        check_complete(budget, response.choices[0].finish_reason)
 
         full_text = response.choices[0].message.content
         jmx_content = extract_jmx_xml(full_text)
 
         if jmx_content.strip():
+            jmx_content = validated_jmx(jmx_content, single_completion(openai_completion))
             output_path = os.path.join(
                 current_app.config['UPLOAD_FOLDER'],
                 f"generated_test_plan_openai_{uuid.uuid4().hex[:8]}.jmx"
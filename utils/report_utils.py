@@ -1,70 +1,132 @@
 import os
 import json
+import contextlib
 import re
 import shutil
-# import time
+import time
 import logging
 # import openai
 import zipfile
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from urllib.parse import urlparse
-# import html
+import html
 import anthropic
 import openai
 import requests
 from urllib.parse import unquote
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
-from config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, OPENAI_API_KEY, OPENAI_MODEL
+from config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, OPENAI_API_KEY, OPENAI_MODEL, KIBANA_BASE_URL, CHART_MAX_POINTS, \
+    LLM_SUMMARY_TIMEOUT
+from utils.jtl_utils import steady_state_statistics
+from utils.llm_utils import fit_prompt, record_usage
+from utils.stage_cache import extract_zip_cached, file_digest, input_hash, memoize_value, prune_cache, \
+    run_file_stage, store_value
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# LLM calls still running past their deadline, by key (see call_with_deadline)
+_pending_calls = {}
+_pending_calls_lock = threading.Lock()
+
+# Rows per pre-rendered statistics table page (on screen and per printed page)
+STATISTICS_PAGE_SIZE = 40
+
 
 def generate_jmeter_report(folder_path, form_data):
-    """Generate JMeter report from the provided folder and form data"""
+    """Generate JMeter report from the provided folder and form data
+
+    Every stage is memoized by its inputs (see utils/stage_cache.py), so regenerating a round
+    after changing only findings, scope or chaos experiments re-runs just the HTML rewrite
+    and the packaging.
+    """
     try:
+        prune_cache()
+        remove_source = False
+
         # Handle input if it's a zip file
-        if folder_path.lower().endswith('.zip'):
+        zipped = folder_path.lower().endswith('.zip')
+        source = contextlib.nullcontext((folder_path, False))
+        if zipped:
             temp_extract_dir = tempfile.mkdtemp(prefix="jmeter_extract_")
-            with zipfile.ZipFile(folder_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract_dir)
-            folder_path = temp_extract_dir  # Update folder_path to extracted content
+            source = extract_zip_cached(folder_path, temp_extract_dir)
 
         # Create output directory
         output_dir = os.path.join(tempfile.mkdtemp(prefix="jmeter_report_"), 'generated_report')
         os.makedirs(output_dir, exist_ok=True)
 
-        # Copy original files to output directory
-        for item in os.listdir(folder_path):
-            src = os.path.join(folder_path, item)
-            dst = os.path.join(output_dir, item)
-            if os.path.isdir(src):
-                shutil.copytree(src, dst, dirs_exist_ok=True)
-            else:
-                shutil.copy2(src, dst)
+        # Copy original files to output directory (a cached extraction stays leased meanwhile)
+        with source as (folder_path, from_cache):
+            if zipped and from_cache:
+                os.rmdir(temp_extract_dir)
+            elif zipped:
+                remove_source = True
+            for item in os.listdir(folder_path):
+                src = os.path.join(folder_path, item)
+                dst = os.path.join(output_dir, item)
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst, dirs_exist_ok=True)
+                else:
+                    shutil.copy2(src, dst)
 
         # Process files
-        html_file_path = os.path.join(output_dir, 'index.html')
-        js_file_path = os.path.join(output_dir, 'content/js/dashboard.js')
-        statistics_file_path = os.path.join(output_dir, 'statistics.json')
+        html_rel, js_rel, stats_rel = 'index.html', 'content/js/dashboard.js', 'statistics.json'
+        css_rel, graph_rel = 'content/css/dashboard.css', 'content/js/graph.js'
+        html_file_path = os.path.join(output_dir, html_rel)
+        js_file_path = os.path.join(output_dir, js_rel)
+        statistics_file_path = os.path.join(output_dir, stats_rel)
+        css_file_path = os.path.join(output_dir, css_rel)
+        thresholds = [form_data['api_threshold'], form_data['err_rate_threshold']]
+
+        # Steady-state headline numbers from the raw JTL (ramp-up window excluded)
+        if form_data.get('steady_state'):
+            if form_data.get('jtl_path'):
+                try:
+                    form_data = dict(form_data, steady_state_stats=steady_state_statistics(
+                        form_data['jtl_path'], form_data.get('ramp_up'), *thresholds))
+                except (OSError, ValueError) as e:
+                    logging.error(f"Error computing steady-state statistics: {str(e)}")
+            else:
+                logging.warning("Steady-state numbers requested without a JTL file - skipping")
 
-        # Edit HTML and JS files
-        edit_html_and_js(html_file_path, js_file_path, statistics_file_path, form_data)
+        # Edit HTML and JS files (LLM and Kibana calls inside are memoized separately); degraded
+        # output (a failed or timed out call) is not cached so the next run retries the calls
+        run_file_stage('edit_html_and_js', output_dir, [html_rel, js_rel, stats_rel], form_data,
+                       lambda: edit_html_and_js(html_file_path, js_file_path, statistics_file_path, form_data),
+                       cache_if=lambda degraded: not degraded)
 
         # Edit statistics table
-        edit_statistics_table(js_file_path, form_data)
+        run_file_stage('edit_statistics_table', output_dir, [js_rel], None,
+                       lambda: edit_statistics_table(js_file_path, form_data))
 
         # Set pass/fail colors
-        pass_fail_colors(js_file_path, os.path.join(output_dir, 'content/css/dashboard.css'),
-                         form_data['api_threshold'], form_data['err_rate_threshold'])
+        run_file_stage('pass_fail_colors', output_dir, [js_rel, css_rel], thresholds,
+                       lambda: pass_fail_colors(js_file_path, css_file_path, *thresholds))
+
+        # Optionally render the statistics table as static HTML instead of building it in the browser
+        if form_data.get('prerender_statistics', False):
+            page_size = form_data.get('statistics_page_size') or STATISTICS_PAGE_SIZE
+            run_file_stage('prerender_statistics_table', output_dir, [html_rel, js_rel, css_rel],
+                           thresholds + [page_size],
+                           lambda: prerender_statistics_table(html_file_path, js_file_path, css_file_path,
+                                                              *thresholds, page_size))
+
+        # Bound graph.js size regardless of test duration
+        chart_max_points = form_data.get('chart_max_points')
+        chart_max_points = CHART_MAX_POINTS if chart_max_points in (None, '') else chart_max_points
+        run_file_stage('downsample_graph_data', output_dir, [graph_rel], chart_max_points,
+                       lambda: downsample_graph_data(os.path.join(output_dir, graph_rel), chart_max_points))
 
         # Zip the final report
         zip_output_path = f"{output_dir}.zip"
         shutil.make_archive(output_dir, 'zip', output_dir)
 
-        # Clean up temporary directories
-        shutil.rmtree(folder_path if folder_path != temp_extract_dir else folder_path)
+        # Clean up temporary directories (cached extractions are kept for the next run)
+        if remove_source:
+            shutil.rmtree(folder_path)
 
         return zip_output_path
 
@@ -149,7 +211,12 @@ def build_chaos_experiments_html(form_data):
 
 
 def edit_html_and_js(html_path, js_path, stats_path, form_data):
-    """Edit the HTML and JS files with the provided form data"""
+    """Edit the HTML and JS files with the provided form data.
+
+    Returns True when the output is degraded (an LLM or Kibana call failed, missed its deadline or
+    fell back), so the stage cache does not keep it and the next run tries the calls again.
+    """
+    degraded = False
     try:
         with open(stats_path, 'r', encoding='utf-8') as json_file:
             statistics_content = json_file.read()
@@ -324,19 +391,41 @@ def edit_html_and_js(html_path, js_path, stats_path, form_data):
         # IMPORTANT: Remove the first insertion of the Thanks.png image
         # modified_html = modified_html.replace("</body>", "<img src=\"https://i.ibb.co/8L9RQ6pB/Thanks.png\" alt=\"Cover Image\" style=\"width: 100%; height: 100vh; object-fit: cover; break-after: page; display: none;\" onload=\"this.style.display='none'; window.matchMedia('print').addListener(mql => mql.matches &amp;&amp; (this.style.display='block')); window.onafterprint = () => this.style.display='none';\"></body>")
         
-        # GPT analysis if enabled
+        # GPT analysis if enabled; the rule-based summary is the instant default and the fallback
+        # when the LLM fails or misses its deadline. A late LLM answer is cached when it arrives,
+        # so regenerating the report picks it up without waiting again.
+        analysis_title = None
         if form_data.get('use_gpt', False):
             # gpt_response = ask_claude(statistics_content, form_data)
-            gpt_response = ask_gpt(statistics_content, form_data)
-            errors_analysis = analyze_errors(js_path)
-            if errors_analysis:
+            gpt_inputs = [OPENAI_MODEL, statistics_content, form_data['api_threshold'], form_data['err_rate_threshold']]
+            gpt_response = memoize_value(
+                'ask_gpt', gpt_inputs,
+                lambda: call_with_deadline(lambda: ask_gpt(statistics_content, form_data), LLM_SUMMARY_TIMEOUT,
+                                           key=('ask_gpt', input_hash(gpt_inputs)),
+                                           on_late=lambda value: store_value('ask_gpt', gpt_inputs, value)))
+            if gpt_response:
+                analysis_title = 'OpenAI GPT 4.1 -  Statistics Analysis'
+            else:
+                logging.warning("LLM statistics analysis unavailable - using the rule-based summary")
+                degraded = True
+                gpt_response = build_statistics_summary(statistics_content, form_data)
+                analysis_title = 'Statistics Analysis (rule-based, AI analysis unavailable)'
+            errors_analysis = memoize_value('analyze_errors', [OPENAI_MODEL, file_digest(js_path)],
+                                            lambda: analyze_errors(js_path))
+            if not errors_analysis:
+                degraded = True
+            else:
                 gpt_response += f"<br><br><p class='dashboard-title'>OpenAI GPT 4.1 - Errors Investigation Recommendation</p>{errors_analysis}"
+        elif form_data.get('rule_based_summary', False):
+            gpt_response = build_statistics_summary(statistics_content, form_data)
+            analysis_title = 'Statistics Analysis (rule-based)'
 
+        if analysis_title:
             gpt_response = gpt_response.replace('\n', '<br>').replace('#', '').replace('*', '')
 
             modified_html = modified_html.replace(
                 '<script src="sbadmin2-1.0.7/bower_components/jquery/dist/jquery.min.js"></script>',
-                f'<script src="sbadmin2-1.0.7/bower_components/jquery/dist/jquery.min.js"></script>\n<br><br><p class="dashboard-title">OpenAI GPT 4.1 -  Statistics Analysis</p>{gpt_response}'
+                f'<script src="sbadmin2-1.0.7/bower_components/jquery/dist/jquery.min.js"></script>\n<br><br><p class="dashboard-title">{analysis_title}</p>{gpt_response}'
             )
 
         # Add enhanced Kibana analysis processing with debugging
@@ -375,7 +464,16 @@ def edit_html_and_js(html_path, js_path, stats_path, form_data):
                     # Call the analysis function with explicit exception handling
                     try:
                         logging.info("Calling ask_gpt_for_CPU_Memory function...")
-                        KibanaAPMAnalysis = ask_gpt_for_CPU_Memory(form_data, html_path)
+                        kibana_inputs = [OPENAI_MODEL, KIBANA_BASE_URL, apm_service_name,
+                                         extract_datetime_from_html(html_path, "Start Time"),
+                                         extract_datetime_from_html(html_path, "End Time")]
+                        # Failures ("No Data found ...") are not cached so they are retried next run
+                        KibanaAPMAnalysis = memoize_value(
+                            'kibana_analysis', kibana_inputs,
+                            lambda: ask_gpt_for_CPU_Memory(form_data, html_path),
+                            cache_if=lambda value: not value.startswith('No Data found'))
+                        if not KibanaAPMAnalysis or KibanaAPMAnalysis.startswith('No Data found'):
+                            degraded = True
                         
                         if KibanaAPMAnalysis:
                             logging.info("Successfully received Kibana analysis")
@@ -407,6 +505,7 @@ def edit_html_and_js(html_path, js_path, stats_path, form_data):
                             logging.warning("No Kibana analysis data received")
                     except Exception as e:
                         logging.error(f"Error during Kibana analysis: {str(e)}")
+                        degraded = True
                         kibana_error_message = f"Failed to generate Kibana analysis: {str(e)}"
                         
                         # Add error message to the report
@@ -421,6 +520,7 @@ def edit_html_and_js(html_path, js_path, stats_path, form_data):
                 
         except Exception as e:
             logging.error(f"Error in Kibana analysis processing: {str(e)}")
+            degraded = True
         
         # Make sure closing image is always added ONCE, at the very end of the process
         if "</body>" in modified_html:
@@ -452,6 +552,7 @@ def edit_html_and_js(html_path, js_path, stats_path, form_data):
 
         with open(js_path, 'w', encoding='utf-8') as js_file:
             js_file.write(modified_js)
+        return degraded
 
     except Exception as e:
         logging.error(f"Error editing HTML/JS: {str(e)}")
@@ -481,27 +582,34 @@ def analyze_errors(js_path):
         return None
 
 
+def errors_prompt(errors_analysis):
+    return (f"I need your expert analysis of these JMeter error results from a load test. The data is provided as JSON extracts from dashboard.js:\n\n{errors_analysis}\n\n"
+            f"Please provide me with:\n"
+            f"1. A concise, actionable analysis of these errors\n"
+            f"2. Specific recommendations for where to investigate to find root causes\n"
+            f"3. The most likely reasons these errors occurred based on error patterns\n"
+            f"4. Any correlations between error types and specific transactions\n\n"
+            f"If no errors are found in the provided JSON, clearly state that no errors were detected and no analysis is needed.\n"
+            f"Format your response in short, well-organized paragraphs with clear headings.")
+
+
 def ask_claude_errors(prompt):
     """Get error analysis from Claude"""
     try:
         client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        
+        content, budget = fit_prompt('error_analysis', 'claude', errors_prompt, prompt)
+
+        started = time.monotonic()
         response = client.messages.create(
             model=ANTHROPIC_MODEL,
-            max_tokens=5000,
+            max_tokens=budget.max_tokens,
             messages=[
                 {"role": "user",
                  "content": "You are a specialized Performance Test Engineer with extensive experience in analyzing JMeter test results. Your expertise includes identifying performance bottlenecks, error patterns, and root causes in load test data."
-                            f"I need your expert analysis of these JMeter error results from a load test. The data is provided as JSON extracts from dashboard.js:\n\n{prompt}\n\n"
-                            f"Please provide me with:\n"
-                            f"1. A concise, actionable analysis of these errors\n"
-                            f"2. Specific recommendations for where to investigate to find root causes\n"
-                            f"3. The most likely reasons these errors occurred based on error patterns\n"
-                            f"4. Any correlations between error types and specific transactions\n\n"
-                            f"If no errors are found in the provided JSON, clearly state that no errors were detected and no analysis is needed.\n"
-                            f"Format your response in short, well-organized paragraphs with clear headings."}
+                            + content}
             ]
         )
+        record_usage(budget, response, time.monotonic() - started)
 
         return response.content[0].text
     except Exception as e:
@@ -511,53 +619,72 @@ def ask_claude_errors(prompt):
 def ask_gpt_errors(prompt):
     try:
         client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        content, budget = fit_prompt('error_analysis', 'openai', errors_prompt, prompt)
 
+        started = time.monotonic()
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
-            max_completion_tokens=100000,
+            max_completion_tokens=budget.max_tokens,
             messages=[
                 {"role": "system", "content": "You are a specialized Performance Test Engineer with extensive "
                                               "experience in analyzing JMeter test results. Your expertise includes "
                                               "identifying performance bottlenecks, error patterns, and root causes "
                                               "in load test data."},
                 {"role": "user",
-                 "content": f"I need your expert analysis of these JMeter error results from a load test. The data is provided as JSON extracts from dashboard.js:\n\n{prompt}\n\n"
-                            f"Please provide me with:\n"
-                            f"1. A concise, actionable analysis of these errors\n"
-                            f"2. Specific recommendations for where to investigate to find root causes\n"
-                            f"3. The most likely reasons these errors occurred based on error patterns\n"
-                            f"4. Any correlations between error types and specific transactions\n\n"
-                            f"If no errors are found in the provided JSON, clearly state that no errors were detected and no analysis is needed.\n"
-                            f"Format your response in short, well-organized paragraphs with clear headings."}
+                 "content": content}
             ]
         )
+        record_usage(budget, response, time.monotonic() - started)
 
         content = response.choices[0].message.content
         return content
     except Exception as e:
         print("An error occurred while fetching response from GPT:", str(e))
         return None
+def statistics_prompt(statistics_content, form_data):
+    return ("You are a specialized Performance Test Engineer with extensive experience in analyzing JMeter test results. Your expertise includes identifying performance bottlenecks, error patterns, and root causes in load test data."
+            f"Please analyze these JMeter performance test results:\n\n{statistics_content}\n\n"
+            f"Thiqah Performance Standards:\n"
+            f"- 90th percentile response time threshold (pct1ResTime): {form_data['api_threshold']} ms or below\n"
+            f"- Error percentage threshold: {form_data['err_rate_threshold']}% or below\n\n"
+            f"Provide your analysis in these two distinct sections:\n"
+            f"1. EXECUTIVE SUMMARY: Overall test performance assessment with clear pass/fail status against Thiqah standards. Include key metrics, major bottlenecks, and critical findings.\n\n"
+            f"2. PERFORMANCE BOTTLENECKS: Detailed analysis of the specific requests with highest response times or error rates. Include specific transaction names, their metrics, and targeted recommendations for improvement.\n\n"
+            f"Focus on actionable insights that would help developers or system administrators improve performance. Be specific about which endpoints need attention.")
+
+
+def digest_statistics(statistics_content):
+    """statistics.json without the better half of its transactions (lowest error rate, then 90th
+    percentile; Total is kept), or None once few enough are left"""
+    statistics = json.loads(statistics_content)
+    rows = [(label, row) for label, row in statistics.items() if label != 'Total']
+    if len(rows) <= 10:
+        return None
+    rows.sort(key=lambda item: (item[1].get('errorPct', 0), item[1].get('pct1ResTime', 0)), reverse=True)
+    kept = dict(rows[:len(rows) // 2])
+    if 'Total' in statistics:
+        kept['Total'] = statistics['Total']
+    return json.dumps(kept)
+
+
 def ask_claude(statistics_content, form_data):
     """Get analysis from Claude"""
     try:
         client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        
+        content, budget = fit_prompt('statistics_analysis', 'claude',
+                                     lambda statistics: statistics_prompt(statistics, form_data),
+                                     statistics_content, strategy='digest', digest=digest_statistics)
+
+        started = time.monotonic()
         response = client.messages.create(
             model=ANTHROPIC_MODEL,
-            max_tokens=2000,
+            max_tokens=budget.max_tokens,
             messages=[
                 {"role": "user",
-                 "content": "You are a specialized Performance Test Engineer with extensive experience in analyzing JMeter test results. Your expertise includes identifying performance bottlenecks, error patterns, and root causes in load test data."
-                            f"Please analyze these JMeter performance test results:\n\n{statistics_content}\n\n"
-                            f"Thiqah Performance Standards:\n"
-                            f"- 90th percentile response time threshold (pct1ResTime): {form_data['api_threshold']} ms or below\n"
-                            f"- Error percentage threshold: {form_data['err_rate_threshold']}% or below\n\n"
-                            f"Provide your analysis in these two distinct sections:\n"
-                            f"1. EXECUTIVE SUMMARY: Overall test performance assessment with clear pass/fail status against Thiqah standards. Include key metrics, major bottlenecks, and critical findings.\n\n"
-                            f"2. PERFORMANCE BOTTLENECKS: Detailed analysis of the specific requests with highest response times or error rates. Include specific transaction names, their metrics, and targeted recommendations for improvement.\n\n"
-                            f"Focus on actionable insights that would help developers or system administrators improve performance. Be specific about which endpoints need attention."}
+                 "content": content}
             ]
         )
+        record_usage(budget, response, time.monotonic() - started)
 
         return response.content[0].text
     except Exception as e:
@@ -568,26 +695,23 @@ def ask_claude(statistics_content, form_data):
 def ask_gpt(statistics_content, form_data):
     try:
         client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        content, budget = fit_prompt('statistics_analysis', 'openai',
+                                     lambda statistics: statistics_prompt(statistics, form_data),
+                                     statistics_content, strategy='digest', digest=digest_statistics)
 
+        started = time.monotonic()
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
-            max_completion_tokens=100000,
+            max_completion_tokens=budget.max_tokens,
             messages=[
                 {"role": "system",
                  "content": "You are a Performance test engineer"},
                 {"role": "user",
-                 "content": "You are a specialized Performance Test Engineer with extensive experience in analyzing JMeter test results. Your expertise includes identifying performance bottlenecks, error patterns, and root causes in load test data."
-                            f"Please analyze these JMeter performance test results:\n\n{statistics_content}\n\n"
-                            f"Thiqah Performance Standards:\n"
-                            f"- 90th percentile response time threshold (pct1ResTime): {form_data['api_threshold']} ms or below\n"
-                            f"- Error percentage threshold: {form_data['err_rate_threshold']}% or below\n\n"
-                            f"Provide your analysis in these two distinct sections:\n"
-                            f"1. EXECUTIVE SUMMARY: Overall test performance assessment with clear pass/fail status against Thiqah standards. Include key metrics, major bottlenecks, and critical findings.\n\n"
-                            f"2. PERFORMANCE BOTTLENECKS: Detailed analysis of the specific requests with highest response times or error rates. Include specific transaction names, their metrics, and targeted recommendations for improvement.\n\n"
-                            f"Focus on actionable insights that would help developers or system administrators improve performance. Be specific about which endpoints need attention."
+                 "content": content
                  }
             ]
         )
+        record_usage(budget, response, time.monotonic() - started)
 
         content = response.choices[0].message.content
         return content
@@ -596,6 +720,110 @@ def ask_gpt(statistics_content, form_data):
         return None
 
 
+def call_with_deadline(func, timeout, key=None, on_late=None):
+    """Run func() and return its result, or None if it raises or takes longer than `timeout` seconds.
+
+    A call that misses the deadline keeps running in its worker thread and hands a non-empty
+    result to `on_late` (e.g. to cache it for the next run). While a call with the same `key`
+    is still running, later calls wait for it instead of starting another.
+    """
+    with _pending_calls_lock:
+        future = _pending_calls.get(key) if key is not None else None
+        if future is None:
+            executor = ThreadPoolExecutor(max_workers=1)
+            future = executor.submit(func)
+            executor.shutdown(wait=False)
+            if key is not None:
+                _pending_calls[key] = future
+                future.add_done_callback(lambda done: _pending_calls.pop(key, None))
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logging.warning(f"LLM call missed its {timeout:g}s deadline")
+        if on_late is not None:
+            future.add_done_callback(lambda done: _deliver_late_result(done, on_late))
+        return None
+    except Exception as e:
+        logging.error(f"LLM call failed: {str(e)}")
+        return None
+
+
+def _deliver_late_result(future, on_late):
+    if future.exception() is None and future.result():
+        logging.info("Late LLM result received")
+        on_late(future.result())
+
+
+def build_statistics_summary(statistics_content, form_data, top_n=5):
+    """Deterministic statistics analysis from statistics.json and the report thresholds.
+
+    Produces the same two sections the LLM is asked for (executive summary with the pass/fail
+    verdict and throughput headline, then the worst transactions and error hotspots).
+    """
+    statistics = json.loads(statistics_content)
+    total = statistics.get('Total')
+    rows = [row for label, row in statistics.items() if label != 'Total']
+    if total is None:
+        total = {
+            'sampleCount': sum(row['sampleCount'] for row in rows),
+            'errorCount': sum(row['errorCount'] for row in rows),
+            'pct1ResTime': max((row['pct1ResTime'] for row in rows), default=0),
+            'meanResTime': 0, 'medianResTime': 0, 'throughput': sum(row['throughput'] for row in rows)
+        }
+        total['errorPct'] = total['errorCount'] * 100.0 / total['sampleCount'] if total['sampleCount'] else 0
+
+    try:
+        api_threshold = float(form_data['api_threshold'])
+        err_rate_threshold = float(form_data['err_rate_threshold'])
+    except (KeyError, TypeError, ValueError):
+        api_threshold = err_rate_threshold = None
+
+    def name(row):
+        return html.escape(str(row.get('transaction', '')))
+
+    # Same rule as the report colouring: strictly below the threshold passes
+    slow = [row for row in rows if api_threshold is not None and row['pct1ResTime'] >= api_threshold]
+    failing = [row for row in rows if err_rate_threshold is not None and row['errorPct'] >= err_rate_threshold]
+    passed = (api_threshold is not None and total['pct1ResTime'] < api_threshold
+              and total['errorPct'] < err_rate_threshold)
+
+    lines = ['EXECUTIVE SUMMARY']
+    if api_threshold is None:
+        lines.append('Verdict: not evaluated (thresholds missing or not numeric).')
+    else:
+        lines.append(f"Verdict: {'PASS' if passed else 'FAIL'} against Thiqah standards "
+                     f"(90th percentile below {api_threshold:g} ms, error rate below {err_rate_threshold:g}%).")
+        lines.append(f"Overall 90th percentile: {total['pct1ResTime']:.0f} ms; "
+                     f"error rate: {total['errorPct']:.2f}% ({total['errorCount']} of {total['sampleCount']} samples).")
+        lines.append(f"{len(slow)} of {len(rows)} transactions exceed the response time threshold; "
+                     f"{len(failing)} exceed the error rate threshold.")
+    lines.append(f"Throughput: {total['throughput']:.2f} requests/s over {total['sampleCount']} samples "
+                 f"(mean {total['meanResTime']:.0f} ms, median {total['medianResTime']:.0f} ms).")
+
+    lines.append('')
+    lines.append('PERFORMANCE BOTTLENECKS')
+    worst = sorted(rows, key=lambda row: row['pct1ResTime'], reverse=True)[:top_n]
+    if worst:
+        lines.append('Slowest transactions (90th percentile):')
+        for row in worst:
+            marker = ' - above threshold' if row in slow else ''
+            lines.append(f"- {name(row)}: {row['pct1ResTime']:.0f} ms "
+                         f"(mean {row['meanResTime']:.0f} ms, max {row['maxResTime']:.0f} ms){marker}")
+    hotspots = sorted((row for row in rows if row['errorCount']), key=lambda row: row['errorCount'],
+                      reverse=True)[:top_n]
+    if hotspots:
+        lines.append('Error hotspots:')
+        for row in hotspots:
+            marker = ' - above threshold' if row in failing else ''
+            lines.append(f"- {name(row)}: {row['errorCount']} errors ({row['errorPct']:.2f}%){marker}")
+    else:
+        lines.append('No errors were recorded.')
+    if slow or failing:
+        lines.append('Recommendation: investigate the transactions marked above threshold first, '
+                     'starting with the highest 90th percentile and error counts.')
+    return '\n'.join(lines)
+
+
 def generate_custom_html(form_data):
     """Generate the custom HTML table with test details"""
     return f'''
@@ -656,6 +884,7 @@ def generate_custom_html(form_data):
                         <td>Error % Threshold</td>
                         <td>{form_data.get('err_rate_threshold', '')}</td>
                     </tr>
+{build_steady_state_rows(form_data.get('steady_state_stats'))}
                     <tr>
                         <td>Azure New Bugs IDs</td>
                         <td>{form_data.get('new_bugs', '')}</td>
@@ -676,6 +905,31 @@ def generate_custom_html(form_data):
     '''
 
 
+def build_steady_state_rows(steady_state_stats):
+    """Rows for the details table with the steady-state (ramp-up excluded) headline numbers"""
+    if not steady_state_stats:
+        return ''
+    overall = steady_state_stats['overall']
+    ramp_up = steady_state_stats.get('ramp_up_minutes', 0)
+    return f'''
+                    <tr>
+                        <td>Steady-State Window</td>
+                        <td>After {ramp_up:g} min ramp-up ({overall['samples']} samples)</td>
+                    </tr>
+                    <tr>
+                        <td>Steady-State 90th pct (ms)</td>
+                        <td>{overall['p90'] if overall['p90'] is not None else '-'}</td>
+                    </tr>
+                    <tr>
+                        <td>Steady-State Error %</td>
+                        <td>{overall['error_pct']:.2f}%</td>
+                    </tr>
+                    <tr>
+                        <td>Steady-State Throughput (req/s)</td>
+                        <td>{overall['throughput']}</td>
+                    </tr>'''
+
+
 def edit_statistics_table(js_file_path, form_data):
     """Edit the statistics table in the dashboard.js file"""
     try:
@@ -810,6 +1064,306 @@ def pass_fail_colors(js_file_path, css_file_path, api_threshold, err_rate_thresh
     except Exception as e:
         logging.error(f"Error adding pass/fail colors: {str(e)}")
         raise
+
+
+def prerender_statistics_table(html_path, js_path, css_path, api_threshold, err_rate_threshold,
+                               page_size=STATISTICS_PAGE_SIZE):
+    """Render the statistics table (with pass/fail classes) as static HTML in index.html.
+
+    The rows dashboard.js would show (its seriesFilter / showControllersOnly settings) are
+    rendered in its default sort order into a single <tbody>, so tablesorter still orders the
+    whole table. The createTable call is replaced by tablesorter plus a pager that shows
+    `page_size` rows at a time; printing shows every row, starting a new page every `page_size`
+    rows. Must run after edit_statistics_table and pass_fail_colors.
+    """
+    try:
+        with open(js_path, 'r', encoding='utf-8') as js_file:
+            js_content = js_file.read()
+
+        call_pattern = re.compile(
+            r'createTable\(\$\("#statisticsTable"\), (.+?), function.*?, (\[[\[\]\d,\s]*\]), (-?\d+), '
+            r'summaryTableHeader\);', re.DOTALL)
+        match = call_pattern.search(js_content)
+        if not match:
+            raise ValueError("Could not find statistics table configuration in JS file")
+        info = json.loads(match.group(1).strip())
+        default_sorts = json.loads(match.group(2))
+        series_index = int(match.group(3))
+
+        try:
+            page_size = max(1, int(page_size))
+        except (TypeError, ValueError):
+            page_size = STATISTICS_PAGE_SIZE
+
+        def js_setting(name, default):
+            setting = re.search(rf'^var {name} = (true|false|"(?:[^"\\]|\\.)*");', js_content, re.MULTILINE)
+            return json.loads(setting.group(1)) if setting else default
+
+        # Same filter as createTable in dashboard.js
+        series_filter = js_setting('seriesFilter', '')
+        show_controllers_only = js_setting('showControllersOnly', False)
+        filters_only_sample_series = js_setting('filtersOnlySampleSeries', True)
+        supports_controllers = info.get("supportsControllersDiscrimination", False)
+        series_regex = None
+        if series_filter and not (filters_only_sample_series and not supports_controllers):
+            try:
+                series_regex = re.compile(series_filter, re.IGNORECASE)
+            except re.error as e:
+                logging.warning(f"Ignoring statistics series filter {series_filter!r}: {e}")
+
+        def shown(item):
+            if not item.get("data"):
+                return False
+            if series_regex is not None and not series_regex.search(str(item["data"][series_index])):
+                return False
+            return not (show_controllers_only and supports_controllers and not item.get("isController"))
+
+        def to_float(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+
+        # Same rule as the injected JS: strictly below threshold passes
+        thresholds = {
+            "90th pct": to_float(api_threshold),
+            "Error %": to_float(err_rate_threshold)
+        }
+        titles = info.get("titles", [])
+
+        def format_cell(title, value):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return html.escape(str(value))
+            if title == "Error %":
+                return f"{value:.2f}%"
+            return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+        def render_row(data, colored, row_class=''):
+            cells = []
+            for col, value in enumerate(data):
+                title = titles[col] if col < len(titles) else ''
+                css_class = ''
+                threshold = thresholds.get(title)
+                if colored and threshold is not None and to_float(value) is not None:
+                    css_class = ' class="green-text"' if to_float(value) < threshold else ' class="red-text"'
+                cells.append(f'<td{css_class}>{format_cell(title, value)}</td>')
+            row_class = f' class="{row_class}"' if row_class else ''
+            return f'<tr{row_class}>' + ''.join(cells) + '</tr>'
+
+        # Group header mirrors summaryTableHeader after edit_statistics_table removed columns
+        groups = [
+            ("Requests", {"Label"}),
+            ("Executions", {"#Samples", "FAIL", "Error %"}),
+            ("Response Times (ms)", {"Average", "Min", "Max", "Median", "90th pct", "95th pct", "99th pct"}),
+            ("Throughput", {"Transactions/s"}),
+            ("Network (KB/sec)", {"Received", "Sent"})
+        ]
+        group_cells = []
+        for name, members in groups:
+            span = sum(1 for t in titles if t in members)
+            if span:
+                group_cells.append(f'<th data-sorter="false" colspan="{span}">{name}</th>')
+
+        parts = ['<thead>',
+                 '<tr class="tablesorter-no-sort">' + ''.join(group_cells) + '</tr>',
+                 '<tr>' + ''.join(f'<th>{html.escape(str(t))}</th>' for t in titles) + '</tr>',
+                 '</thead>']
+        if info.get("overall"):
+            parts.append('<tbody class="tablesorter-no-sort">'
+                         + render_row(info["overall"]["data"], colored=False) + '</tbody>')
+
+        items = [item for item in info.get("items", []) if shown(item)]
+        # Stable sorts from the last key to the first give tablesorter's initial order
+        for column, descending in reversed(default_sorts):
+            items.sort(key=lambda item: (str(item["data"][column]).lower() if isinstance(item["data"][column], str)
+                                         else item["data"][column]), reverse=bool(descending))
+
+        def row_class(position):
+            classes = []
+            if position >= page_size:
+                classes.append('statistics-hidden')
+            if position and position % page_size == 0:
+                classes.append('statistics-page-start')
+            return ' '.join(classes)
+
+        parts.append('<tbody class="statistics-rows">'
+                     + ''.join(render_row(item["data"], colored=True, row_class=row_class(position))
+                               for position, item in enumerate(items)) + '</tbody>')
+        table_body = '\n'.join(parts)
+
+        with open(html_path, 'r', encoding='utf-8') as html_file:
+            html_content = html_file.read()
+        table_pattern = re.compile(r'(<table id="statisticsTable"[^>]*>)\s*(</table>)')
+        if not table_pattern.search(html_content):
+            raise ValueError("Could not find statistics table in HTML file")
+        html_content = table_pattern.sub(lambda m: m.group(1) + table_body + m.group(2), html_content, count=1)
+        with open(html_path, 'w', encoding='utf-8') as html_file:
+            html_file.write(html_content)
+
+        # Rows are already in the DOM; keep client-side sorting over all of them and page the result
+        pager_js = """(function() {
+        var pageSize = %d, page = 0;
+        var table = $("#statisticsTable");
+        var pager = $('<div class="statistics-pager">'
+            + '<button type="button" class="btn btn-default btn-xs statistics-prev">&laquo;</button> '
+            + '<span class="statistics-page-label"></span> '
+            + '<button type="button" class="btn btn-default btn-xs statistics-next">&raquo;</button>'
+            + '</div>').insertAfter(table);
+        function showPage() {
+            var rows = table.children("tbody.statistics-rows").children("tr");
+            var pages = Math.max(1, Math.ceil(rows.length / pageSize));
+            page = Math.min(Math.max(page, 0), pages - 1);
+            rows.each(function(i) {
+                $(this).toggleClass("statistics-hidden", Math.floor(i / pageSize) !== page)
+                    .toggleClass("statistics-page-start", i > 0 && i %% pageSize === 0);
+            });
+            pager.find(".statistics-page-label").text("Page " + (page + 1) + " / " + pages);
+            pager.toggle(pages > 1);
+        }
+        pager.on("click", ".statistics-prev", function() { page--; showPage(); });
+        pager.on("click", ".statistics-next", function() { page++; showPage(); });
+        table.tablesorter({sortList: %s}).on("sortEnd", function() { page = 0; showPage(); });
+        showPage();
+    })();""" % (page_size, json.dumps(default_sorts))
+        js_content = js_content[:match.start()] + pager_js + js_content[match.end():]
+        with open(js_path, 'w', encoding='utf-8') as js_file:
+            js_file.write(js_content)
+
+        with open(css_path, 'a', encoding='utf-8') as css_file:
+            css_file.write("""
+            /* Pre-rendered statistics table pages */
+            #statisticsTable tr.statistics-hidden {
+                display: none;
+            }
+            .statistics-pager {
+                margin: 8px 0;
+                text-align: right;
+            }
+            @media print {
+                #statisticsTable thead {
+                    display: table-header-group;
+                }
+                #statisticsTable tr {
+                    page-break-inside: avoid;
+                }
+                #statisticsTable tr.statistics-hidden {
+                    display: table-row;
+                }
+                #statisticsTable tr.statistics-page-start {
+                    page-break-before: always;
+                }
+                .statistics-pager {
+                    display: none !important;
+                }
+            }
+            """)
+
+    except Exception as e:
+        logging.error(f"Error pre-rendering statistics table: {str(e)}")
+        raise
+
+
+def lttb_downsample(points, threshold):
+    """Largest-Triangle-Three-Buckets: reduce [x, y] points (sorted by x) to `threshold` points.
+
+    First and last points are always kept; each bucket in between keeps the point forming
+    the largest triangle with the previously kept point and the next bucket's average.
+    """
+    length = len(points)
+    if threshold >= length or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket (the last bucket averages just the final point)
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, length)
+        avg_range = avg_end - avg_start
+        avg_x = sum(points[j][0] for j in range(avg_start, avg_end)) / avg_range
+        avg_y = sum(points[j][1] for j in range(avg_start, avg_end)) / avg_range
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        point_ax, point_ay = points[a][0], points[a][1]
+        max_area = -1
+        next_a = range_start
+        for j in range(range_start, range_end):
+            area = abs((point_ax - avg_x) * (points[j][1] - point_ay)
+                       - (point_ax - points[j][0]) * (avg_y - point_ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        sampled.append(points[next_a])
+        a = next_a
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_graph_data(graph_js_path, max_points=CHART_MAX_POINTS):
+    """Downsample every chart series embedded in graph.js to at most `max_points` points.
+
+    Each `xxxInfos = { data: {...} }` JSON literal is rewritten in place. Series are sorted by x
+    first (the dashboard sorts them client-side anyway). Distribution charts are bar histograms,
+    not series over x, and are left untouched. `max_points` <= 0 disables the stage.
+    """
+    try:
+        try:
+            max_points = int(max_points)
+        except (TypeError, ValueError):
+            max_points = CHART_MAX_POINTS
+        if max_points <= 0 or not os.path.exists(graph_js_path):
+            return
+
+        with open(graph_js_path, 'r', encoding='utf-8') as js_file:
+            js_content = js_file.read()
+
+        decoder = json.JSONDecoder()
+        data_pattern = re.compile(r'var (\w+Infos)\s*=\s*\{\s*data\s*:\s*')
+        parts = []
+        last_end = 0
+        reduced = 0
+        for match in data_pattern.finditer(js_content):
+            if match.start() < last_end or 'Distribution' in match.group(1):
+                continue
+            try:
+                data, end = decoder.raw_decode(js_content, match.end())
+            except ValueError:
+                logging.warning(f"Could not parse chart data for {match.group(1)}")
+                continue
+
+            changed = False
+            for series in (data.get('result') or {}).get('series') or []:
+                points = series.get('data')
+                if not isinstance(points, list) or len(points) <= max_points:
+                    continue
+                if not all(isinstance(p, list) and len(p) >= 2
+                           and all(isinstance(v, (int, float)) for v in p[:2]) for p in points):
+                    continue
+                before = len(points)
+                series['data'] = lttb_downsample(sorted(points, key=lambda p: p[0]), max_points)
+                reduced += before - len(series['data'])
+                changed = True
+
+            if changed:
+                parts.append(js_content[last_end:match.end()])
+                parts.append(json.dumps(data))
+                last_end = end
+
+        if not parts:
+            return
+        parts.append(js_content[last_end:])
+        with open(graph_js_path, 'w', encoding='utf-8') as js_file:
+            js_file.write(''.join(parts))
+        logging.info(f"Downsampled graph data: removed {reduced} points (max {max_points} per series)")
+
+    except Exception as e:
+        logging.error(f"Error downsampling graph data: {str(e)}")
+        raise
+
+
 #Extract Resources Utilzation from Kibana and analyze it with GPT
 def convert_to_iso_format(date_str):
     """Convert '5/11/25, 2:22 PM' format to '2025-05-11T14:22:00.000Z' after subtracting 3 hours"""
@@ -824,7 +1378,7 @@ def convert_to_iso_format(date_str):
         return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
     except ValueError as e:
         raise ValueError(f"Invalid date format. Expected 'MM/DD/YY, HH:MM AM/PM'. Error: {e}")
-def fetch_kibana_metrics_with_login(username, password, service_name, range_from, range_to):
+def fetch_kibana_metrics_with_login(username, password, service_name, range_from, range_to, base_url=None):
     """
     Fetches Kibana metrics for a specific service after authenticating
 
@@ -834,6 +1388,7 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
         service_name (str): The service name to fetch metrics for (e.g., 'Faseh-API')
         range_from (str): Start time in format '5/11/25, 2:22 PM' (will be converted to 3 hours earlier)
         range_to (str): End time in format '5/11/25, 2:22 PM' (will be converted to 3 hours earlier)
+        base_url (str): Kibana base URL, defaults to KIBANA_BASE_URL from config
     """
     # Convert time formats (subtracting 3 hours)
     try:
@@ -848,6 +1403,8 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
         print(f"Date conversion error: {e}")
         return None
 
+    base_url = (base_url or KIBANA_BASE_URL).rstrip('/')
+
     # Create a session to maintain cookies between requests
     session = requests.Session()
 
@@ -873,12 +1430,12 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
     }
 
     # 1. First make the login request
-    login_url = "https://kibana-pp.thiqah.sa:5601/internal/security/login"
+    login_url = f"{base_url}/internal/security/login"
 
     login_headers = common_headers.copy()
     login_headers.update({
-        "Origin": "https://kibana-pp.thiqah.sa:5601",
-        "Referer": "https://kibana-pp.thiqah.sa:5601/login?msg=LOGGED_OUT",
+        "Origin": base_url,
+        "Referer": f"{base_url}/login?msg=LOGGED_OUT",
         "Sec-Fetch-Dest": "empty",
         "Sec-Fetch-Mode": "cors",
         "Sec-Fetch-Site": "same-origin",
@@ -889,7 +1446,7 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
     login_payload = {
         "providerType": "basic",
         "providerName": "basic1",
-        "currentURL": "https://kibana-pp.thiqah.sa:5601/login?msg=LOGGED_OUT",
+        "currentURL": f"{base_url}/login?msg=LOGGED_OUT",
         "params": {
             "username": username,
             "password": password
@@ -909,7 +1466,7 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
         login_response.raise_for_status()
 
         # 2. Now make the metrics request with the authenticated session
-        metrics_url = f"https://kibana-pp.thiqah.sa:5601/internal/apm/services/{service_name}/metrics/charts"
+        metrics_url = f"{base_url}/internal/apm/services/{service_name}/metrics/charts"
 
         metrics_params = {
             "environment": "ENVIRONMENT_ALL",
@@ -921,7 +1478,7 @@ def fetch_kibana_metrics_with_login(username, password, service_name, range_from
 
         metrics_headers = common_headers.copy()
         metrics_headers.update({
-            "Referer": f"https://kibana-pp.thiqah.sa:5601/app/apm/services/{service_name}/metrics?comparisonEnabled=true&environment=ENVIRONMENT_ALL&kuery=&latencyAggregationType=avg&offset=1d&rangeFrom={iso_range_from}&rangeTo={iso_range_to}&serviceGroup=&transactionType=request",
+            "Referer": f"{base_url}/app/apm/services/{service_name}/metrics?comparisonEnabled=true&environment=ENVIRONMENT_ALL&kuery=&latencyAggregationType=avg&offset=1d&rangeFrom={iso_range_from}&rangeTo={iso_range_to}&serviceGroup=&transactionType=request",
             "Sec-Fetch-Dest": "empty",
             "Sec-Fetch-Mode": "cors",
             "Sec-Fetch-Site": "same-origin",
@@ -1005,6 +1562,34 @@ def extract_datetime_from_html(html_file_path, Time):
         return now.strftime("%m/%d/%y, %I:%M %p")
 
 
+def metrics_prompt(kibana_response):
+    return ("Given the following JSON response, extract only the statistics for:\n\n"
+            "- \"CPU Usage (System max)\"\n"
+            "- \"CPU Usage (System average)\"\n"
+            "- \"CPU Usage (Process max)\"\n"
+            "- \"CPU Usage (Process average)\"\n"
+            "- \"System Memory Usage (Max)\"\n\n"
+            "- \"System Memory Usage (Average)\"\n\n"
+            "For each, return:\n"
+            "1. Min value in percentage and the exact UTC time it occurred\n"
+            "2. Max value in percentage and the exact UTC time it occurred\n"
+            "3. Average value in percentage\n"
+            "4. A short analysis of whether the utilization is considered good, moderate, or high, based on the average and max values.\n\n"
+            "Format the output exactly like this:\n\n"
+            "CPU Usage (System max)\n"
+            "Min: [min]% at [min time]\n"
+            "Max: [max]% at [max time]\n"
+            "Average: [average]%\n"
+            "Analysis: [your interpretation of the CPU usage]\n\n"
+            "System Memory Usage (Max)\n"
+            "Min: [min]% at [min time]\n"
+            "Max: [max]% at [max time]\n"
+            "Average: [average]%\n"
+            "Analysis: [your interpretation of the memory usage]\n\n"
+            "(If JSON input doesn't have graphs data, respond with: \"No Data found on Kibana APM for provided service name & test duration\")\n\n"
+            f"Here's the JSON: {kibana_response}")
+
+
 def ask_gpt_for_CPU_Memory(form_data, html_file_path):
     try:
         logging.info(f"Starting Kibana APM analysis for service: {form_data.get('APM_service_name', 'N/A')}")
@@ -1036,41 +1621,21 @@ def ask_gpt_for_CPU_Memory(form_data, html_file_path):
         
         # Send to GPT for analysis
         client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        content, budget = fit_prompt('metrics_extraction', 'openai', metrics_prompt, kibana_response)
+
+        started = time.monotonic()
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
-            max_completion_tokens=100000,
+            max_completion_tokens=budget.max_tokens,
             messages=[
                 {"role": "system",
                 "content": "You are a data extraction and analysis specialist for performance metrics"},
                 {"role": "user",
-                "content": "Given the following JSON response, extract only the statistics for:\n\n"
-                            "- \"CPU Usage (System max)\"\n"
-                            "- \"CPU Usage (System average)\"\n"
-                            "- \"CPU Usage (Process max)\"\n"
-                            "- \"CPU Usage (Process average)\"\n"
-                            "- \"System Memory Usage (Max)\"\n\n"
-                            "- \"System Memory Usage (Average)\"\n\n"
-                            "For each, return:\n"
-                            "1. Min value in percentage and the exact UTC time it occurred\n"
-                            "2. Max value in percentage and the exact UTC time it occurred\n"
-                            "3. Average value in percentage\n"
-                            "4. A short analysis of whether the utilization is considered good, moderate, or high, based on the average and max values.\n\n"
-                            "Format the output exactly like this:\n\n"
-                            "CPU Usage (System max)\n"
-                            "Min: [min]% at [min time]\n"
-                            "Max: [max]% at [max time]\n"
-                            "Average: [average]%\n"
-                            "Analysis: [your interpretation of the CPU usage]\n\n"
-                            "System Memory Usage (Max)\n"
-                            "Min: [min]% at [min time]\n"
-                            "Max: [max]% at [max time]\n"
-                            "Average: [average]%\n"
-                            "Analysis: [your interpretation of the memory usage]\n\n"
-                            "(If JSON input doesn't have graphs data, respond with: \"No Data found on Kibana APM for provided service name & test duration\")\n\n"
-                            f"Here's the JSON: {kibana_response}"
+                "content": content
                 }
             ]
         )
+        record_usage(budget, response, time.monotonic() - started)
 
         content = response.choices[0].message.content
         logging.info(f"GPT analysis received: {content[:100]}...")
@@ -0,0 +1,241 @@
+"""Memoization of report generation stages keyed by a hash of their inputs.
+
+Regenerating a round after editing only findings, scope or chaos experiments should not
+unzip the dashboard again or repeat the OpenAI / Kibana round trips. Each stage declares
+its inputs (file contents plus the form fields it reads); the output is stored under
+REPORT_CACHE_DIR/<stage>/<input hash> and replayed on the next run with the same inputs.
+
+Two kinds of stages:
+  - value stages (LLM / Kibana calls): the return value is cached as JSON
+  - file stages (in-place edits of report files): the edited files' bytes are cached
+
+An entry is leased while it is read: its mtime is refreshed, so prune_cache only drops entries
+unused for REPORT_CACHE_MAX_AGE_HOURS, and prune_cache skips it until the lease is released.
+"""
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+
+from config import REPORT_CACHE_DIR, REPORT_CACHE_ENABLED, REPORT_CACHE_MAX_AGE_HOURS
+
+EXTRACT_STAGE = 'extract'
+
+# Entries being read by this process (entry dir -> readers); prune_cache leaves them alone
+_leases = collections.Counter()
+_leases_lock = threading.Lock()
+
+
+def file_digest(path):
+    """sha256 of a file's bytes, or None when the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_hash(*inputs):
+    """Stable hash of JSON-serialisable stage inputs."""
+    payload = json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _entry_dir(stage, key):
+    return os.path.join(REPORT_CACHE_DIR, stage, key)
+
+
+def _acquire(entry_dir):
+    """Lease `entry_dir` for reading and mark it used; False when there is no such entry"""
+    with _leases_lock:
+        if not os.path.isdir(entry_dir):
+            return False
+        _leases[entry_dir] += 1
+    try:
+        os.utime(entry_dir)
+    except OSError:
+        pass
+    return True
+
+
+def _release(entry_dir):
+    with _leases_lock:
+        _leases[entry_dir] -= 1
+        if _leases[entry_dir] <= 0:
+            del _leases[entry_dir]
+
+
+def _publish(tmp_dir, entry_dir):
+    """Move a fully written entry into place; a concurrent writer may have won already."""
+    os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def memoize_value(stage, inputs, compute, cache_if=None):
+    """Return the cached value of `stage` for `inputs`, computing and storing it on a miss.
+
+    Args:
+        stage (str): Stage name (cache sub-directory)
+        inputs (list): Everything the stage's result depends on
+        compute (callable): Produces the value (must be JSON-serialisable)
+        cache_if (callable): Optional predicate; values it rejects are returned but not stored.
+            None results are never stored so failed calls are retried next time.
+    """
+    if not REPORT_CACHE_ENABLED:
+        return compute()
+
+    key = input_hash(stage, inputs)
+    entry_dir = _entry_dir(stage, key)
+    value_path = os.path.join(entry_dir, 'value.json')
+    if _acquire(entry_dir):
+        try:
+            with open(value_path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['value']
+            logging.info(f"Stage '{stage}' reused from cache ({key[:12]})")
+            return value
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            _release(entry_dir)
+
+    value = compute()
+    if value is None or (cache_if is not None and not cache_if(value)):
+        return value
+    store_value(stage, inputs, value)
+    return value
+
+
+def store_value(stage, inputs, value):
+    """Store `value` as the result of value stage `stage` for `inputs` (e.g. one that arrived late)."""
+    if not REPORT_CACHE_ENABLED:
+        return
+    entry_dir = _entry_dir(stage, input_hash(stage, inputs))
+    try:
+        tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, 'value.json'), 'w', encoding='utf-8') as f:
+            json.dump({'value': value}, f)
+        _publish(tmp_dir, entry_dir)
+    except (OSError, TypeError) as e:
+        logging.warning(f"Could not cache stage '{stage}': {e}")
+
+
+def run_file_stage(stage, root, rel_paths, params, compute, cache_if=None):
+    """Run an in-place file edit stage, or replay its cached output files.
+
+    Args:
+        stage (str): Stage name (cache sub-directory)
+        root (str): Report directory the paths are relative to
+        rel_paths (list): Every file the stage reads or writes
+        params: JSON-serialisable non-file inputs (e.g. the form fields the stage uses)
+        compute (callable): Performs the edit on the files under `root`
+        cache_if (callable): Optional predicate on compute()'s result; when it rejects the result
+            the edited files are kept but not stored (e.g. output degraded by a failed LLM call)
+    """
+    if not REPORT_CACHE_ENABLED:
+        return compute()
+
+    digests = {rel: file_digest(os.path.join(root, rel)) for rel in rel_paths}
+    key = input_hash(stage, params, digests)
+    entry_dir = _entry_dir(stage, key)
+
+    if _acquire(entry_dir):
+        try:
+            for rel in rel_paths:
+                cached = os.path.join(entry_dir, 'files', rel)
+                if os.path.exists(cached):
+                    shutil.copyfile(cached, os.path.join(root, rel))
+        finally:
+            _release(entry_dir)
+        logging.info(f"Stage '{stage}' reused from cache ({key[:12]})")
+        return None
+
+    result = compute()
+    if cache_if is not None and not cache_if(result):
+        logging.info(f"Stage '{stage}' output not cached ({key[:12]})")
+        return result
+    try:
+        tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        for rel in rel_paths:
+            src = os.path.join(root, rel)
+            if os.path.exists(src):
+                dst = os.path.join(tmp_dir, 'files', rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(src, dst)
+        os.makedirs(tmp_dir, exist_ok=True)
+        _publish(tmp_dir, entry_dir)
+    except OSError as e:
+        logging.warning(f"Could not cache stage '{stage}': {e}")
+    return result
+
+
+@contextlib.contextmanager
+def extract_zip_cached(zip_path, dest_dir):
+    """Extract `zip_path`, reusing a previous extraction of identical bytes.
+
+    Context manager yielding (folder, from_cache). A cached folder is shared and must be
+    treated as read-only; it stays leased until the block exits. When caching is disabled the
+    archive is extracted into `dest_dir`.
+    """
+    if REPORT_CACHE_ENABLED:
+        entry_dir = _entry_dir(EXTRACT_STAGE, file_digest(zip_path))
+        if _acquire(entry_dir):
+            logging.info(f"Stage '{EXTRACT_STAGE}' reused from cache ({os.path.basename(entry_dir)[:12]})")
+        else:
+            tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                zip_ref.extractall(tmp_dir)
+            _publish(tmp_dir, entry_dir)
+            if not _acquire(entry_dir):
+                entry_dir = None
+        if entry_dir is not None:
+            try:
+                yield entry_dir, True
+            finally:
+                _release(entry_dir)
+            return
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(dest_dir)
+    yield dest_dir, False
+
+
+def prune_cache(max_age_hours=REPORT_CACHE_MAX_AGE_HOURS):
+    """Remove cache entries that have not been used for `max_age_hours`.
+
+    Leased entries are skipped. An entry is renamed aside before it is deleted, so readers
+    never see a partly deleted entry.
+    """
+    if not REPORT_CACHE_ENABLED or not os.path.isdir(REPORT_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for stage in os.listdir(REPORT_CACHE_DIR):
+        stage_dir = os.path.join(REPORT_CACHE_DIR, stage)
+        if not os.path.isdir(stage_dir):
+            continue
+        for entry in os.listdir(stage_dir):
+            entry_dir = os.path.join(stage_dir, entry)
+            if entry.endswith('.trash'):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            with _leases_lock:
+                try:
+                    if entry_dir in _leases or os.path.getmtime(entry_dir) >= cutoff:
+                        continue
+                    trash_dir = f"{entry_dir}.{uuid.uuid4().hex}.trash"
+                    os.rename(entry_dir, trash_dir)
+                except OSError:
+                    continue
+            shutil.rmtree(trash_dir, ignore_errors=True)